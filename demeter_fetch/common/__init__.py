@@ -1,3 +1,13 @@
 from ._typing import *
 from .utils import *
-from .nodes import Node, DailyNode, EmptyNamedTuple, DailyParam, AaveDailyNode
+from .nodes import Node, DailyNode, EmptyNamedTuple, DailyParam, AaveDailyNode, frame_store
+from .abi import (
+    AbiType,
+    AbiField,
+    EventLayout,
+    decode_logs,
+    decode_words,
+    get_data_words,
+    get_topic_words,
+    words_to_decimal,
+)
@@ -99,6 +99,11 @@ class ToFileType(enum.StrEnum):
     parquet = "parquet"
 
 
+class HeightSource(enum.StrEnum):
+    etherscan = "etherscan"
+    rpc = "rpc"  # search block by time with height cache and rpc
+
+
 class DappType(enum.StrEnum):
     uniswap = "uniswap"
     aave = "aave"
@@ -114,7 +119,7 @@ class BigQueryConfig:
 
 @dataclass
 class RpcConfig:
-    end_point: str
+    end_point: str | List[str]  # one or more end points
     batch_size: int = 500
     auth_string: str | None = None
     keep_tmp_files: bool = False
@@ -122,6 +127,18 @@ class RpcConfig:
     force_no_proxy: bool = False  # if set to true, will ignore proxy setting
     height_cache_path: str = None
     thread: int = 10
+    async_client: bool = False  # use asyncio and http/2 based client, require httpx
+    concurrency: int = 100  # max requests in flight when async_client is enabled
+    endpoint_concurrency: int | None = None  # max requests in flight for an endpoint, default is concurrency
+    request_batch_size: int = 100  # how many requests are sent in one json rpc batch, e.g. query block timestamp
+    end_point_weights: List[int] | None = None  # requests are distributed to end points by weights
+    rate_limit: float | None = None  # max requests per second of an end point
+    max_retries: int = 5  # retry when rate limited or network error
+    retry_backoff: float = 1  # base delay(seconds) of exponential backoff
+    log_store_path: str | None = None  # if set, raw logs are kept in this folder and shared by jobs
+    height_source: HeightSource | None = None  # where to get height of days, default is etherscan if api key is set
+    scan_all_days: bool = False  # query logs of all days in one scan, then split them by day
+    timestamp_anchor_stride: int = 0  # if > 0, timestamps of blocks are inferred from anchor blocks at this stride
 
 
 @dataclass
@@ -188,6 +205,10 @@ class ToConfig:
     skip_existed: bool = False
     keep_raw: bool = False
     to_file_type: ToFileType = ToFileType.csv
+    max_workers: int | None = None  # process count when multi_process is enabled, default is cpu count
+    pipeline: bool = False  # run all daily steps of a day together, and days in a process pool
+    in_memory: bool = False  # pass intermediate data to next step in memory instead of files
+    memory_limit: int | None = None  # max size(MB) of data kept in memory, the rest will be written to files
 
 
 class KECCAK(enum.StrEnum):
@@ -304,6 +325,7 @@ class EthError(Exception):
 
 class NodeNames:
     uni_pool = "uni_pool"
+    uni_pool_events = "uni_pool_events"
     uni_proxy_transfer = "uni_proxy_transfer"
     uni_proxy_lp = "uni_proxy_LP"
     uni_minute = "uni_minute"
@@ -322,6 +344,7 @@ class NodeNames:
     osqth_minute = "osqth_minute"
 
     uni4_pool = "uni4_pool"
+    uni4_pool_events = "uni4_pool_events"
     uni4_minute = "uni4_minute"
     uni4_tick = "uni4_tick"
 
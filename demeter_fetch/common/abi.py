@@ -0,0 +1,220 @@
+"""
+Decode event logs by column.
+
+Arguments of events are encoded in 32-byte words, indexed arguments are in topics and the others are in data.
+For a type of event, an argument is always in the same word, so it can be sliced from the whole column at once,
+instead of splitting topics and data row by row.
+"""
+
+import enum
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .utils import split_topic
+
+WORD_LENGTH = 64
+# hex digits of the lowest 64 bits of a word
+_LOW_WORD_LENGTH = 16
+
+_HEX_VALUES = np.zeros(256, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    _HEX_VALUES[_c] = _i
+    _HEX_VALUES[ord(chr(_c).upper())] = _i
+# byte value of two hex characters, indexed by the characters read as a little endian uint16
+_pairs = np.arange(65536, dtype=np.uint32)
+_HEX_PAIR_VALUES = _HEX_VALUES[_pairs & 0xFF] * 16 + _HEX_VALUES[_pairs >> 8]
+
+
+class AbiType(enum.StrEnum):
+    int = "int"
+    uint = "uint"
+    address = "address"
+    bytes32 = "bytes32"
+    # values which are known to fit in 64 bits, e.g. tick(int24) and fee(uint24), they are decoded to numpy arrays
+    int64 = "int64"
+    uint64 = "uint64"
+
+
+_SMALL_INT_TYPES = {AbiType.int64: np.int64, AbiType.uint64: np.uint64}
+
+
+@dataclass
+class AbiField:
+    """
+    Position of an event argument.
+
+    :param name: column name of decoded value
+    :param index: position in topics if indexed(topic 0 is signature, so the first indexed argument is 1),
+        or index of word in data
+    :param type: how to decode the word, int and uint are decoded to exact python int,
+        int64 and uint64 are decoded to numpy numbers
+    :param indexed: argument is in topics
+    """
+
+    name: str
+    index: int
+    type: AbiType = AbiType.int
+    indexed: bool = False
+
+
+EventLayout = List[AbiField]
+
+
+def get_data_words(data: Sequence[str], index: int) -> List[str | None]:
+    """
+    Slice the index-th word from data hex strings, None if data is too short.
+    """
+    start = 2 + index * WORD_LENGTH
+    end = start + WORD_LENGTH
+    return [d[start:end] if len(d) >= end else None for d in data]
+
+
+def get_topic_words(topics: Sequence[List[str]], index: int) -> List[str | None]:
+    """
+    Take the index-th topic from split topic lists, None if there are not enough topics.
+    """
+    return [t[index] if len(t) > index else None for t in topics]
+
+
+def _low_words_to_int(low_words: pa.Array, abi_type: AbiType) -> np.ndarray:
+    """
+    Convert lowest 16 hex digits of words(null if missing) to numbers in bulk, missing words will be 0.
+    Characters which are not hex digits(e.g. x in short topics like 0xb) are taken as 0.
+    """
+    low_words = pc.utf8_lpad(pc.fill_null(low_words, "0"), _LOW_WORD_LENGTH, "0")
+    start = low_words.offset
+    offsets = np.frombuffer(low_words.buffers()[1], dtype=np.int32)[start : start + len(low_words) + 1]
+    if len(low_words) > 0 and offsets[-1] - offsets[0] == _LOW_WORD_LENGTH * len(low_words):
+        # every word has 16 ascii characters, so characters are read from data buffer without python strings
+        digits = np.frombuffer(low_words.buffers()[2], dtype=np.uint8)[offsets[0] : offsets[-1]]
+    else:
+        digits = np.array(low_words.to_numpy(zero_copy_only=False), dtype=f"S{_LOW_WORD_LENGTH}").view(np.uint8)
+    # every 2 characters make a byte, then 8 bytes are read as a big endian number
+    values = _HEX_PAIR_VALUES[digits.view("<u2")].view(">u8").astype(np.uint64)
+    return values.view(_SMALL_INT_TYPES[abi_type])
+
+
+def _to_small_int_array(values: np.ndarray, missing: np.ndarray) -> np.ndarray:
+    # like infer_objects, numbers with missing values will be float
+    if missing.any():
+        values = values.astype(np.float64)
+        values[missing] = np.nan
+    return values
+
+
+def _decode_small_words(words: Sequence[str | None], abi_type: AbiType) -> Tuple[np.ndarray, np.ndarray]:
+    words = pa.array(words, type=pa.string())
+    low_words = pc.utf8_slice_codeunits(words, -_LOW_WORD_LENGTH)
+    return _low_words_to_int(low_words, abi_type), words.is_null().to_numpy(zero_copy_only=False)
+
+
+def _decode_small_data_words(data: Sequence[str], index: int, abi_type: AbiType) -> Tuple[np.ndarray, np.ndarray]:
+    # slice the data column in bulk, instead of getting words by get_data_words
+    end = 2 + (index + 1) * WORD_LENGTH
+    data = pa.array(data, type=pa.string())
+    low_words = pc.utf8_slice_codeunits(data, end - _LOW_WORD_LENGTH, end)
+    missing = pc.less(pc.utf8_length(data), end).to_numpy(zero_copy_only=False)
+    return _low_words_to_int(low_words, abi_type), missing
+
+
+def decode_words(words: Sequence[str | None], abi_type: AbiType) -> np.ndarray:
+    """
+    Decode hex words to an object array, missing words are decoded to None.
+    int64 and uint64 words are decoded in bulk to a numeric array, which is float with nan if some words are missing.
+    """
+    if abi_type in _SMALL_INT_TYPES:
+        return _to_small_int_array(*_decode_small_words(words, abi_type))
+    ret = np.empty(len(words), dtype=object)
+    match abi_type:
+        case AbiType.int:
+            ret[:] = [None if w is None else _to_signed(int(w, 16)) for w in words]
+        case AbiType.uint:
+            ret[:] = [None if w is None else int(w, 16) for w in words]
+        case AbiType.address:
+            ret[:] = [None if w is None else "0x" + w[-40:] for w in words]
+        case AbiType.bytes32:
+            ret[:] = [None if w is None else (w if w.startswith("0x") else "0x" + w) for w in words]
+        case _:
+            raise RuntimeError(f"Unknown abi type {abi_type}")
+    return ret
+
+
+def _to_signed(value: int) -> int:
+    return value - (1 << 256) if value >> 255 else value
+
+
+def decode_logs(
+    df: pd.DataFrame,
+    layouts: Dict[str, EventLayout],
+    tx_type_column: str = "tx_type",
+) -> pd.DataFrame:
+    """
+    Decode logs of several event types.
+    Rows are grouped by tx_type, then each field of the layout is decoded by column.
+    Columns are the union of fields in all layouts, if a field is not in a layout, it will be None.
+    Columns of int64 or uint64 fields are numeric, they are float with nan if some rows don't have the field.
+
+    :param df: logs with topics, data and tx_type columns
+    :param layouts: key is topic0 of event, value is field list
+    :param tx_type_column: column of event type
+    :return: dataframe with the same index as df, columns are object except those of int64 and uint64 fields
+    """
+    columns: Dict[str, np.ndarray] = {}
+    # rows which don't have value of numeric columns
+    missing: Dict[str, np.ndarray] = {}
+    for layout in layouts.values():
+        for field in layout:
+            if field.name in columns:
+                if (field.name in missing or field.type in _SMALL_INT_TYPES) and (
+                    columns[field.name].dtype != _SMALL_INT_TYPES.get(field.type, object)
+                ):
+                    raise RuntimeError(f"Field {field.name} has different numeric types in layouts")
+                continue
+            if field.type in _SMALL_INT_TYPES:
+                columns[field.name] = np.zeros(len(df.index), dtype=_SMALL_INT_TYPES[field.type])
+                missing[field.name] = np.ones(len(df.index), dtype=bool)
+            else:
+                columns[field.name] = np.full(len(df.index), None, dtype=object)
+
+    codes, tx_types = pd.factorize(df[tx_type_column])
+    if (codes < 0).any():
+        raise ValueError("not support tx type")
+    for code, tx_type in enumerate(tx_types):
+        if tx_type not in layouts:
+            raise ValueError("not support tx type")
+        positions = np.flatnonzero(codes == code)
+        layout = layouts[tx_type]
+        data = df["data"].values[positions]
+        topics = None
+        for field in layout:
+            if field.indexed and topics is None:
+                topics = [split_topic(t) for t in df["topics"].values[positions]]
+            if field.name in missing:
+                if field.indexed:
+                    values, field_missing = _decode_small_words(get_topic_words(topics, field.index), field.type)
+                else:
+                    values, field_missing = _decode_small_data_words(data, field.index, field.type)
+                columns[field.name][positions] = values
+                missing[field.name][positions] = field_missing
+                continue
+            if field.indexed:
+                words = get_topic_words(topics, field.index)
+            else:
+                words = get_data_words(data, field.index)
+            columns[field.name][positions] = decode_words(words, field.type)
+    for name, column_missing in missing.items():
+        columns[name] = _to_small_int_array(columns[name], column_missing)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def words_to_decimal(values: Sequence[int | None]) -> List[Decimal]:
+    """
+    Convert decoded python int to Decimal, None will be Decimal(nan)
+    """
+    return [Decimal(np.nan) if v is None else Decimal(v) for v in values]
@@ -6,21 +6,98 @@
 import multiprocessing
 import os
 import time
+import traceback
 from collections import namedtuple
-from datetime import timedelta, date
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
 from typing import List, Dict, Callable
 
 import pandas as pd
 from tqdm import tqdm
 
-from ._typing import Config, FromConfig, ToFileType
-from .utils import TimeUtil, set_global_pbar, get_depend_name
+from ._typing import Config, FromConfig, ToFileType, DataSource
+from .utils import TimeUtil, set_global_pbar, get_depend_name, print_log, to_exact_int
 
 EmptyNamedTuple = namedtuple("EmptyNamedTuple", [])
 
 
+def _normalize_date_column(column: pd.Series) -> pd.Series:
+    """
+    Convert date column to the type as it is loaded from csv file.
+    Text will be parsed, and datetime with timezone will lose timezone, as timezone is not written to csv.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(column):
+        if all(isinstance(x, str) for x in column):
+            return pd.to_datetime(column)
+        column = pd.to_datetime(column)
+    if column.dt.tz is not None:
+        column = column.dt.tz_localize(None)
+    return column
+
+
+class FrameStore:
+    """
+    Keep output of steps in memory, key is the file path which should be written.
+    A frame will be released after it is read by all consumers.
+
+    Store is process local, so it only works when producer and consumers run in the same process.
+    """
+
+    def __init__(self):
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self.readers: Dict[str, int] = {}
+        self.sizes: Dict[str, int] = {}
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.frames
+
+    @property
+    def used_size(self) -> int:
+        return sum(self.sizes.values())
+
+    def put(self, path: str, df: pd.DataFrame, readers: int, limit: int | None = None) -> bool:
+        """
+        :param path: file path of this frame
+        :param df: frame
+        :param readers: how many times this frame will be read
+        :param limit: size limit of store in bytes, None means unlimited
+        :return: False if store is full, then frame should be written to file
+        """
+        size = 0
+        if limit is not None:
+            size = int(df.memory_usage(deep=True).sum())
+            if self.used_size - self.sizes.get(path, 0) + size > limit:
+                return False
+        self.frames[path] = df
+        self.readers[path] = readers
+        self.sizes[path] = size
+        return True
+
+    def get(self, path: str) -> pd.DataFrame:
+        """
+        get a frame. consumer may modify the frame, so a copy is returned unless it is the last reader.
+        """
+        self.readers[path] -= 1
+        if self.readers[path] > 0:
+            return self.frames[path].copy()
+        self.readers.pop(path)
+        self.sizes.pop(path)
+        return self.frames.pop(path)
+
+    def clear(self):
+        self.frames.clear()
+        self.readers.clear()
+        self.sizes.clear()
+
+
+frame_store = FrameStore()
+
+
 class Node:
     name = "ParentNode"
+    # step reads and writes height cache when it downloads with rpc
+    use_height_cache = False
 
     def __init__(self):  # depends: List,
         self.id = ""
@@ -29,6 +106,12 @@ class Node:
         self.config: Config | None = None
         self.from_config: FromConfig | None = None
         self.to_path: str | None = None
+        # steps which read output of this step
+        self.consumers: List[Node] = []
+        # output will be put in frame_store instead of file
+        self.keep_in_memory = False
+        # days are prepared in this run already, e.g. logs of all source steps are downloaded together before work
+        self.days_prepared = False
 
     depend = []
 
@@ -54,13 +137,48 @@ class Node:
         self.from_config = config.from_config
         self.to_path = config.to_config.save_path
 
+    @property
+    def is_day_exclusive(self) -> bool:
+        """
+        Days of this step can't run in several processes at the same time.
+        Processes would open the same height cache, pkl engine rewrites the whole file and others lock the file.
+        """
+        return self.use_height_cache and self.from_config.data_source == DataSource.rpc
+
+    def get_worker_count(self) -> int:
+        """
+        How many days can be processed at the same time. If multi_process is not enabled, days run one by one.
+        """
+        if not self.config.to_config.multi_process or self.is_day_exclusive:
+            return 1
+        if self.config.to_config.max_workers:
+            return self.config.to_config.max_workers
+        return os.cpu_count()
+
+    def _prepare_days(self, days: List[date]):
+        """
+        Called with days to be processed before processing them, e.g. source can download all days in one go.
+        """
+        pass
+
+    def prepare_days(self, days: List[date]):
+        """
+        Call _prepare_days only once in a run
+        """
+        if self.days_prepared or len(days) < 1:
+            return
+        self._prepare_days(days)
+        self.days_prepared = True
+
     def work(self):
         set_global_pbar(None)
         missing_params: List[EmptyNamedTuple] = []
         if self.config.to_config.skip_existed:
+            if self.is_output_consumed():
+                return
             step_file_names = self.get_file_paths
             for key, fn in step_file_names.items():
-                if not os.path.exists(fn):
+                if not self.is_file_existed(fn):
                     missing_params.append(key)
                     break
             if len(missing_params) < 1:
@@ -104,6 +222,14 @@ class Node:
     def _parse_date_column(self) -> List[str]:
         return []
 
+    @property
+    def _exact_int_columns(self) -> List[str]:
+        """
+        Columns of EXACT_INT_DTYPE, they are loaded as exact int whatever the file type is.
+        :return:
+        """
+        return []
+
     def _get_file_ext(self):
         match self.config.to_config.to_file_type:
             case ToFileType.csv:
@@ -115,7 +241,32 @@ class Node:
             case _:
                 raise RuntimeError(f"{self.config.to_config.to_file_type.name} not supported")
 
+    def is_file_existed(self, path: str) -> bool:
+        return path in frame_store or os.path.exists(path)
+
+    def is_output_consumed(self, day: date | None = None) -> bool:
+        """
+        Output kept in memory is no longer needed if all consumers have finished, so this step can be skipped.
+        """
+        if not self.keep_in_memory or len(self.consumers) < 1:
+            return False
+        return all(c.is_day_existed(day) for c in self.consumers)
+
+    def is_day_existed(self, day: date | None) -> bool:
+        """
+        Output of this step covers all days, so it's existed if all files are existed.
+        """
+        return all(self.is_file_existed(f) for f in self.get_file_paths.values()) or self.is_output_consumed(day)
+
     def save_file(self, df: pd.DataFrame, path: str):
+        if self.keep_in_memory:
+            if self._get_file_ext() == ".csv":
+                for column in self._parse_date_column:
+                    if column in df.columns:
+                        df[column] = _normalize_date_column(df[column])
+            limit = self.config.to_config.memory_limit
+            if frame_store.put(path, df, len(self.consumers), None if limit is None else limit * 1024 * 1024):
+                return
         match self._get_file_ext():
             case ".csv":
                 df.to_csv(path, index=False, lineterminator="\n", date_format="%Y-%m-%d %H:%M:%S")
@@ -127,15 +278,26 @@ class Node:
                 raise RuntimeError(f"{self.config.to_config.to_file_type.name} not supported")
 
     def read_file(self, path: str):
+        if path in frame_store:
+            return frame_store.get(path)
         match self._get_file_ext():
             case ".csv":
-                return pd.read_csv(path, converters=self._load_csv_converter, parse_dates=self._parse_date_column)
+                df = pd.read_csv(
+                    path,
+                    converters=self._load_csv_converter,
+                    parse_dates=self._parse_date_column,
+                    dtype={c: str for c in self._exact_int_columns},
+                )
             case ".feather":
-                return pd.read_feather(path)
+                df = pd.read_feather(path)
             case ".parquet":
-                return pd.read_parquet(path, engine="pyarrow")
+                df = pd.read_parquet(path, engine="pyarrow")
             case _:
                 raise RuntimeError(f"{self.config.to_config.to_file_type.name} not supported")
+        for column in self._exact_int_columns:
+            if column in df.columns:
+                df[column] = to_exact_int(df[column])
+        return df
 
     def get_depend_by_name(self, depend_name: str, depend_id=""):
         return self.depends_dict[get_depend_name(depend_name, depend_id)]
@@ -151,6 +313,7 @@ class Node:
 
 DailyParam = namedtuple("DailyParam", ["day"])
 
+
 def process_a_day(self_instance, day_param: DailyParam, day_idx: date):
     param = {}
     for depend in self_instance.depend_instance:
@@ -160,6 +323,91 @@ def process_a_day(self_instance, day_param: DailyParam, day_idx: date):
     self_instance.save_file(df, self_instance.get_file_path(day_param))
 
 
+# shared by processes in a pool, so exclusive steps of different days run one by one
+_exclusive_lock = None
+
+
+def init_pool_process(lock):
+    global _exclusive_lock
+    _exclusive_lock = lock
+
+
+def get_pool_init_args() -> dict:
+    """
+    Arguments of ProcessPoolExecutor to share the lock of exclusive steps
+    """
+    return dict(initializer=init_pool_process, initargs=(multiprocessing.Lock(),))
+
+
+@contextmanager
+def exclusive_day(exclusive: bool):
+    """
+    If exclusive, wait until exclusive work of other days in the pool is finished, and hold the lock until exit.
+    """
+    if exclusive and _exclusive_lock is not None:
+        with _exclusive_lock:
+            yield
+    else:
+        yield
+
+
+def work_on_day(node, day: date):
+    """
+    Run a day of node, if node is day exclusive, it will wait until the node finishes its day in other processes.
+    """
+    with exclusive_day(node.is_day_exclusive):
+        node._work_on_day(day)
+
+
+def _work_on_day_in_pool(node, day: date):
+    # process bar belongs to main process, worker should print log directly
+    set_global_pbar(None)
+    work_on_day(node, day)
+
+
+def run_days(node, days: List[date], pbar: tqdm):
+    """
+    Run node._work_on_day for every day.
+
+    If node has more than one worker, or it requires sub process, days will be dispatched to a process pool.
+    A failed day will not stop other days, failures are collected and raised after all days are finished.
+
+    :param node: daily node
+    :param days: days to process
+    :param pbar: process bar, will be updated when a day is finished
+    """
+    failures: Dict[date, str] = {}
+    worker_count = node.get_worker_count()
+    if worker_count <= 1 and not node.execute_in_sub_process:
+        for day in days:
+            try:
+                node._work_on_day(day)
+            except (Exception, SystemExit) as e:
+                failures[day] = traceback.format_exc()
+                print_log(f"Process {node.name} in {day} failed: {repr(e)}")
+            pbar.update()
+    else:
+        # execute_in_sub_process means memory should be released after a day, so every day will get a new process
+        max_tasks_per_child = 1 if node.execute_in_sub_process else None
+        with ProcessPoolExecutor(
+            max_workers=worker_count, max_tasks_per_child=max_tasks_per_child, **get_pool_init_args()
+        ) as executor:
+            futures = {executor.submit(_work_on_day_in_pool, node, day): day for day in days}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    future.result()
+                except (Exception, SystemExit) as e:
+                    failures[day] = "".join(traceback.format_exception(e))
+                    print_log(f"Process {node.name} in {day} failed: {repr(e)}")
+                pbar.update()
+    if len(failures) > 0:
+        for day, error_stack in sorted(failures.items()):
+            print(f"{node.name} in {day} failed:\n{error_stack}")
+        failed_days = ", ".join([str(d) for d in sorted(failures.keys())])
+        raise RuntimeError(f"{node.name} failed in {len(failures)} days: {failed_days}")
+
+
 class DailyNode(Node):
     """
     Node whose input and output and dependings are daily, and generate only one file per day.
@@ -172,26 +420,24 @@ class DailyNode(Node):
     def work(self):
         set_global_pbar(None)
         # if daily, global loop will handle processbar, outfile existence, gather param
-        day_idx = self.from_config.start
-        pbar = tqdm(total=(self.from_config.end - self.from_config.start).days + 1, ncols=80, position=0, leave=False)
+        days = TimeUtil.get_date_array(self.from_config.start, self.from_config.end)
+        pbar = tqdm(total=len(days), ncols=80, position=0, leave=False)
         set_global_pbar(pbar)
-        while day_idx <= self.from_config.end:
-            # day_str = day_idx.strftime("%Y-%m-%d")
-            day_param = DailyParam(day_idx)
-            step_file_name = self.get_file_path(day_param)
-            if self.config.to_config.skip_existed and os.path.exists(step_file_name):
-                day_idx += timedelta(days=1)
+        pending_days = []
+        for day in days:
+            if self.config.to_config.skip_existed and self.is_day_existed(day):
                 pbar.update()
-                time.sleep(0.001) # force process bar update
+                time.sleep(0.001)  # force process bar update
                 continue
-            if self.execute_in_sub_process:
-                p = multiprocessing.Process(target=process_a_day, args=(self, day_param, day_idx))
-                p.start()
-                p.join()
-            else:
-                process_a_day(self, day_param, day_idx)
-            day_idx += timedelta(days=1)
-            pbar.update()
+            pending_days.append(day)
+        self.prepare_days(pending_days)
+        run_days(self, pending_days, pbar)
+
+    def is_day_existed(self, day: date) -> bool:
+        return self.is_file_existed(self.get_file_path(DailyParam(day))) or self.is_output_consumed(day)
+
+    def _work_on_day(self, day: date):
+        process_a_day(self, DailyParam(day), day)
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
         return pd.DataFrame()
@@ -204,7 +450,6 @@ class DailyNode(Node):
         }
 
 
-
 AaveDailyParam = namedtuple("AaveDailyParam", ["day", "token"])
 
 
@@ -217,6 +462,7 @@ class AaveDailyNode(Node):
         self,
     ):
         super().__init__()
+        self.execute_in_sub_process = False
 
     @property
     def get_file_paths(self) -> Dict[namedtuple, str]:
@@ -230,37 +476,38 @@ class AaveDailyNode(Node):
     def work(self):
         set_global_pbar(None)
         # if daily, global loop will handle processbar, outfile existence, gather param
-        day_idx = self.from_config.start
-        pbar = tqdm(total=(self.from_config.end - self.from_config.start).days + 1, ncols=80, position=0, leave=False)
+        days = TimeUtil.get_date_array(self.from_config.start, self.from_config.end)
+        pbar = tqdm(total=len(days), ncols=80, position=0, leave=False)
         set_global_pbar(pbar)
-        while day_idx <= self.from_config.end:
-            # check file exist
-            if self.config.to_config.skip_existed:
-                all_exist = True
-                for token in self.from_config.aave_config.tokens:
-                    data_depends = AaveDailyParam(day_idx, token)
-                    step_file_name = self.get_file_path(data_depends)
-                    if not os.path.exists(step_file_name):
-                        all_exist = False
-                        break
-                if all_exist:
-                    day_idx += timedelta(days=1)
-                    pbar.update()
-                    continue
-
-            data_depends = {}
-            for depend in self.depend_instance:
-                token_data = {}
-                for token in self.from_config.aave_config.tokens:
-                    path = depend.get_file_path(AaveDailyParam(day_idx, token))
-                    token_data[token] = depend.read_file(path)
-                data_depends[get_depend_name(depend.name, depend.id)] = token_data
-
-            token_dfs = self._process_one_day(data_depends, day_idx, self.from_config.aave_config.tokens)
-            for token, df in token_dfs.items():
-                self.save_file(df, self.get_file_path(AaveDailyParam(day_idx, token)))
-            day_idx += timedelta(days=1)
-            pbar.update()
+        pending_days = []
+        for day in days:
+            if self.config.to_config.skip_existed and self.is_day_existed(day):
+                pbar.update()
+                continue
+            pending_days.append(day)
+        self.prepare_days(pending_days)
+        run_days(self, pending_days, pbar)
+
+    def is_day_existed(self, day: date) -> bool:
+        if self.is_output_consumed(day):
+            return True
+        for token in self.from_config.aave_config.tokens:
+            if not self.is_file_existed(self.get_file_path(AaveDailyParam(day, token))):
+                return False
+        return True
+
+    def _work_on_day(self, day: date):
+        data_depends = {}
+        for depend in self.depend_instance:
+            token_data = {}
+            for token in self.from_config.aave_config.tokens:
+                path = depend.get_file_path(AaveDailyParam(day, token))
+                token_data[token] = depend.read_file(path)
+            data_depends[get_depend_name(depend.name, depend.id)] = token_data
+
+        token_dfs = self._process_one_day(data_depends, day, self.from_config.aave_config.tokens)
+        for token, df in token_dfs.items():
+            self.save_file(df, self.get_file_path(AaveDailyParam(day, token)))
 
     def _process_one_day(
         self, data: Dict[str, Dict[str, pd.DataFrame]], day: date, tokens: List[str]
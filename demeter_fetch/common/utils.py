@@ -1,8 +1,12 @@
 import json
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import requests
 import numpy as np
 
@@ -37,6 +41,39 @@ def print_log(*args, tqdm_bar=None):
         print(*new_tuple)
 
 
+class RateLimiter:
+    """
+    Token bucket rate limiter, thread safe.
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        """
+        :param rate: tokens added per second
+        :param burst: max tokens in bucket, default is rate
+        """
+        self.rate = rate
+        self.capacity = burst if burst else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, and return how many seconds to wait before the token is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait_time = self.reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
 class TextUtil(object):
     @staticmethod
     def cut_after(text: str, symbol: str) -> str:
@@ -73,6 +110,55 @@ def to_int(value):
     return int(value) if value else int(0)
 
 
+# Exact integer type for amounts, prices and liquidity, it's stored natively in feather and parquet.
+# decimal256 with scale 0 keeps 76 digits. It can't hold every uint256,
+# but it's enough for uniswap, liquidity is uint128, sqrt price is uint160 and amounts are below 2**192.
+EXACT_INT_TYPE = pa.decimal256(76, 0)
+EXACT_INT_DTYPE = pd.ArrowDtype(EXACT_INT_TYPE)
+# operands are narrowed before adding, so the result still fits in EXACT_INT_TYPE
+_EXACT_INT_OPERAND_TYPE = pa.decimal256(75, 0)
+
+
+def to_exact_int(values, index=None) -> pd.Series:
+    """
+    Convert values to a series of EXACT_INT_DTYPE.
+    Values can be python int, Decimal, or text of integer(e.g. column read from csv).
+    None, nan and Decimal(nan) will be null.
+    """
+    if isinstance(values, pd.Series):
+        if values.dtype == EXACT_INT_DTYPE:
+            return values
+        index = values.index if index is None else index
+    if pd.api.types.infer_dtype(values, skipna=True) == "string":
+        array = pa.array(values, type=pa.string(), from_pandas=True).cast(EXACT_INT_TYPE)
+    else:
+        array = pa.array(values, type=EXACT_INT_TYPE, from_pandas=True)
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=index)
+
+
+def add_exact_int(left: pd.Series, right: pd.Series) -> pd.Series:
+    """
+    Add two series of EXACT_INT_DTYPE, null in any side will be null.
+    """
+    array = pc.add(
+        pa.array(left).cast(_EXACT_INT_OPERAND_TYPE),
+        pa.array(right).cast(_EXACT_INT_OPERAND_TYPE),
+    )
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=left.index)
+
+
+def exact_int_to_decimal(values: pd.Series) -> pd.Series:
+    """
+    Convert exact int column to Decimal objects, for those who want to calculate with Decimal.
+    null will be Decimal(nan)
+    """
+    return pd.Series(
+        [Decimal(np.nan) if v is None else v for v in pa.array(to_exact_int(values)).to_pylist()],
+        index=values.index,
+        dtype=object,
+    )
+
+
 # class DataUtil(object):
 #     @staticmethod
 #     def fill_missing(data_list: List[MinuteData]) -> List[MinuteData]:
@@ -7,7 +7,7 @@ def get_commend_args():
     parser_tool_sub = argParser.add_subparsers(help="demeter-fetch tools", dest="tools")
 
     parser_height_range = parser_tool_sub.add_parser(
-        "date_to_height", help="Query block height from etherscan in certain date range"
+        "date_to_height", help="Query block height from etherscan or rpc in certain date range"
     )
     parser_height_range.add_argument("-c", "--chain", help="chain name, [ethereum, polygon]")
     parser_height_range.add_argument("-s", "--start", help="start date, eg: 2023-1-1")
@@ -16,6 +16,12 @@ def get_commend_args():
         "-p", "--http_proxy", help="proxy, eg: https://localhost:7890, optional", default=""
     )
     parser_height_range.add_argument("-k", "--key", help="key in etherscan, optional", default="")
+    parser_height_range.add_argument(
+        "-r", "--rpc", help="rpc end point, if set, height will be searched with rpc instead of etherscan, optional", default=""
+    )
+    parser_height_range.add_argument(
+        "-t", "--height_cache_path", help="path of height cache, timestamps in it will be used in searching, optional", default=None
+    )
 
     block_timestamp = parser_tool_sub.add_parser(
         "block_timestamp",
@@ -29,6 +35,29 @@ def get_commend_args():
     block_timestamp.add_argument("-t", "--to", help="save cache to this path")
     block_timestamp.add_argument("-n", "--engine", help="storage type, sqlite or levelDB", default="sqlite")
 
+    migrate = parser_tool_sub.add_parser(
+        "height_cache_migrate",
+        help="Migrate height cache in sqlite, levelDB or pkl to memory mapped array, which is faster and will be used instead",
+    )
+    migrate.add_argument("-c", "--chain", help="chain name, [ethereum, polygon]")
+    migrate.add_argument("-f", "--from_path", help="folder of current height cache")
+    migrate.add_argument("-t", "--to", help="folder of new height cache, default is the same as from_path", default=None)
+
+    backfill = parser_tool_sub.add_parser(
+        "height_cache_backfill",
+        help="Fill height cache with block timestamps queried from rpc, heights already in cache will be skipped",
+    )
+    backfill.add_argument("-c", "--chain", help="chain name, [ethereum, polygon]")
+    backfill.add_argument("-r", "--rpc", help="rpc end point")
+    backfill.add_argument("-s", "--start", help="start height")
+    backfill.add_argument("-e", "--end", help="end height (included), default is latest", default="latest")
+    backfill.add_argument("-t", "--to", help="folder of height cache")
+    backfill.add_argument("-n", "--engine", help="storage type if cache is not existed, sqlite, levelDB or mmap", default="sqlite")
+    backfill.add_argument("-p", "--http_proxy", help="proxy, eg: https://localhost:7890, optional", default="")
+    backfill.add_argument("--thread", help="count of batch requests in flight", default=10)
+    backfill.add_argument("--batch_size", help="count of blocks in a json rpc batch", default=100)
+    backfill.add_argument("--rate_limit", help="max requests per second, optional", default=None)
+
     aave = parser_tool_sub.add_parser("aave", help="Get aave risk parameter")
     aave.add_argument("-c", "--chain", help="chain name, [ethereum, polygon]")
     aave.add_argument("-r", "--rpc", help="chain name, e.g. https://eth-mainnet.g.alchemy.com/v2/ZiMMq2478EVIEJdsxC5dMal_ccQwtb31")
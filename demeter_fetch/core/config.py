@@ -52,7 +52,22 @@ def convert_to_config(conf_file: dict) -> Config:
     skip_existed = get_item_with_default_2(conf_file, "to", "skip_existed", False)
     keep_raw = get_item_with_default_2(conf_file, "to", "keep_raw", False)
     to_file_type = get_item_with_default_2(conf_file, "to", "file_type", ToFileType.csv, lambda x: ToFileType[x])
-    to_config = ToConfig(to_type, save_path, multi_process, skip_existed, keep_raw, to_file_type)
+    max_workers = get_item_with_default_2(conf_file, "to", "max_workers", None)
+    pipeline = get_item_with_default_2(conf_file, "to", "pipeline", False)
+    in_memory = get_item_with_default_2(conf_file, "to", "in_memory", False)
+    memory_limit = get_item_with_default_2(conf_file, "to", "memory_limit", None)
+    to_config = ToConfig(
+        to_type,
+        save_path,
+        multi_process,
+        skip_existed,
+        keep_raw,
+        to_file_type,
+        max_workers,
+        pipeline,
+        in_memory,
+        memory_limit,
+    )
 
     chain = ChainType[conf_file["from"]["chain"]]
     data_source = DataSource[conf_file["from"]["datasource"]]
@@ -125,6 +140,20 @@ def convert_to_config(conf_file: dict) -> Config:
             force_no_proxy = get_item_with_default_3(conf_file, "from", "rpc", "force_no_proxy", False)
             height_cache_path = get_item_with_default_3(conf_file, "from", "rpc", "height_cache_path", None)
             thread = get_item_with_default_3(conf_file, "from", "rpc", "thread", None)
+            async_client = get_item_with_default_3(conf_file, "from", "rpc", "async_client", False)
+            concurrency = get_item_with_default_3(conf_file, "from", "rpc", "concurrency", 100)
+            endpoint_concurrency = get_item_with_default_3(conf_file, "from", "rpc", "endpoint_concurrency", None)
+            request_batch_size = get_item_with_default_3(conf_file, "from", "rpc", "request_batch_size", 100)
+            end_point_weights = get_item_with_default_3(conf_file, "from", "rpc", "end_point_weights", None)
+            rate_limit = get_item_with_default_3(conf_file, "from", "rpc", "rate_limit", None)
+            max_retries = get_item_with_default_3(conf_file, "from", "rpc", "max_retries", 5)
+            retry_backoff = get_item_with_default_3(conf_file, "from", "rpc", "retry_backoff", 1)
+            log_store_path = get_item_with_default_3(conf_file, "from", "rpc", "log_store_path", None)
+            height_source = get_item_with_default_3(conf_file, "from", "rpc", "height_source", None)
+            scan_all_days = get_item_with_default_3(conf_file, "from", "rpc", "scan_all_days", False)
+            timestamp_anchor_stride = get_item_with_default_3(conf_file, "from", "rpc", "timestamp_anchor_stride", 0)
+            if height_source is not None:
+                height_source = HeightSource[height_source]
 
             from_config.rpc = RpcConfig(
                 end_point=end_point,
@@ -135,6 +164,18 @@ def convert_to_config(conf_file: dict) -> Config:
                 force_no_proxy=force_no_proxy,
                 height_cache_path=height_cache_path,
                 thread=thread,
+                async_client=async_client,
+                concurrency=concurrency,
+                endpoint_concurrency=endpoint_concurrency,
+                request_batch_size=request_batch_size,
+                end_point_weights=end_point_weights,
+                rate_limit=rate_limit,
+                max_retries=max_retries,
+                retry_backoff=retry_backoff,
+                log_store_path=log_store_path,
+                height_source=height_source,
+                scan_all_days=scan_all_days,
+                timestamp_anchor_stride=timestamp_anchor_stride,
             )
         case DataSource.big_query:
             if "big_query" not in conf_file["from"]:
@@ -7,15 +7,168 @@
 import dataclasses
 import json
 import os
-from typing import List
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import List, Tuple, Dict
 
 import toml
+from tqdm import tqdm
 
 from ..common import utils as utils
 from . import engine
 from .config import convert_to_config
 from .. import Config
-from ..common import print_log, set_global_pbar, Node
+from ..sources.source_core import prepare_source_days
+from ..sources.source_utils import prepare_heights
+from ..common import print_log, set_global_pbar, Node, DailyNode, AaveDailyNode, TimeUtil, frame_store
+from ..common.nodes import work_on_day, get_pool_init_args, exclusive_day
+
+
+def split_pipeline_steps(steps: List[Node]) -> Tuple[List[Node], List[Node]]:
+    """
+    Split steps into daily steps which can be pipelined day by day, and the rest steps which require data of all days.
+    A daily step can be pipelined only when all its depends can be pipelined.
+
+    :param steps: steps in execution order
+    :return: pipelined steps, rest steps. both are in execution order.
+    """
+    daily_steps = []
+    other_steps = []
+    for step in steps:
+        if isinstance(step, (DailyNode, AaveDailyNode)) and all(d in daily_steps for d in step.depend_instance):
+            daily_steps.append(step)
+        else:
+            other_steps.append(step)
+    return daily_steps, other_steps
+
+
+def _is_in_main_process(step: Node) -> bool:
+    if isinstance(step, (DailyNode, AaveDailyNode)):
+        return step.get_worker_count() <= 1 and not step.execute_in_sub_process
+    return True
+
+
+def set_in_memory_steps(steps: List[Node], root_step: Node, pipelined_steps: List[Node]):
+    """
+    Find out consumers of every step, and decide which steps can pass their output to consumers in memory.
+    Output of a step can stay in memory only if it's not required to be saved,
+    and its consumers will run in the same process with it.
+
+    :param steps: all steps
+    :param root_step: root step, its output is the final result
+    :param pipelined_steps: steps run in pipeline mode
+    """
+    for step in steps:
+        step.consumers = [s for s in steps if step in s.depend_instance]
+    to_config = root_step.config.to_config
+    if not to_config.in_memory or to_config.keep_raw:
+        return
+    for step in steps:
+        if step == root_step or len(step.consumers) < 1:
+            continue
+        if step in pipelined_steps:
+            step.keep_in_memory = all(c in pipelined_steps for c in step.consumers)
+        else:
+            step.keep_in_memory = _is_in_main_process(step) and all(_is_in_main_process(c) for c in step.consumers)
+    print_log("Steps keep output in memory: " + str([s for s in steps if s.keep_in_memory]))
+
+
+def _is_day_pending(step: Node, day: date) -> bool:
+    return not (step.config.to_config.skip_existed and step.is_day_existed(day))
+
+
+def _run_day_chain(steps: List[Node], day: date, scan_steps: List[Node]):
+    """
+    Execute all steps for one day. As steps are sorted, depends of a step are always finished before it.
+    Logs of scan_steps in this day are downloaded together before steps run.
+    """
+    set_global_pbar(None)
+    try:
+        scan_steps = [s for s in scan_steps if _is_day_pending(s, day)]
+        if len(scan_steps) > 1:
+            with exclusive_day(any([s.is_day_exclusive for s in scan_steps])):
+                prepare_source_days([(step, [day]) for step in scan_steps])
+        for step in steps:
+            if _is_day_pending(step, day):
+                work_on_day(step, day)
+    finally:
+        # release frames which are left by a failed step, or whose consumers have finished before
+        frame_store.clear()
+
+
+def run_pipeline(steps: List[Node], worker_count: int):
+    """
+    Run daily steps in pipeline. Instead of finishing a step in all days before next step,
+    all steps of a day are executed together, and different days are executed in a process pool.
+    So downloading of a day can run at the same time with processing of another day.
+
+    Logs of source steps are downloaded together in the chain of every day, so they overlap with other days too.
+    But if scan_all_days is enabled, continuous days are scanned before days start, as they are in one scan.
+    If worker_count is 1 and no step requires sub process, days run one by one in main process.
+    """
+    from_config = steps[0].from_config
+    days = TimeUtil.get_date_array(from_config.start, from_config.end)
+    print_log(f"Pipeline steps: {steps}, workers: {worker_count}")
+    source_steps = [s for s in steps if len(s.depend_instance) < 1]
+    if from_config.rpc is not None and from_config.rpc.scan_all_days:
+        prepare_source_days([(s, [d for d in days if _is_day_pending(s, d)]) for s in source_steps])
+    scan_steps = [s for s in source_steps if not s.days_prepared]
+    execute_in_sub_process = any([s.execute_in_sub_process for s in steps])
+    failures: Dict[date, str] = {}
+    pbar = tqdm(total=len(days), ncols=80, position=0, leave=False)
+    set_global_pbar(pbar)
+    if worker_count <= 1 and not execute_in_sub_process:
+        for day in days:
+            try:
+                _run_day_chain(steps, day, scan_steps)
+            except (Exception, SystemExit) as e:
+                failures[day] = traceback.format_exc()
+                print_log(f"Pipeline in {day} failed: {repr(e)}")
+            set_global_pbar(pbar)
+            pbar.update()
+    else:
+        # source steps of different days wait for each other, as they share height cache
+        with ProcessPoolExecutor(
+            max_workers=worker_count, max_tasks_per_child=1 if execute_in_sub_process else None, **get_pool_init_args()
+        ) as executor:
+            futures = {executor.submit(_run_day_chain, steps, day, scan_steps): day for day in days}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    future.result()
+                except (Exception, SystemExit) as e:
+                    failures[day] = "".join(traceback.format_exception(e))
+                    print_log(f"Pipeline in {day} failed: {repr(e)}")
+                pbar.update()
+    set_global_pbar(None)
+    pbar.close()
+    if len(failures) > 0:
+        for day, error_stack in sorted(failures.items()):
+            print(f"Pipeline in {day} failed:\n{error_stack}")
+        failed_days = ", ".join([str(d) for d in sorted(failures.keys())])
+        raise RuntimeError(f"Pipeline failed in {len(failures)} days: {failed_days}")
+
+
+def get_source_step_days(steps: List[Node]) -> List[Tuple[Node, List[date]]]:
+    """
+    Days which will be downloaded by every source step, source steps are daily steps without depends.
+    """
+    step_days = []
+    for step in steps:
+        if len(step.depend_instance) > 0 or not isinstance(step, (DailyNode, AaveDailyNode)):
+            continue
+        days = TimeUtil.get_date_array(step.from_config.start, step.from_config.end)
+        days = [d for d in days if _is_day_pending(step, d)]
+        step_days.append((step, days))
+    return step_days
+
+
+def get_source_days(step_days: List[Tuple[Node, List[date]]]) -> List[date]:
+    """
+    Days which will be downloaded by any source step
+    """
+    return sorted(set([day for step, days in step_days for day in days]))
 
 
 def download_by_config(config: Config) -> List[str]:
@@ -31,10 +184,24 @@ def download_by_config(config: Config) -> List[str]:
     utils.print_log("Will execute the following steps: " + str(steps))
     # [step.set_config(config) for step in steps]
 
-    for step in steps:
+    daily_steps, rest_steps = [], steps
+    if config.to_config.pipeline:
+        daily_steps, rest_steps = split_pipeline_steps(steps)
+    set_in_memory_steps(steps, root_step, daily_steps)
+    source_step_days = get_source_step_days(steps)
+    prepare_heights(config.from_config, config.to_config.save_path, get_source_days(source_step_days))
+    # query logs of all source steps together, source steps in pipeline are queried in chains of days
+    prepare_source_days([(step, days) for step, days in source_step_days if step not in daily_steps])
+    if len(daily_steps) > 0:
+        worker_count = 1
+        if config.to_config.multi_process:
+            worker_count = config.to_config.max_workers or os.cpu_count()
+        run_pipeline(daily_steps, worker_count)
+    for step in rest_steps:
         set_global_pbar(None)
         print_log(f"Current step: {step.name}")
         step.work()
+    frame_store.clear()
     if config.to_config.keep_raw:
         generated_files = []
         for step in steps:
@@ -45,7 +212,9 @@ def download_by_config(config: Config) -> List[str]:
         for step in steps:
             if step != root_step:
                 for param, sf in step.get_file_paths.items():
-                    os.remove(sf)
+                    # output kept in memory has no file
+                    if os.path.exists(sf):
+                        os.remove(sf)
         return list(root_step.get_file_paths.values())
 
 
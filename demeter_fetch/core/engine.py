@@ -10,7 +10,17 @@ from ..common import Node
 from ..processor_aave import AaveMinute, AaveTick
 from ..processor_gmx2 import GmxV2Tick, GmxV2Price, GmxV2PoolTx, GmxV2Minute
 from ..processor_squeeth import SqueethMinute
-from ..processor_uniswap import UniUserLP, UniPositions, UniTick, UniTickNoPos, UniMinute, UniV4Minute, UniV4Tick
+from ..processor_uniswap import (
+    UniUserLP,
+    UniPositions,
+    UniTick,
+    UniTickNoPos,
+    UniMinute,
+    UniV4Minute,
+    UniV4Tick,
+    UniPoolEvents,
+    UniV4PoolEvents,
+)
 from ..processor_uniswap.relative_price import UniRelativePrice
 from ..sources import (
     UniSourcePool,
@@ -62,9 +72,10 @@ def get_relative_nodes(root: Node) -> List[Node]:
 UniSourcePool.depend = []
 UniSourceProxyTransfer.depend = []
 UniSourceProxyLp.depend = []
-UniMinute.depend = [UniSourcePool]
-UniTick.depend = [UniSourcePool, UniSourceProxyLp]
-UniTickNoPos.depend = [UniSourcePool]
+UniPoolEvents.depend = [UniSourcePool]
+UniMinute.depend = [UniPoolEvents]
+UniTick.depend = [UniPoolEvents, UniSourceProxyLp]
+UniTickNoPos.depend = [UniPoolEvents]
 UniTransaction.depend = [UniTick]
 UniPositions.depend = [UniTick, UniTransaction]
 UniUserLP.depend = [UniPositions]
@@ -80,8 +91,9 @@ SqueethMinute.depend = [SqueethSource, UniRelativePrice]
 
 # Uniswap V4
 UniV4SourcePool.depend = []
-UniV4Minute.depend = [UniV4SourcePool]
-UniV4Tick.depend = [UniV4SourcePool]
+UniV4PoolEvents.depend = [UniV4SourcePool]
+UniV4Minute.depend = [UniV4PoolEvents]
+UniV4Tick.depend = [UniV4PoolEvents]
 
 # Gmx
 GmxV2Source.depend = []
@@ -2,7 +2,7 @@ import sys
 
 from .common.utils import print_log
 from .core import download, get_commend_args
-from .tools import date_to_height, block_timestamp_cache,aave_risk_param
+from .tools import date_to_height, block_timestamp_cache, aave_risk_param, height_cache_migrate, height_cache_backfill
 
 
 def main():
@@ -21,6 +21,10 @@ def main():
             date_to_height(args)
         elif args.tools == "block_timestamp":
             block_timestamp_cache(args)
+        elif args.tools == "height_cache_migrate":
+            height_cache_migrate(args)
+        elif args.tools == "height_cache_backfill":
+            height_cache_backfill(args)
         elif args.tools == "aave":
             aave_risk_param(args)
         pass
@@ -1,10 +1,20 @@
 from _decimal import Decimal
-from typing import List
+from typing import List, Dict
 
 import numpy as np
+import pandas as pd
 
 from ..common import _typing as TYPE
-from ..common import split_topic
+from ..common import (
+    split_topic,
+    AbiField,
+    AbiType,
+    EventLayout,
+    decode_logs,
+    decode_words,
+    get_data_words,
+    words_to_decimal,
+)
 
 RAY = 10**27
 
@@ -19,6 +29,75 @@ def decode_event_ReserveDataUpdated(row):
     )
 
 
+def decode_reserve_data_updated(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column version of decode_event_ReserveDataUpdated
+    """
+    names = ["liquidity_rate", "stable_borrow_rate", "variable_borrow_rate", "liquidity_index", "variable_borrow_index"]
+    return pd.DataFrame(
+        {
+            name: [Decimal(v) / RAY for v in decode_words(get_data_words(df["data"].values, i), AbiType.uint)]
+            for i, name in enumerate(names)
+        },
+        index=df.index,
+    )
+
+
+EVENT_LAYOUTS: Dict[str, EventLayout] = {
+    TYPE.KECCAK.AAVE_SUPPLY: [
+        AbiField("reserve", 1, AbiType.address, True),
+        AbiField("owner", 2, AbiType.address, True),
+        AbiField("amount", 1, AbiType.uint),
+    ],
+    TYPE.KECCAK.AAVE_WITHDRAW: [
+        AbiField("reserve", 1, AbiType.address, True),
+        AbiField("owner", 3, AbiType.address, True),
+        AbiField("amount", 0, AbiType.uint),
+    ],
+    TYPE.KECCAK.AAVE_BORROW: [
+        AbiField("reserve", 1, AbiType.address, True),
+        AbiField("owner", 2, AbiType.address, True),
+        AbiField("amount", 1, AbiType.uint),
+    ],
+    TYPE.KECCAK.AAVE_REPAY: [
+        AbiField("reserve", 1, AbiType.address, True),
+        AbiField("owner", 2, AbiType.address, True),
+        AbiField("amount", 0, AbiType.uint),
+        AbiField("atoken", 1, AbiType.uint),
+    ],
+    TYPE.KECCAK.AAVE_LIQUIDATION: [
+        AbiField("reserve", 1, AbiType.address, True),
+        AbiField("debt_asset", 2, AbiType.address, True),
+        AbiField("owner", 3, AbiType.address, True),
+        AbiField("debt_amount", 0, AbiType.uint),
+        AbiField("amount", 1, AbiType.uint),
+        AbiField("liquidator", 2, AbiType.address),
+        AbiField("atoken", 3, AbiType.uint),
+    ],
+}
+
+
+def decode_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column version of handle_event, columns are the same as the tuple returned by handle_event.
+
+    :param df: logs with tx_type, topics and data column
+    """
+    decoded = decode_logs(df, EVENT_LAYOUTS)
+    return pd.DataFrame(
+        {
+            "reserve": decoded["reserve"],
+            "owner": decoded["owner"],
+            "amount": words_to_decimal(decoded["amount"]),
+            "liquidator": decoded["liquidator"],
+            "debt_asset": decoded["debt_asset"],
+            "debt_amount": words_to_decimal(decoded["debt_amount"]),
+            "atoken": decoded["atoken"],
+        },
+        index=df.index,
+    ).infer_objects()
+
+
 def hex_to_address(topic_str):
     return "0x" + topic_str[26:]
 
@@ -5,7 +5,7 @@ import pandas as pd
 from .. import KECCAK, NodeNames
 from ..common import AaveDailyNode, get_tx_type, get_depend_name
 from ..common.nodes import AaveDailyParam
-from ..processor_aave.aave_utils import decode_event_ReserveDataUpdated
+from ..processor_aave.aave_utils import decode_reserve_data_updated
 from datetime import datetime, date
 
 
@@ -42,7 +42,7 @@ def preprocess_one(raw_df: pd.DataFrame):
             "liquidity_index",
             "variable_borrow_index",
         ]
-    ] = raw_df.apply(decode_event_ReserveDataUpdated, axis=1, result_type="expand")
+    ] = decode_reserve_data_updated(raw_df)
     result_df["block_timestamp"] = pd.to_datetime(raw_df["block_timestamp"])
     result_df = result_df.set_index("block_timestamp")
     if len(result_df.index) == 0:  # if empty
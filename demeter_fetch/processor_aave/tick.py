@@ -2,7 +2,7 @@ from datetime import date
 from typing import Dict, List
 
 import pandas as pd
-from .aave_utils import handle_event
+from .aave_utils import decode_events
 from .. import NodeNames
 from ..common import AaveDailyNode, get_tx_type, KECCAK, get_depend_name
 from ..common.nodes import AaveDailyParam
@@ -48,11 +48,7 @@ def preprocess_one(df: pd.DataFrame):
         for column in df.columns:
             ret_df[column] = None
         return ret_df
-    ret_df[append_columns] = df.apply(
-        lambda x: handle_event(x.tx_type, x.topics, x.data),
-        axis=1,
-        result_type="expand",
-    )
+    ret_df[append_columns] = decode_events(df)
     ret_df[["block_number", "transaction_hash", "block_timestamp", "transaction_index", "log_index", "tx_type"]] = df[
         ["block_number", "transaction_hash", "block_timestamp", "transaction_index", "log_index", "tx_type"]
     ]
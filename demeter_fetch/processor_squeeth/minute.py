@@ -6,7 +6,7 @@ import numpy as np
 import pandas as pd
 
 from .. import NodeNames, Config, DappType, UniswapConfig, TokenConfig
-from ..common import DailyNode, DailyParam, get_depend_name
+from ..common import DailyNode, DailyParam, get_depend_name, AbiType, decode_words, get_data_words
 import copy
 
 
@@ -41,12 +41,13 @@ class SqueethMinute(DailyNode):
             df["WETH"] = eth_price_df["weth"]
             df["OSQTH"] = squeeth_price_df["osqth"]
             return df
-        raw_df["block_timestamp"] = pd.to_datetime(raw_df["block_timestamp"].apply(lambda x: x[0:19]))
+        raw_df["block_timestamp"] = pd.to_datetime(raw_df["block_timestamp"].astype(str).str[0:19])
         raw_df = raw_df.set_index(["block_timestamp"])
-        raw_df["oldNormFactor"] = raw_df["data"].apply(lambda x: Decimal(int(x[2 : 2 + 64], 16)) / Decimal(1e18))
-        raw_df["newNormFactor"] = raw_df["data"].apply(
-            lambda x: Decimal(int(x[2 + 64 : 2 + 64 * 2], 16)) / Decimal(1e18)
-        )
+        data = raw_df["data"].values
+        old_norm_factor = decode_words(get_data_words(data, 0), AbiType.uint)
+        new_norm_factor = decode_words(get_data_words(data, 1), AbiType.uint)
+        raw_df["oldNormFactor"] = [Decimal(v) / Decimal(1e18) for v in old_norm_factor]
+        raw_df["newNormFactor"] = [Decimal(v) / Decimal(1e18) for v in new_norm_factor]
         first_old_norm_factor = raw_df.iloc[0]["oldNormFactor"]
         new_index = pd.date_range(
             start=raw_df.index[0].floor("D"),
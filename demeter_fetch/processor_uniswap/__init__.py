@@ -1,3 +1,4 @@
 from .minute import UniMinute, UniV4Minute
+from .pool_events import UniPoolEvents, UniV4PoolEvents
 from .tick import UniTick, UniTickNoPos, UniV4Tick
 from .position import UniPositions, UniUserLP
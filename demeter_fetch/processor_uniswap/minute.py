@@ -1,20 +1,18 @@
 import datetime
 from dataclasses import dataclass
-from typing import Dict, Callable, List
+from typing import Dict, List
 
 import numpy as np
 import pandas as pd
 
-from . import uniswap_utils as uniswap_utils
 from ..common import (
     DailyNode,
     DailyParam,
-    get_tx_type,
     get_depend_name,
     KECCAK,
     NodeNames,
     TextUtil,
-    to_decimal,
+    exact_int_to_decimal,
 )
 
 columns = [
@@ -60,7 +58,6 @@ class MinuteData:
 def preprocess_df(df: pd.DataFrame) -> pd.DataFrame:
     df["block_timestamp"] = pd.to_datetime(df["block_timestamp"])
     df = df.set_index(keys=["block_timestamp"])
-    df["tx_type"] = df["topics"].apply(get_tx_type)
     return df
 
 
@@ -112,43 +109,23 @@ class UniMinute(DailyNode):
         )
 
     @property
-    def _load_csv_converter(self) -> Dict[str, Callable]:
-        return {
-            "inAmount0": to_decimal,
-            "inAmount1": to_decimal,
-            "currentLiquidity": to_decimal,
-            "netAmount0": to_decimal,
-            "netAmount1": to_decimal,
-        }
+    def _exact_int_columns(self) -> List[str]:
+        return ["inAmount0", "inAmount1", "currentLiquidity", "netAmount0", "netAmount1"]
 
     @property
     def _parse_date_column(self) -> List[str]:
         return ["timestamp"]
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: datetime.date) -> pd.DataFrame:
-        df = data[get_depend_name(NodeNames.uni_pool, self.id)]
+        df = data[get_depend_name(NodeNames.uni_pool_events, self.id)]
         if len(df.index) < 1:
             return pd.DataFrame(columns=columns)
         df = preprocess_df(df)
-        df = df[df["tx_type"] == KECCAK.SWAP]
-        decoded_df = pd.DataFrame()
-        decoded_df[
-            [
-                "sender",
-                "receipt",
-                "amount0",
-                "amount1",
-                "sqrtPriceX96",
-                "currentLiquidity",
-                "current_tick",
-                "tick_lower",
-                "tick_upper",
-                "liquidity",
-                "delta_liquidity",
-            ]
-        ] = df.apply(lambda r: uniswap_utils.handle_event(r.tx_type, r.topics, r.data), axis=1, result_type="expand")
-        decoded_df["inAmount0"] = decoded_df["amount0"].apply(lambda x: x if x > 0 else 0)
-        decoded_df["inAmount1"] = decoded_df["amount1"].apply(lambda x: x if x > 0 else 0)
+        decoded_df = df[df["tx_type"] == KECCAK.SWAP.name]
+        decoded_df = decoded_df.rename(columns={"current_liquidity": "currentLiquidity"})
+        decoded_df["current_tick"] = decoded_df["current_tick"].astype("int64")
+        decoded_df["inAmount0"] = decoded_df["amount0"].clip(lower=0)
+        decoded_df["inAmount1"] = decoded_df["amount1"].clip(lower=0)
         minute_df = get_minute_df(decoded_df)
         minute_df = minute_df[columns]
         minute_df = fill_minute_file_na(minute_df)
@@ -159,37 +136,24 @@ class UniV4Minute(UniMinute):
     name = NodeNames.uni4_minute
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: datetime.date) -> pd.DataFrame:
-        df = data[get_depend_name(NodeNames.uni4_pool, self.id)]
+        df = data[get_depend_name(NodeNames.uni4_pool_events, self.id)]
         if len(df.index) < 1:
             return pd.DataFrame(columns=columns)
         df = preprocess_df(df)
-        df = df[df["tx_type"] == KECCAK.UNI_V4_SWAP]
-        decoded_df = pd.DataFrame()
-        decoded_df[
-            [
-                "pool_id",
-                "sender",
-                "amount0",
-                "amount1",
-                "sqrtPriceX96",
-                "currentLiquidity",
-                "current_tick",
-                "tick_lower",
-                "tick_upper",
-                "delta_liquidity",
-                "fee",
-                "salt",
-            ]
-        ] = df.apply(lambda r: uniswap_utils.handle_v4_event(r.tx_type, r.topics, r.data), axis=1, result_type="expand")
+        decoded_df = df[df["tx_type"] == KECCAK.UNI_V4_SWAP.name]
         decoded_df = decoded_df.drop(columns=["pool_id", "salt", "tick_upper", "tick_lower", "delta_liquidity"])
-        decoded_df["inAmount0"] = decoded_df["amount0"].apply(lambda x: x if x > 0 else 0)
-        decoded_df["inAmount1"] = decoded_df["amount1"].apply(lambda x: x if x > 0 else 0)
+        decoded_df = decoded_df.rename(
+            columns={"sqrt_price_x96": "sqrtPriceX96", "current_liquidity": "currentLiquidity"}
+        )
+        decoded_df[["current_tick", "fee"]] = decoded_df[["current_tick", "fee"]].astype("int64")
+        decoded_df["inAmount0"] = decoded_df["amount0"].clip(lower=0)
+        decoded_df["inAmount1"] = decoded_df["amount1"].clip(lower=0)
 
         minute_df = get_minute_df(decoded_df)
 
-        swap_amount0 = decoded_df.apply(
-            lambda x: x["amount0"] if x["amount0"] > 0 else x["amount0"] / (1 - x["fee"]), axis=1
-        )
+        # fee rate is not an integer, so calculate it with Decimal
+        amount0 = exact_int_to_decimal(decoded_df["amount0"])
+        swap_amount0 = amount0.where(amount0 > 0, amount0 / (1 - decoded_df["fee"]))
         swap_fee = swap_amount0 * decoded_df["fee"]
         swap_amount0_minute = swap_amount0.resample("1min").sum().replace(0, np.nan)
         swap_fee_minute = swap_fee.resample("1min").sum()
@@ -0,0 +1,108 @@
+from datetime import date
+from typing import Dict, Callable, List
+
+import pandas as pd
+
+from .uniswap_utils import decode_pool_events, decode_v4_pool_events, KECCAK_NAMES
+from ..common import DailyNode, DailyParam, NodeNames, get_tx_type, get_depend_name
+
+log_columns = [
+    "block_number",
+    "block_timestamp",
+    "tx_type",
+    "transaction_hash",
+    "transaction_index",
+    "log_index",
+]
+
+pool_event_columns = log_columns + [
+    "sender",
+    "receipt",
+    "amount0",
+    "amount1",
+    "sqrtPriceX96",
+    "current_liquidity",
+    "current_tick",
+    "tick_lower",
+    "tick_upper",
+    "liquidity",
+    "delta_liquidity",
+]
+
+v4_pool_event_columns = log_columns + [
+    "pool_id",
+    "sender",
+    "amount0",
+    "amount1",
+    "sqrt_price_x96",
+    "current_liquidity",
+    "current_tick",
+    "tick_lower",
+    "tick_upper",
+    "delta_liquidity",
+    "fee",
+    "salt",
+]
+
+
+def _decode_pool_day(input_df: pd.DataFrame, decode_func: Callable, columns: List[str]) -> pd.DataFrame:
+    if len(input_df.index) < 1:
+        return pd.DataFrame(columns=columns)
+    df = input_df[[c for c in log_columns if c != "tx_type"] + ["topics", "data"]].copy()
+    df["tx_type"] = df["topics"].map(get_tx_type)
+    decoded = decode_func(df)
+    df[decoded.columns] = decoded
+    df["tx_type"] = df["tx_type"].map(KECCAK_NAMES)
+    return df[columns]
+
+
+def get_pool_events(input_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Decode raw logs of uniswap v3 pool, topics and data are replaced by decoded columns.
+    """
+    return _decode_pool_day(input_df, decode_pool_events, pool_event_columns)
+
+
+def get_v4_pool_events(input_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Decode raw logs of uniswap v4 pool manager, topics and data are replaced by decoded columns.
+    """
+    return _decode_pool_day(input_df, decode_v4_pool_events, v4_pool_event_columns)
+
+
+class UniPoolEvents(DailyNode):
+    """
+    Decoded logs of a pool in a day. It's shared by tick and minute steps, so logs are decoded only once,
+    and it can be reused in later runs if skip_existed is enabled.
+
+    tx_type is name of KECCAK, amounts, prices and liquidity are exact int(null if event doesn't have it),
+    ticks are numbers, and addresses are strings.
+    """
+
+    name = NodeNames.uni_pool_events
+    exact_int_columns = ["amount0", "amount1", "sqrtPriceX96", "current_liquidity", "liquidity", "delta_liquidity"]
+
+    def _get_file_name(self, param: DailyParam) -> str:
+        return (
+            f"{self.from_config.chain.name}-{self.from_config.uniswap_config.pool_address}-{param.day.strftime('%Y-%m-%d')}.events"
+            + self._get_file_ext()
+        )
+
+    @property
+    def _exact_int_columns(self) -> List[str]:
+        return self.exact_int_columns
+
+    @property
+    def _parse_date_column(self) -> List[str]:
+        return ["block_timestamp"]
+
+    def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
+        return get_pool_events(data[get_depend_name(NodeNames.uni_pool, self.id)])
+
+
+class UniV4PoolEvents(UniPoolEvents):
+    name = NodeNames.uni4_pool_events
+    exact_int_columns = ["amount0", "amount1", "sqrt_price_x96", "current_liquidity", "delta_liquidity"]
+
+    def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
+        return get_v4_pool_events(data[get_depend_name(NodeNames.uni4_pool, self.id)])
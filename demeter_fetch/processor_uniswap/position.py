@@ -150,6 +150,8 @@ class UniPositions(Node):
             daily_tick_df = self.get_depend_by_name(NodeNames.uni_tick).read_file(tick_csv_paths[i])
             daily_tx_df = self.get_depend_by_name(NodeNames.uni_tx).read_file(log_csv_paths[i])
             daily_tick_df = daily_tick_df[daily_tick_df["tx_type"].isin(["MINT", "BURN", "COLLECT"])]
+            # collect doesn't change liquidity
+            daily_tick_df["liquidity"] = daily_tick_df["liquidity"].fillna(0)
             tx_hashes = daily_tick_df["transaction_hash"].drop_duplicates()
             owners = {
                 hash: self.get_tx_user(self.from_config.chain, daily_tx_df[daily_tx_df["transaction_hash"] == hash])
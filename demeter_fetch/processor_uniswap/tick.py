@@ -1,13 +1,23 @@
 import datetime
 from dataclasses import dataclass
 from datetime import date
-from decimal import Decimal
-from typing import Dict, Callable, List
+from typing import Dict, List
 
 import pandas as pd
 
-from .uniswap_utils import match_proxy_log, handle_event, handle_proxy_event, handle_v4_event
-from ..common import to_decimal, DailyNode, NodeNames, DailyParam, get_tx_type, get_depend_name, FriendFuncName
+from .pool_events import get_pool_events
+from .uniswap_utils import match_proxy_events, handle_proxy_event
+from ..common import (
+    DailyNode,
+    NodeNames,
+    DailyParam,
+    get_depend_name,
+    FriendFuncName,
+    to_exact_int,
+    add_exact_int,
+)
+
+V4_TX_TYPE_NAMES = {k.name: v for k, v in FriendFuncName.items()}
 
 tick_file_columns = [
     "block_number",
@@ -75,46 +85,25 @@ class PoolTick:
 
 
 def convert_pool_tick_df(input_df: pd.DataFrame) -> pd.DataFrame:
-    if len(input_df.index) < 1:
-        return pd.DataFrame(columns=tick_file_columns)
+    return convert_pool_events_to_tick(get_pool_events(input_df))
 
-    df = input_df.copy()
-    df["tx_type"] = df.apply(lambda x: get_tx_type(x.topics), axis=1)
 
-    df[
-        [
-            "sender",
-            "receipt",
-            "amount0",
-            "amount1",
-            "sqrtPriceX96",
-            "total_liquidity",
-            "current_tick",
-            "tick_lower",
-            "tick_upper",
-            "liquidity",
-            "total_liquidity_delta",
-        ]
-    ] = df.apply(lambda r: handle_event(r.tx_type, r.topics, r.data), axis=1, result_type="expand")
-    df = df.drop(columns=["topics", "data"])
+def convert_pool_events_to_tick(events: pd.DataFrame) -> pd.DataFrame:
+    if len(events.index) < 1:
+        return pd.DataFrame(columns=tick_file_columns)
+
+    df = events.rename(columns={"current_liquidity": "total_liquidity", "delta_liquidity": "total_liquidity_delta"})
     df = df.sort_values(["block_number", "log_index"], ascending=[True, True])
     df[["sqrtPriceX96", "total_liquidity", "current_tick"]] = df[
         ["sqrtPriceX96", "total_liquidity", "current_tick"]
     ].ffill()
-    with pd.option_context("future.no_silent_downcasting", True):
-        df["total_liquidity_delta"] = df["total_liquidity_delta"].fillna(0).infer_objects(copy=False)
-    # convert type to keep decimal
-    df["sqrtPriceX96"] = df.apply(lambda x: convert_to_decimal(x.sqrtPriceX96), axis=1)
-    df["total_liquidity_delta"] = df.apply(lambda x: convert_to_decimal(x.total_liquidity_delta), axis=1)
-    df["liquidity"] = df.apply(lambda x: convert_to_decimal(x.liquidity), axis=1)
-    df["total_liquidity"] = df.apply(lambda x: convert_to_decimal(x.total_liquidity), axis=1)
-
-    df["total_liquidity_delta"] = df.apply(
-        lambda x: get_active_liquidity(x.tick_lower, x.tick_upper, x.current_tick, x.total_liquidity_delta),
-        axis=1,
-    )
-    df["total_liquidity"] = df.apply(lambda x: x.total_liquidity_delta + x.total_liquidity, axis=1)
-    df["tx_type"] = df.apply(lambda x: x.tx_type.name, axis=1)
+    # convert type to keep exact int
+    for column in ["amount0", "amount1", "sqrtPriceX96", "total_liquidity_delta", "liquidity", "total_liquidity"]:
+        df[column] = to_exact_int(df[column])
+    df["total_liquidity_delta"] = df["total_liquidity_delta"].fillna(0)
+
+    df["total_liquidity_delta"] = get_active_liquidity_column(df, "total_liquidity_delta")
+    df["total_liquidity"] = add_exact_int(df["total_liquidity_delta"], df["total_liquidity"])
     df = df.rename(columns={"transaction_index": "tx_index"})
 
     df = df[tick_file_columns]
@@ -132,33 +121,26 @@ class UniTick(DailyNode):
         )
 
     @property
-    def _load_csv_converter(self) -> Dict[str, Callable]:
-        return {
-            "amount0": to_decimal,
-            "amount1": to_decimal,
-            "liquidity": to_decimal,
-            "total_liquidity": to_decimal,
-            "total_liquidity_delta": to_decimal,
-            "sqrtPriceX96": to_decimal,
-        }
+    def _exact_int_columns(self) -> List[str]:
+        return ["amount0", "amount1", "liquidity", "total_liquidity", "total_liquidity_delta", "sqrtPriceX96"]
 
     @property
     def _parse_date_column(self) -> List[str]:
         return ["block_timestamp"]
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: datetime.date) -> pd.DataFrame:
-        pool_df = data[get_depend_name(NodeNames.uni_pool, self.id)]
+        events = data[get_depend_name(NodeNames.uni_pool_events, self.id)]
         proxy_df = data[get_depend_name(NodeNames.uni_proxy_lp, self.id)]
-        match_proxy_log(pool_df, proxy_df)
-        pool_df = pool_df.sort_values(["block_number", "log_index"], ascending=[True, True])
+        match_proxy_events(events, proxy_df)
+        events = events.sort_values(["block_number", "log_index"], ascending=[True, True])
 
-        merged_df = convert_pool_tick_df(pool_df)
-        merged_df[["proxy_topics", "proxy_data", "proxy_log_index"]] = pool_df[
+        merged_df = convert_pool_events_to_tick(events)
+        merged_df[["proxy_topics", "proxy_data", "proxy_log_index"]] = events[
             ["proxy_topics", "proxy_data", "proxy_log_index"]
         ]
         merged_df.rename(columns={"tx_index": "pool_tx_index", "log_index": "pool_log_index"}, inplace=True)
 
-        merged_df["position_id"] = merged_df.apply(lambda x: handle_proxy_event(x.proxy_topics), axis=1)
+        merged_df["position_id"] = merged_df["proxy_topics"].map(handle_proxy_event)
         order = [
             "block_number",
             "block_timestamp",
@@ -194,29 +176,19 @@ class UniTickNoPos(DailyNode):
         )
 
     @property
-    def _load_csv_converter(self) -> Dict[str, Callable]:
-        return {
-            "amount0": to_decimal,
-            "amount1": to_decimal,
-            "total_liquidity": to_decimal,
-            "total_liquidity_delta": to_decimal,
-            "sqrtPriceX96": to_decimal,
-        }
+    def _exact_int_columns(self) -> List[str]:
+        return ["amount0", "amount1", "total_liquidity", "total_liquidity_delta", "sqrtPriceX96"]
 
     @property
     def _parse_date_column(self) -> List[str]:
         return ["block_timestamp"]
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: datetime.date) -> pd.DataFrame:
-        input_param = data[get_depend_name(NodeNames.uni_pool, self.id)]
-        df = convert_pool_tick_df(input_param)
+        events = data[get_depend_name(NodeNames.uni_pool_events, self.id)]
+        df = convert_pool_events_to_tick(events)
         return df
 
 
-def convert_to_decimal(value):
-    return Decimal(value) if value else Decimal(0)
-
-
 def get_active_liquidity(lower_tick, upper_tick, current_tick, delta):
     if lower_tick is None or upper_tick is None or current_tick is None:
         return 0
@@ -226,49 +198,44 @@ def get_active_liquidity(lower_tick, upper_tick, current_tick, delta):
         return 0
 
 
+def get_active_liquidity_column(df: pd.DataFrame, delta_column: str) -> pd.Series:
+    """
+    Column version of get_active_liquidity, delta is kept when lower_tick < current_tick < upper_tick, otherwise 0.
+    Missing ticks are NaN after converting to float, so the comparison will be False.
+    Delta is returned as exact int.
+    """
+    current_tick = df["current_tick"].astype("float64")
+    active = (df["tick_lower"].astype("float64") < current_tick) & (current_tick < df["tick_upper"].astype("float64"))
+    return to_exact_int(df[delta_column]).where(active, 0)
+
+
 class UniV4Tick(UniTick):
     name = NodeNames.uni4_tick
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
-        input_df = data[get_depend_name(NodeNames.uni4_pool, self.id)]
-        if len(input_df.index) < 1:
+        events = data[get_depend_name(NodeNames.uni4_pool_events, self.id)]
+        if len(events.index) < 1:
             return pd.DataFrame(columns=tick_file_columns)
-        df = input_df.copy()
-        df["tx_type"] = df.apply(lambda x: get_tx_type(x.topics), axis=1)
-
-        df[
-            [
-                "pool_id",
-                "sender",
-                "amount0",
-                "amount1",
-                "sqrtPriceX96",
-                "total_liquidity",
-                "current_tick",
-                "tick_lower",
-                "tick_upper",
-                "liquidity",
-                "fee",
-                "position_id",
-            ]
-        ] = df.apply(lambda r: handle_v4_event(r.tx_type, r.topics, r.data), axis=1, result_type="expand")
-        df = df.drop(columns=["topics", "data"])
+        df = events.rename(
+            columns={
+                "sqrt_price_x96": "sqrtPriceX96",
+                "current_liquidity": "total_liquidity",
+                "delta_liquidity": "liquidity",
+                "salt": "position_id",
+            }
+        )
         df = df.sort_values(["block_number", "log_index"], ascending=[True, True])
         df[["sqrtPriceX96", "total_liquidity", "current_tick"]] = df[
             ["sqrtPriceX96", "total_liquidity", "current_tick"]
         ].ffill()
 
-        # convert type to keep decimal
-        df["sqrtPriceX96"] = df.apply(lambda x: convert_to_decimal(x.sqrtPriceX96), axis=1)
-        df["liquidity"] = df.apply(lambda x: convert_to_decimal(x.liquidity), axis=1)
-        df["total_liquidity"] = df.apply(lambda x: convert_to_decimal(x.total_liquidity), axis=1)
+        # convert type to keep exact int
+        for column in ["amount0", "amount1", "sqrtPriceX96", "liquidity", "total_liquidity"]:
+            df[column] = to_exact_int(df[column])
 
-        df["total_liquidity_delta"] = df.apply(
-            lambda x: get_active_liquidity(x.tick_lower, x.tick_upper, x.current_tick, x.liquidity),
-            axis=1,
-        )
-        df["total_liquidity"] = df.apply(lambda x: x.total_liquidity_delta + x.total_liquidity, axis=1)
-        df["tx_type"] = df.apply(lambda x: FriendFuncName[x.tx_type], axis=1)
+        df["total_liquidity_delta"] = get_active_liquidity_column(df, "liquidity")
+        df["total_liquidity"] = add_exact_int(df["total_liquidity_delta"], df["total_liquidity"])
+        df["tx_type"] = df["tx_type"].map(V4_TX_TYPE_NAMES)
         df = df.rename(columns={"transaction_index": "tx_index"})
 
         df = df[v4_tick_file_columns]
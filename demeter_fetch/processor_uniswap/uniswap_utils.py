@@ -1,10 +1,11 @@
 from decimal import Decimal
+from typing import Dict
 
 import numpy as np
 import pandas as pd
 
 from ..common import _typing as _typing
-from ..common import split_topic, get_tx_type
+from ..common import split_topic, get_tx_type, AbiField, AbiType, EventLayout, decode_logs, to_exact_int
 
 
 def signed_int(h):
@@ -107,6 +108,154 @@ def handle_event(tx_type, topics_str, data_hex):
     )
 
 
+KECCAK_NAMES = {k: k.name for k in _typing.KECCAK}
+
+# topic of proxy log for names of pool event
+PROXY_TOPIC_MAPPING = {_typing.KECCAK(k).name: v for k, v in _typing.uni_topic_mapping.items()}
+
+POOL_EVENT_LAYOUTS: Dict[str, EventLayout] = {
+    _typing.KECCAK.SWAP: [
+        AbiField("sender", 1, AbiType.address, True),
+        AbiField("receipt", 2, AbiType.address, True),
+        AbiField("amount0", 0),
+        AbiField("amount1", 1),
+        AbiField("sqrtPriceX96", 2, AbiType.uint),
+        AbiField("current_liquidity", 3, AbiType.uint),
+        AbiField("current_tick", 4, AbiType.int64),
+    ],
+    _typing.KECCAK.BURN: [
+        AbiField("sender", 1, AbiType.address, True),
+        AbiField("tick_lower", 2, AbiType.int64, True),
+        AbiField("tick_upper", 3, AbiType.int64, True),
+        AbiField("liquidity", 0, AbiType.uint),
+        AbiField("amount0", 1, AbiType.uint),
+        AbiField("amount1", 2, AbiType.uint),
+    ],
+    _typing.KECCAK.MINT: [
+        AbiField("tick_lower", 2, AbiType.int64, True),
+        AbiField("tick_upper", 3, AbiType.int64, True),
+        AbiField("sender", 0, AbiType.address),
+        AbiField("liquidity", 1, AbiType.uint),
+        AbiField("amount0", 2, AbiType.uint),
+        AbiField("amount1", 3, AbiType.uint),
+    ],
+    _typing.KECCAK.COLLECT: [
+        AbiField("sender", 1, AbiType.address, True),
+        AbiField("tick_lower", 2, AbiType.int64, True),
+        AbiField("tick_upper", 3, AbiType.int64, True),
+        AbiField("receipt", 0, AbiType.address),
+        AbiField("amount0", 1, AbiType.uint),
+        AbiField("amount1", 2, AbiType.uint),
+    ],
+}
+
+V4_POOL_EVENT_LAYOUTS: Dict[str, EventLayout] = {
+    _typing.KECCAK.UNI_V4_SWAP: [
+        AbiField("pool_id", 1, AbiType.bytes32, True),
+        AbiField("sender", 2, AbiType.address, True),
+        AbiField("amount0", 0),
+        AbiField("amount1", 1),
+        AbiField("sqrt_price_x96", 2, AbiType.uint),
+        AbiField("current_liquidity", 3, AbiType.uint),
+        AbiField("current_tick", 4, AbiType.int64),
+        AbiField("fee", 5, AbiType.uint64),
+    ],
+    _typing.KECCAK.UNI_V4_MODIFY_LIQ: [
+        AbiField("pool_id", 1, AbiType.bytes32, True),
+        AbiField("sender", 2, AbiType.address, True),
+        AbiField("tick_lower", 0, AbiType.int64),
+        AbiField("tick_upper", 1, AbiType.int64),
+        AbiField("delta_liquidity", 2),
+        AbiField("salt", 3, AbiType.bytes32),
+    ],
+}
+
+
+def decode_pool_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column version of handle_event, columns are the same as the tuple returned by handle_event.
+    amounts, price and liquidity are exact int, and null if event doesn't have them.
+
+    :param df: pool logs with tx_type, topics and data column
+    """
+    decoded = decode_logs(df, POOL_EVENT_LAYOUTS)
+    liquidity = to_exact_int(decoded["liquidity"])
+    is_burn = df["tx_type"] == _typing.KECCAK.BURN
+    is_mint = df["tx_type"] == _typing.KECCAK.MINT
+    delta_liquidity = (-liquidity).where(is_burn, liquidity.where(is_mint))
+    ret = pd.DataFrame(
+        {
+            "sender": decoded["sender"],
+            "receipt": decoded["receipt"],
+            "current_tick": decoded["current_tick"],
+            "tick_lower": decoded["tick_lower"],
+            "tick_upper": decoded["tick_upper"],
+        },
+        index=df.index,
+    ).infer_objects()
+    for column in ["amount0", "amount1", "sqrtPriceX96", "current_liquidity"]:
+        ret[column] = to_exact_int(decoded[column])
+    ret["liquidity"] = liquidity
+    ret["delta_liquidity"] = delta_liquidity
+    return ret[
+        [
+            "sender",
+            "receipt",
+            "amount0",
+            "amount1",
+            "sqrtPriceX96",
+            "current_liquidity",
+            "current_tick",
+            "tick_lower",
+            "tick_upper",
+            "liquidity",
+            "delta_liquidity",
+        ]
+    ]
+
+
+def decode_v4_pool_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column version of handle_v4_event, columns are the same as the tuple returned by handle_v4_event.
+
+    :param df: pool logs of uniswap v4 with tx_type, topics and data column
+    """
+    decoded = decode_logs(df, V4_POOL_EVENT_LAYOUTS)
+    ret = pd.DataFrame(
+        {
+            "pool_id": decoded["pool_id"],
+            "sender": decoded["sender"],
+            "current_tick": decoded["current_tick"],
+            "tick_lower": decoded["tick_lower"],
+            "tick_upper": decoded["tick_upper"],
+            "fee": decoded["fee"],
+            "salt": decoded["salt"],
+        },
+        index=df.index,
+    ).infer_objects()
+    # convert amount to v3 way, see handle_v4_event
+    ret["amount0"] = -to_exact_int(decoded["amount0"])
+    ret["amount1"] = -to_exact_int(decoded["amount1"])
+    for column in ["sqrt_price_x96", "current_liquidity", "delta_liquidity"]:
+        ret[column] = to_exact_int(decoded[column])
+    return ret[
+        [
+            "pool_id",
+            "sender",
+            "amount0",
+            "amount1",
+            "sqrt_price_x96",
+            "current_liquidity",
+            "current_tick",
+            "tick_lower",
+            "tick_upper",
+            "delta_liquidity",
+            "fee",
+            "salt",
+        ]
+    ]
+
+
 def handle_v4_event(tx_type, topics_str, data_hex):
     # proprocess topics string ->topic list
     # topics_str = topics.values[0]
@@ -161,56 +310,128 @@ def handle_v4_event(tx_type, topics_str, data_hex):
     )
 
 
-def add_proxy_log(df, index, proxy_row):
-    df.loc[index, "proxy_data"] = proxy_row.data
-    df.at[index, "proxy_topics"] = proxy_row.topics
-    df.loc[index, "proxy_log_index"] = proxy_row.log_index
+def _get_proxy_match_key(topic_name: str, data: str) -> str | None:
+    """
+    Key to join proxy logs with pool events, IncreaseLiquidity is matched by liquidity and amounts,
+    DecreaseLiquidity and Collect are matched by the first word(liquidity or recipient).
+    """
+    match topic_name:
+        case _typing.KECCAK.UNI_PROXY_INCREASE:
+            return data[2:]
+        case _typing.KECCAK.UNI_PROXY_DECREASE | _typing.KECCAK.UNI_PROXY_COLLECT:
+            return data[0:66] if len(data) == 194 else None
+        case _:
+            return None
+
+
+def _get_event_match_key(tx_type: str, receipt: str, liquidity: Decimal, amount0: Decimal, amount1: Decimal):
+    """
+    Key of decoded pool event, it's the same as the part of data used by _get_proxy_match_key
+    """
+    match tx_type:
+        case _typing.KECCAK.MINT.name:
+            return f"{int(liquidity):064x}{int(amount0):064x}{int(amount1):064x}"
+        case _typing.KECCAK.BURN.name:
+            return f"0x{int(liquidity):064x}"
+        case _typing.KECCAK.COLLECT.name:
+            return "0x" + receipt[2:].rjust(64, "0")
+        case _:
+            return None
+
+
+def match_proxy_events(events: pd.DataFrame, proxy_logs: pd.DataFrame):
+    """
+    Find proxy log of mint, burn and collect in decoded pool events,
+    and append proxy_data, proxy_topics, proxy_log_index column to events.
+
+    Logs are joined by transaction hash, topic and match key, then amounts of burn and collect candidates
+    are compared with error. If there are several candidates, the first proxy log is taken.
+
+    :param events: decoded pool events, tx_type is name of KECCAK
+    :param proxy_logs: logs of nft position manager
+    """
+    events["proxy_topics"] = [[]] * events.shape[0]
+
+    proxy_topics = proxy_logs["topics"].apply(split_topic)
+    proxy_df = pd.DataFrame(
+        {
+            "transaction_hash": proxy_logs["transaction_hash"].values,
+            "topic_name": [x[0] for x in proxy_topics],
+            "proxy_position": np.arange(len(proxy_logs.index)),
+        }
+    )
+    proxy_df["key"] = [_get_proxy_match_key(t, d) for t, d in zip(proxy_df["topic_name"], proxy_logs["data"])]
+
+    pool_df = pd.DataFrame(
+        {
+            "transaction_hash": events["transaction_hash"].values,
+            "topic_name": events["tx_type"].map(PROXY_TOPIC_MAPPING).values,
+            "pool_position": np.arange(len(events.index)),
+        }
+    )
+    pool_df["key"] = [
+        _get_event_match_key(*x)
+        for x in zip(events["tx_type"], events["receipt"], events["liquidity"], events["amount0"], events["amount1"])
+    ]
+    candidates = pool_df.dropna(subset=["key"]).merge(
+        proxy_df.dropna(subset=["key"]), on=["transaction_hash", "topic_name", "key"], how="inner"
+    )
+    if len(candidates.index) > 0:
+        is_mint = (candidates["topic_name"] == _typing.KECCAK.UNI_PROXY_INCREASE).values
+        pool_position = candidates["pool_position"].values
+        amount0 = events["amount0"].values[pool_position]
+        amount1 = events["amount1"].values[pool_position]
+        proxy_data = proxy_logs["data"].values[candidates["proxy_position"].values]
+        candidates = candidates[
+            [
+                mint
+                or (
+                    compare_int_with_error(int(a0), int(d[66 : 66 + 64], 16))
+                    and compare_int_with_error(int(a1), int(d[66 + 64 : 66 + 2 * 64], 16))
+                )
+                for mint, a0, a1, d in zip(is_mint, amount0, amount1, proxy_data)
+            ]
+        ]
+        candidates = candidates.sort_values(["pool_position", "proxy_position"]).drop_duplicates("pool_position")
+
+    # if no column is generated
+    if len(candidates.index) == 0:
+        events["proxy_data"] = None
+        events["proxy_topics"] = [[]] * events.shape[0]
+        events["proxy_log_index"] = None
+    else:
+        pool_position = candidates["pool_position"].values
+        proxy_position = candidates["proxy_position"].values
+        data = np.full(len(events.index), np.nan, dtype=object)
+        data[pool_position] = proxy_logs["data"].values[proxy_position]
+        topics = [[]] * len(events.index)
+        for pool_index, proxy_index in zip(pool_position, proxy_position):
+            topics[pool_index] = proxy_topics.iloc[proxy_index]
+        log_index = np.full(len(events.index), np.nan)
+        log_index[pool_position] = proxy_logs["log_index"].values[proxy_position]
+        events["proxy_data"] = data
+        events["proxy_topics"] = topics
+        events["proxy_log_index"] = log_index
 
 
 def match_proxy_log(pool_logs: pd.DataFrame, proxy_logs: pd.DataFrame):
     """
+    Find proxy log of mint, burn and collect in raw pool logs, see match_proxy_events.
 
     :param pool_logs:
     :param proxy_logs:
     :return:
     """
-    pool_logs["tx_type"] = pool_logs.apply(lambda x: get_tx_type(x.topics), axis=1)
-    proxy_logs = proxy_logs.set_index(keys="transaction_hash")
-    pool_logs["topics"] = pool_logs["topics"].apply(lambda x: split_topic(x))
-    proxy_logs["topics"] = proxy_logs["topics"].apply(lambda x: split_topic(x))
-
-    proxy_logs["topic_name"] = proxy_logs["topics"].apply(lambda x: x[0])
+    pool_logs["tx_type"] = pool_logs["topics"].apply(get_tx_type)
+    pool_logs["topics"] = pool_logs["topics"].apply(split_topic)
     pool_logs["topic_name"] = pool_logs["topics"].apply(lambda x: x[0])
 
-    pool_logs["proxy_topics"] = [[]] * pool_logs.shape[0]
-
-    for index, row in pool_logs.iterrows():
-        if row.tx_type == _typing.KECCAK.SWAP:
-            continue
-        if row.transaction_hash not in proxy_logs.index:
-            continue
-        proxy_tx: pd.DataFrame = proxy_logs.loc[[row.transaction_hash]]
-        proxy_tx_matched: pd.DataFrame = proxy_tx.loc[proxy_tx.topic_name == _typing.uni_topic_mapping[row.topic_name]]
-
-        for pindex, possible_match in proxy_tx_matched.iterrows():
-            if row.tx_type == _typing.KECCAK.MINT:
-                if row.data[66:] == possible_match.data[2:]:
-                    add_proxy_log(pool_logs, index, possible_match)
-                    break
-            elif row.tx_type == _typing.KECCAK.COLLECT or row.tx_type == _typing.KECCAK.BURN:
-                if compare_burn_data(row.data, possible_match.data):
-                    add_proxy_log(pool_logs, index, possible_match)
-                    break
-            else:
-                raise ValueError("not supported tx type")
-    # if no column is generated
-
-    if "proxy_data" not in pool_logs.columns:
-        pool_logs["proxy_data"] = None
-        pool_logs["proxy_topics"] = [[]] * pool_logs.shape[0]
-        pool_logs["proxy_log_index"] = None
-    else:
-        pool_logs["proxy_topics"] = pool_logs["proxy_topics"].fillna("[]")
+    events = decode_pool_events(pool_logs)
+    events["transaction_hash"] = pool_logs["transaction_hash"]
+    events["tx_type"] = pool_logs["tx_type"].map(KECCAK_NAMES)
+    match_proxy_events(events, proxy_logs)
+    proxy_columns = ["proxy_topics", "proxy_data", "proxy_log_index"]
+    pool_logs[proxy_columns] = events[proxy_columns]
 
 
 def compare_int_with_error(a: int, b: int, error: int = None) -> bool:
@@ -71,7 +71,7 @@ def query_log_by_chifra(
     )
     if not os.path.exists(tmp_file_name) or os.path.getsize(tmp_file_name) == 0:
         start_height, end_height = get_height_from_date(
-            day, chain, http_proxy, etherscan_api_key
+            day, chain, http_proxy, etherscan_api_key, index_path=to_path
         )
         cmd = get_chifra_cmd(
             start_height, end_height, contract.address, topic0, tmp_file_name
@@ -1,13 +1,15 @@
 import os
-from datetime import date, timezone, datetime
-from typing import List, Dict
+from dataclasses import dataclass
+from datetime import date, timezone, datetime, timedelta
+from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
 
 from . import rpc_utils as rpc_utils
-from .source_utils import get_height_from_date
+from .source_utils import get_height_from_date, get_height_index_path, height_cache
 from .. import ChainType, ChainTypeConfig
-from ..common import FromConfig, KECCAK, utils, split_topic, hex_to_length
+from ..common import FromConfig, HeightSource, KECCAK, utils, split_topic, hex_to_length
 from .source_utils import ContractConfig
 
 
@@ -50,9 +52,70 @@ def _update_df(df: pd.DataFrame) -> pd.DataFrame:
 #     pass
 
 
+def _get_client(config: FromConfig) -> rpc_utils.EthRpcClient:
+    http_proxy = config.http_proxy if not config.rpc.force_no_proxy else None
+    retry_params = dict(
+        weights=config.rpc.end_point_weights,
+        rate_limit=config.rpc.rate_limit,
+        max_retries=config.rpc.max_retries,
+        retry_backoff=config.rpc.retry_backoff,
+    )
+    if config.rpc.async_client:
+        return rpc_utils.AsyncEthRpcClient(
+            config.rpc.end_point,
+            http_proxy,
+            config.rpc.auth_string,
+            config.rpc.concurrency,
+            config.rpc.endpoint_concurrency,
+            config.rpc.request_batch_size,
+            **retry_params,
+        )
+    return rpc_utils.EthRpcClient(
+        config.rpc.end_point,
+        http_proxy,
+        config.rpc.auth_string,
+        config.rpc.thread or 20,
+        config.rpc.request_batch_size,
+        **retry_params,
+    )
+
+
+def _get_height_range(config: FromConfig, save_path: str, day: date, client: rpc_utils.EthRpcClient) -> (int, int):
+    """
+    Height range of a day, client is used to search blocks if height_source is rpc.
+    """
+    if (config.chain, day) in height_cache:
+        return height_cache[(config.chain, day)]
+    return get_height_from_date(
+        day,
+        config.chain,
+        config.http_proxy,
+        config.rpc.etherscan_api_key,
+        index_path=get_height_index_path(config, save_path),
+        block_finder=get_block_finder(config, save_path, client),
+    )
+
+
+def get_block_finder(
+    config: FromConfig, save_path: str, client: rpc_utils.EthRpcClient | None = None
+) -> rpc_utils.BlockFinder | None:
+    """
+    Search height of days with rpc and height cache if height_source is rpc, or etherscan api key is not set.
+    If client is not set, a new client will be created, and caller should close it with block_finder.client.close()
+    """
+    height_source = config.rpc.height_source
+    if height_source is None:
+        height_source = HeightSource.etherscan if config.rpc.etherscan_api_key else HeightSource.rpc
+    if height_source != HeightSource.rpc:
+        return None
+    return rpc_utils.BlockFinder(
+        client if client is not None else _get_client(config), config.chain, get_height_index_path(config, save_path)
+    )
+
+
 def query_logs(
     chain: ChainType,
-    end_point: str,
+    end_point: str | List[str],
     save_path: str,
     start_height: int,
     end_height: int,
@@ -65,8 +128,12 @@ def query_logs(
     skip_timestamp: bool = False,
     height_cache_path: str = None,
     thread: int = 10,
+    client: rpc_utils.EthRpcClient | None = None,
+    log_store_path: str | None = None,
+    anchor_stride: int = 0,
 ) -> pd.DataFrame:
-    client = rpc_utils.EthRpcClient(end_point, http_proxy, auth_string)
+    if client is None:
+        client = rpc_utils.EthRpcClient(end_point, http_proxy, auth_string, thread or 20)
     utils.print_log(f"Will download from height {start_height} to {end_height}")
     try:
         tmp_files_paths: List[str] = rpc_utils.query_event_by_height_concurrent(
@@ -81,24 +148,17 @@ def query_logs(
             skip_timestamp=skip_timestamp,
             height_cache_path=height_cache_path,
             thread=thread,
+            log_store=rpc_utils.LogStore(log_store_path) if log_store_path else None,
+            anchor_stride=anchor_stride,
         )
     except Exception as e:
-        print(e)
-        import traceback
-
-        print(traceback.format_exc())
-        exit(1)
+        utils.print_log(f"Query logs of {contract.address} from {start_height} to {end_height} failed: {repr(e)}")
+        raise e
 
-    current_day_logs = []
     # Load temporary files based on height, then reorganize into raw files by day
     # Note: The logs in the tmp file have been sorted
     # utils.print_log("Generating daily files")
-    for tmp_file in tmp_files_paths:
-        logs: List[Dict] = rpc_utils.load_tmp_file(tmp_file)
-        current_day_logs.extend(logs)
-    df = pd.DataFrame(current_day_logs)
-    if "block_dt" in df.columns:
-        df = df.drop(columns=["block_dt"])
+    df = rpc_utils.load_tmp_files(tmp_files_paths)
     if len(df.index) < 1:
         df = pd.DataFrame(
             columns=[
@@ -121,131 +181,214 @@ def query_logs(
     return df
 
 
-def rpc_pool(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(
+@dataclass
+class LogQuery:
+    contract: ContractConfig
+    one_by_one: bool = False
+    skip_timestamp: bool = False
+
+    @property
+    def tmp_key(self) -> str:
+        return rpc_utils.get_tmp_key(self.contract, self.one_by_one)
+
+
+def _query_day(config: FromConfig, save_path: str, day: date, query: LogQuery) -> pd.DataFrame:
+    client = _get_client(config)
+    try:
+        start_height, end_height = _get_height_range(config, save_path, day, client)
+        daily_df = query_logs(
+            chain=config.chain,
+            end_point=config.rpc.end_point,
+            save_path=save_path,
+            start_height=start_height,
+            end_height=end_height,
+            contract=query.contract,
+            batch_size=config.rpc.batch_size,
+            auth_string=config.rpc.auth_string,
+            http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
+            keep_tmp_files=config.rpc.keep_tmp_files,
+            one_by_one=query.one_by_one,
+            skip_timestamp=query.skip_timestamp,
+            height_cache_path=config.rpc.height_cache_path,
+            log_store_path=config.rpc.log_store_path,
+            thread=config.rpc.thread,
+            client=client,
+            anchor_stride=config.rpc.timestamp_anchor_stride,
+        )
+    finally:
+        client.close()
+    return _update_df(daily_df)
+
+
+def _split_continuous_days(days: List[date]) -> List[List[date]]:
+    groups = []
+    for day in sorted(days):
+        if len(groups) > 0 and groups[-1][-1] + timedelta(days=1) == day:
+            groups[-1].append(day)
+        else:
+            groups.append([day])
+    return groups
+
+
+def rpc_scan_days(config: FromConfig, save_path: str, pending: List[Tuple[LogQuery, List[date]]]) -> List[LogQuery]:
+    """
+    Query logs of several queries and days in one scan, then split logs into tmp files of every query and day,
+    and query of a day will load its tmp file directly.
+
+    * Queries which download all logs of their contract are queried together with an address array,
+      then logs are routed to queries by address and topics. Queries filtered by rpc server (one_by_one)
+      only join them if all logs of their contract are downloaded already, or they are scanned alone.
+    * If scan_all_days is enabled, logs of continuous days are queried together.
+
+    :param config: config of rpc
+    :param save_path: path of tmp files
+    :param pending: queries and the days to be downloaded
+    :return: queries which are scanned, a query left alone without scan_all_days is not scanned, it downloads by day
+    """
+    pending = [(query, days) for query, days in pending if len(days) > 0]
+    full_addresses = set([query.contract.address.lower() for query, days in pending if not query.one_by_one])
+    combined = [(q, d) for q, d in pending if q.contract.address.lower() in full_addresses]
+    alone = [(q, d) for q, d in pending if q.contract.address.lower() not in full_addresses]
+    scanned = []
+    for batch in ([combined] if len(combined) > 0 else []) + [[item] for item in alone]:
+        if _scan_days(config, save_path, batch):
+            scanned.extend([query for query, days in batch])
+    return scanned
+
+
+def _scan_days(config: FromConfig, save_path: str, pending: List[Tuple[LogQuery, List[date]]]) -> bool:
+    if len(pending) < 2 and not config.rpc.scan_all_days:
+        return False
+    all_days = sorted(set([day for query, days in pending for day in days]))
+    groups = _split_continuous_days(all_days) if config.rpc.scan_all_days else [[day] for day in all_days]
+    if len(pending) > 1:
+        addresses = list(dict.fromkeys([query.contract.address.lower() for query, days in pending]))
+        contract = ContractConfig(addresses if len(addresses) > 1 else addresses[0], [])
+        scan_query = LogQuery(contract, False, all([query.skip_timestamp for query, days in pending]))
+    else:
+        scan_query = pending[0][0]
+    log_store = None
+    if config.rpc.log_store_path:
+        log_store = rpc_utils.LogStore(config.rpc.log_store_path)
+    client = _get_client(config)
+    try:
+        _scan_groups(config, save_path, pending, groups, scan_query, client, log_store)
+    finally:
+        client.close()
+    return True
+
+
+def _scan_groups(
+    config: FromConfig,
+    save_path: str,
+    pending: List[Tuple[LogQuery, List[date]]],
+    groups: List[List[date]],
+    scan_query: LogQuery,
+    client: rpc_utils.EthRpcClient,
+    log_store: rpc_utils.LogStore | None,
+):
+    for group in groups:
+        heights = {day: _get_height_range(config, save_path, day, client) for day in group}
+        # tmp files which are not generated yet
+        to_save = []
+        for query, days in pending:
+            for day in group:
+                tmp_file = rpc_utils.get_tmp_file_path(save_path, *heights[day], config.chain, query.tmp_key)
+                if day in days and not os.path.exists(tmp_file):
+                    to_save.append((query, day))
+        if len(to_save) < 1 or (len(pending) < 2 and len(group) < 2):
+            continue
+        start_height, end_height = heights[group[0]][0], heights[group[-1]][1]
+        utils.print_log(f"Scan logs from {group[0]} to {group[-1]}, height from {start_height} to {end_height}")
+        tmp_files_paths = rpc_utils.query_event_by_height_concurrent(
+            config.chain,
+            client,
+            scan_query.contract,
+            start_height,
+            end_height,
+            save_path=save_path,
+            batch_size=config.rpc.batch_size,
+            one_by_one=scan_query.one_by_one,
+            skip_timestamp=scan_query.skip_timestamp,
+            height_cache_path=config.rpc.height_cache_path,
+            thread=config.rpc.thread,
+            log_store=log_store,
+            anchor_stride=config.rpc.timestamp_anchor_stride,
+        )
+        df = rpc_utils.load_tmp_files(tmp_files_paths)
+        query_dfs = {}
+        saved_paths = set()
+        for query, day in to_save:
+            if id(query) not in query_dfs:
+                query_df = df
+                if "address" in df.columns:
+                    query_df = query_df[query_df["address"] == query.contract.address.lower()].drop(columns=["address"])
+                if len(pending) > 1:
+                    query_df = rpc_utils._filter_logs_df(query_df, query.contract)
+                if query.skip_timestamp and "block_timestamp" in query_df.columns:
+                    query_df = query_df.drop(columns=["block_timestamp"])
+                query_dfs[id(query)] = query_df
+            query_df = query_dfs[id(query)]
+            # logs are sorted, so they can be split by searching heights
+            day_start, day_end = heights[day]
+            begin, end = np.searchsorted(query_df["block_number"].to_numpy(), [day_start, day_end + 1])
+            saved_paths.add(
+                rpc_utils.save_tmp_file(
+                    save_path, query_df.iloc[begin:end], day_start, day_end, config.chain, query.tmp_key
+                )
+            )
+        if not config.rpc.keep_tmp_files:
+            for f in tmp_files_paths:
+                if os.path.exists(f) and f not in saved_paths:
+                    os.remove(f)
+
+
+def pool_query(config: FromConfig) -> LogQuery:
+    return LogQuery(
+        ContractConfig(
             config.uniswap_config.pool_address,
             [KECCAK.SWAP.value, KECCAK.BURN.value, KECCAK.COLLECT.value, KECCAK.MINT.value],
-        ),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
-        one_by_one=False,
-        skip_timestamp=False,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
+        )
     )
-    daily_df = _update_df(daily_df)
-    return daily_df
 
 
-def rpc_uni_v4_pool(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(
+def uni_v4_pool_query(config: FromConfig) -> LogQuery:
+    return LogQuery(
+        ContractConfig(
             ChainTypeConfig[config.chain]["uni_v4_pool_manager"],
             [
                 KECCAK.UNI_V4_SWAP.value,
                 KECCAK.UNI_V4_MODIFY_LIQ.value,
             ],
             [config.uniswap_config.pool_address],
-        ),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
-        one_by_one=False,
-        skip_timestamp=False,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
+        )
     )
-    daily_df = _update_df(daily_df)
-    return daily_df
 
 
-def rpc_proxy_lp(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(
+def proxy_lp_query(config: FromConfig) -> LogQuery:
+    return LogQuery(
+        ContractConfig(
             ChainTypeConfig[config.chain]["uniswap_proxy_addr"],
             [
                 KECCAK.UNI_PROXY_DECREASE.value,
                 KECCAK.UNI_PROXY_INCREASE.value,
                 KECCAK.UNI_PROXY_COLLECT.value,
             ],
-        ),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
-        one_by_one=False,
-        skip_timestamp=False,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
+        )
     )
-    daily_df = _update_df(daily_df)
-    return daily_df
 
 
-def rpc_proxy_transfer(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(
-            ChainTypeConfig[config.chain]["uniswap_proxy_addr"],
-            [KECCAK.TRANSFER.value],
-        ),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
+def proxy_transfer_query(config: FromConfig) -> LogQuery:
+    return LogQuery(
+        ContractConfig(ChainTypeConfig[config.chain]["uniswap_proxy_addr"], [KECCAK.TRANSFER.value]),
         one_by_one=True,
         skip_timestamp=True,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
     )
-    daily_df = _update_df(daily_df)
-    return daily_df
 
 
-def rpc_uni_tx(config: FromConfig, tx_hashes: pd.Series) -> pd.DataFrame:
-    http_proxy = config.http_proxy if not config.rpc.force_no_proxy else None
-    client = rpc_utils.EthRpcClient(config.rpc.end_point, http_proxy, config.rpc.auth_string)
-    df = rpc_utils.query_tx(client, tx_hashes)
-    # df = df.drop(columns=["from", "to"])
-    return df
-
-
-def rpc_aave(config: FromConfig, save_path: str, day: date, tokens):
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(
+def aave_query(config: FromConfig) -> LogQuery:
+    return LogQuery(
+        ContractConfig(
             ChainTypeConfig[config.chain]["aave_v3_pool_addr"],
             [
                 KECCAK.AAVE_REPAY.value,
@@ -255,47 +398,66 @@ def rpc_aave(config: FromConfig, save_path: str, day: date, tokens):
                 KECCAK.AAVE_UPDATED.value,
                 KECCAK.AAVE_LIQUIDATION.value,
             ],
+            # reserve is the first indexed argument of those events
+            [hex_to_length(token, 64) for token in config.aave_config.tokens],
         ),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
-        one_by_one=False,
-        skip_timestamp=False,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
+        one_by_one=True,
     )
-    daily_df = _update_df(daily_df)
-    daily_df["topics"] = daily_df["topics"].apply(lambda x: split_topic(x))
-    daily_df["token"] = daily_df["topics"].apply(lambda r: hex_to_length(r[1], 40))
-    daily_df = daily_df[daily_df["token"].isin(tokens)]
-    return daily_df
 
 
-def rpc_squeeth(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
+def squeeth_query(config: FromConfig) -> LogQuery:
     if "squeeth_controller" not in ChainTypeConfig[config.chain]:
         raise RuntimeError(f"Squeeth does not exist in chain {config.chain.name}")
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(
+    return LogQuery(
+        ContractConfig(
             ChainTypeConfig[config.chain]["squeeth_controller"],
             [KECCAK.SQUEETH_NORM_FACTOR_UPDATED.value],
         ),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
         one_by_one=True,
         skip_timestamp=True,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
     )
-    daily_df = _update_df(daily_df)
+
+
+def gmx_v2_query(config: FromConfig) -> LogQuery:
+    return LogQuery(ContractConfig(ChainTypeConfig[config.chain]["gmx_event_emitter"], []), skip_timestamp=True)
+
+
+def rpc_pool(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
+    return _query_day(config, save_path, day, pool_query(config))
+
+
+def rpc_uni_v4_pool(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
+    return _query_day(config, save_path, day, uni_v4_pool_query(config))
+
+
+def rpc_proxy_lp(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
+    return _query_day(config, save_path, day, proxy_lp_query(config))
+
+
+def rpc_proxy_transfer(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
+    return _query_day(config, save_path, day, proxy_transfer_query(config))
+
+
+def rpc_uni_tx(config: FromConfig, tx_hashes: pd.Series) -> pd.DataFrame:
+    client = _get_client(config)
+    try:
+        df = rpc_utils.query_tx(client, tx_hashes)
+    finally:
+        client.close()
+    # df = df.drop(columns=["from", "to"])
+    return df
+
+
+def rpc_aave(config: FromConfig, save_path: str, day: date, tokens):
+    daily_df = _query_day(config, save_path, day, aave_query(config))
+    daily_df["topics"] = daily_df["topics"].apply(lambda x: split_topic(x))
+    daily_df["token"] = daily_df["topics"].apply(lambda r: hex_to_length(r[1], 40))
+    daily_df = daily_df[daily_df["token"].isin(tokens)]
+    return daily_df
+
+
+def rpc_squeeth(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
+    daily_df = _query_day(config, save_path, day, squeeth_query(config))
     daily_df["block_timestamp"] = daily_df["data"].apply(
         lambda x: datetime.fromtimestamp(int(x[64 * 3 + 2 :], 16), tz=timezone.utc)
     )
@@ -304,22 +466,4 @@ def rpc_squeeth(config: FromConfig, save_path: str, day: date) -> pd.DataFrame:
 
 
 def rpc_gmx_v2(config: FromConfig, save_path: str, day: date):
-    start_height, end_height = get_height_from_date(day, config.chain, config.http_proxy, config.rpc.etherscan_api_key)
-    daily_df = query_logs(
-        chain=config.chain,
-        end_point=config.rpc.end_point,
-        save_path=save_path,
-        start_height=start_height,
-        end_height=end_height,
-        contract=ContractConfig(ChainTypeConfig[config.chain]["gmx_event_emitter"], []),
-        batch_size=config.rpc.batch_size,
-        auth_string=config.rpc.auth_string,
-        http_proxy=config.http_proxy if not config.rpc.force_no_proxy else None,
-        keep_tmp_files=config.rpc.keep_tmp_files,
-        one_by_one=False,
-        skip_timestamp=True,
-        height_cache_path=config.rpc.height_cache_path,
-        thread=config.rpc.thread,
-    )
-    daily_df = _update_df(daily_df)
-    return daily_df
+    return _query_day(config, save_path, day, gmx_v2_query(config))
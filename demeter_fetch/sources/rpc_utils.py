@@ -1,41 +1,179 @@
+import asyncio
+import hashlib
+import json
+import math
 import os.path
-import sys
+import re
+import shutil
+import threading
+import time
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future, wait, FIRST_COMPLETED
 
 import numpy as np
 import pandas as pd
 import pickle
+import pyarrow as pa
+import pyarrow.compute as pc
 import random
 import requests
 from dataclasses import dataclass
 from datetime import datetime, UTC, timezone
+from email.utils import parsedate_to_datetime
 from operator import itemgetter
 from sqlitedict import SqliteDict
 from tqdm import tqdm  # process bar
-from typing import List, Dict
+from typing import List, Dict, Tuple, Iterable
 
-from ..common.utils import print_log
+from ..common.abi import decode_words, AbiType
+from ..common.utils import print_log, RateLimiter
 from .. import ChainType, EthError
 from .source_utils import ContractConfig
 
+try:
+    # orjson decodes large responses (e.g. eth_getLogs) faster and with less memory, it's optional
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 
 @dataclass
 class GetLogsParam:
-    address: str
+    address: str | List[str]
     fromBlock: int
     toBlock: int
     topics: List[str] | None
 
 
+class RpcHttpError(RuntimeError):
+    def __init__(self, status_code: int, text: str, retry_after: float | None = None):
+        super().__init__("Request rpc return error with code {}, info: {}".format(status_code, text))
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+RATE_LIMIT_KEYWORDS = ["rate limit", "too many requests", "capacity", "throughput", "compute units", "try again"]
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """
+    Retry-After header can be seconds or http date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _check_response(response):
+    if response.status_code != 200:
+        raise RpcHttpError(response.status_code, response.text, _parse_retry_after(response.headers.get("Retry-After")))
+
+
+def is_retryable_error(e: Exception, method: str) -> bool:
+    if isinstance(e, RpcHttpError):
+        return e.status_code in RETRY_STATUS_CODES
+    if isinstance(e, EthError):
+        return e.code == 429 or any([keyword in str(e.message).lower() for keyword in RATE_LIMIT_KEYWORDS])
+    if "Timeout" in type(e).__name__:
+        return True
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return True
+    # network errors of httpx, httpx is not imported here as it's optional
+    return any([c.__name__ == "TransportError" for c in type(e).__mro__])
+
+
+class RpcEndpoint:
+    def __init__(self, url: str, weight: int = 1, rate_limit: float | None = None):
+        self.url = url
+        self.weight = weight
+        self.current_weight = 0
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        # endpoint will not be used before this time, e.g. it returns 429
+        self.available_at = 0.0
+
+    def get_wait_time(self) -> float:
+        """
+        Seconds to wait before sending a request to this endpoint.
+        """
+        wait_time = max(0.0, self.available_at - time.monotonic())
+        if self.limiter is not None:
+            wait_time = max(wait_time, self.limiter.reserve())
+        return wait_time
+
+
+class EndpointPool:
+    """
+    Choose endpoint with smooth weighted round-robin, endpoints in cooling down are skipped.
+    """
+
+    def __init__(self, urls: str | List[str], weights: List[int] | None = None, rate_limit: float | None = None):
+        if isinstance(urls, str):
+            urls = [urls]
+        if weights is None:
+            weights = [1] * len(urls)
+        if len(weights) != len(urls):
+            raise RuntimeError("count of end point weights should be the same as end points")
+        self.endpoints = [RpcEndpoint(url, weight, rate_limit) for url, weight in zip(urls, weights)]
+        self._lock = threading.Lock()
+
+    def next(self) -> RpcEndpoint:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e.available_at <= now]
+            if len(candidates) < 1:
+                return min(self.endpoints, key=lambda e: e.available_at)
+            total = sum([e.weight for e in candidates])
+            for e in candidates:
+                e.current_weight += e.weight
+            selected = max(candidates, key=lambda e: e.current_weight)
+            selected.current_weight -= total
+            return selected
+
+    def cool_down(self, endpoint: RpcEndpoint, seconds: float):
+        with self._lock:
+            endpoint.available_at = max(endpoint.available_at, time.monotonic() + seconds)
+
+
 class EthRpcClient:
-    def __init__(self, endpoint: str, proxy="", auth=""):
+    def __init__(
+        self,
+        endpoint: str | List[str],
+        proxy="",
+        auth="",
+        pool_size: int = 20,
+        request_batch_size: int = 100,
+        weights: List[int] | None = None,
+        rate_limit: float | None = None,
+        max_retries: int = 5,
+        retry_backoff: float = 1,
+    ):
+        """
+        :param endpoint: endpoint url, or list of endpoints, requests will be distributed by weights
+        :param pool_size: max connections kept in pool, should be no less than the count of threads using this client
+        :param request_batch_size: how many requests are sent in one json rpc batch
+        :param weights: weights of endpoints
+        :param rate_limit: max requests per second of an endpoint
+        :param max_retries: max retry count when request failed by rate limit or network error
+        :param retry_backoff: base delay of exponential backoff in seconds
+        """
+        self._init_endpoints(endpoint, weights, rate_limit, max_retries, retry_backoff)
+        self.request_batch_size = request_batch_size
+        # send topics in eth_getLogs, will be disabled if provider rejects it
+        self.topic_filter = True
         self.session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(pool_connections=5, pool_maxsize=20)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=5, pool_maxsize=max(pool_size, 20))
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
         self.headers = {}
-        self.endpoint = endpoint
         if auth:
             self.headers["Authorization"] = auth
         self.proxies = (
@@ -47,17 +185,44 @@ class EthRpcClient:
             else {}
         )
 
-    def __del__(self):
+    def close(self):
         self.session.close()
 
+    def __del__(self):
+        self.close()
+
+    def _init_endpoints(self, endpoint, weights, rate_limit, max_retries, retry_backoff):
+        self.endpoints = EndpointPool(endpoint, weights, rate_limit)
+        self.endpoint = self.endpoints.endpoints[0].url
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def _get_retry_delay(self, endpoint: RpcEndpoint, e: Exception, method: str, attempt: int) -> float | None:
+        """
+        Decide whether a failed request should be retried. Failed endpoint will cool down, so next attempt may
+        go to another endpoint.
+
+        :return: seconds to wait before retry, None means should not retry
+        """
+        if attempt >= self.max_retries or not is_retryable_error(e, method):
+            return None
+        # exponential backoff with jitter
+        delay = min(60.0, self.retry_backoff * 2**attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if isinstance(e, RpcHttpError) and e.retry_after is not None:
+            delay = e.retry_after
+        self.endpoints.cool_down(endpoint, delay)
+        print_log(f"Request {method} to {endpoint.url} failed: {repr(e)}, will retry, attempt {attempt + 1}")
+        return delay
+
     @staticmethod
-    def __encode_json_rpc(method: str, params: list):
+    def _encode_json_rpc(method: str, params: list):
         return {"jsonrpc": "2.0", "method": method, "params": params, "id": random.randint(1, 2147483648)}
 
     @staticmethod
-    def __decode_json_rpc(response: requests.Response):
+    def _decode_json_rpc(response):
         try:
-            content = response.json()
+            content = _json_loads(response.content)
         except Exception as e:
             print(f"Decode rpc response failed, error: {e}")
             raise e
@@ -66,20 +231,53 @@ class EthRpcClient:
             raise EthError(content["error"]["code"], content["error"]["message"])
         return content["result"]
 
-    def do_post(self, param):
-        return self.session.post(self.endpoint, json=param, proxies=self.proxies, headers=self.headers)
+    def do_post(self, param, endpoint: str | None = None):
+        return self.session.post(endpoint or self.endpoint, json=param, proxies=self.proxies, headers=self.headers)
+
+    def _request(self, payload, decode, method: str):
+        attempt = 0
+        while True:
+            endpoint = self.endpoints.next()
+            wait_time = endpoint.get_wait_time()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            try:
+                response = self.do_post(payload, endpoint.url)
+                _check_response(response)
+                return decode(response)
+            except Exception as e:
+                if self._get_retry_delay(endpoint, e, method, attempt) is None:
+                    raise e
+                attempt += 1
 
     def get_block(self, height):
         return self.send("eth_getBlockByNumber", [hex(height), False])
 
-    def get_block_timestamp(self, height):
-        resp = self.get_block(height)
-        if resp:
-            timestamp = int(resp["timestamp"], 16)
+    @staticmethod
+    def _block_to_timestamp(block: Dict | None) -> datetime | None:
+        if block:
+            timestamp = int(block["timestamp"], 16)
             return datetime.fromtimestamp(timestamp, UTC)
         else:
             return None
 
+    def get_block_timestamp(self, height):
+        return EthRpcClient._block_to_timestamp(self.get_block(height))
+
+    def get_block_timestamps(self, heights: List[int]) -> Dict[int, datetime | None]:
+        """
+        Query timestamp of blocks in json rpc batches
+        """
+        result = {}
+        for height_slice in _cut(heights, self.request_batch_size):
+            blocks = self.send_batch([("eth_getBlockByNumber", [hex(h), False]) for h in height_slice])
+            for height, block in zip(height_slice, blocks):
+                result[height] = EthRpcClient._block_to_timestamp(block)
+        return result
+
+    def get_block_number(self) -> int:
+        return int(self.send("eth_blockNumber", []), 16)
+
     def get_tx_receipt(self, tx_hash):
         return self.send("eth_getTransactionReceipt", [tx_hash])
 
@@ -100,24 +298,305 @@ class EthRpcClient:
         """
         return self.send("eth_getTransactionByHash", [tx_hash])
 
-    def get_logs(self, param: GetLogsParam):
+    @staticmethod
+    def _get_logs_params(param: GetLogsParam) -> List:
         if param.toBlock:
             param.toBlock = hex(param.toBlock)
         if param.fromBlock:
             param.fromBlock = hex(param.fromBlock)
-        return self.send("eth_getLogs", [vars(param)])
+        return [vars(param)]
+
+    def get_logs(self, param: GetLogsParam):
+        return self.send("eth_getLogs", EthRpcClient._get_logs_params(param))
+
+    @staticmethod
+    def _encode_json_rpc_batch(requests_param: List[Tuple[str, List]]) -> List[Dict]:
+        return [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": idx} for idx, (method, params) in enumerate(requests_param)
+        ]
+
+    @staticmethod
+    def _decode_json_rpc_batch(response, count: int) -> List:
+        try:
+            content = _json_loads(response.content)
+        except Exception as e:
+            print(f"Decode rpc response failed, error: {e}")
+            raise e
+        if isinstance(content, dict):
+            # whole batch is rejected
+            if "error" in content:
+                raise EthError(content["error"]["code"], content["error"]["message"])
+            raise RuntimeError(f"Batch request should return a list, but got {content}")
+        # order of responses is not guaranteed
+        content = sorted(content, key=itemgetter("id"))
+        if len(content) != count:
+            raise RuntimeError(f"Batch request has {count} requests, but got {len(content)} responses")
+        for item in content:
+            if "error" in item:
+                raise EthError(item["error"]["code"], item["error"]["message"])
+        return [item["result"] for item in content]
+
+    def send(self, commend: str, params: List):
+        return self._request(EthRpcClient._encode_json_rpc(commend, params), EthRpcClient._decode_json_rpc, commend)
+
+    def send_batch(self, requests_param: List[Tuple[str, List]]) -> List:
+        """
+        Send requests in one json rpc batch.
+
+        :param requests_param: list of (method, params)
+        :return: results in the same order of requests
+        """
+        return self._request(
+            EthRpcClient._encode_json_rpc_batch(requests_param),
+            lambda response: EthRpcClient._decode_json_rpc_batch(response, len(requests_param)),
+            requests_param[0][0],
+        )
+
+
+class AsyncEthRpcClient(EthRpcClient):
+    """
+    Rpc client based on asyncio and httpx, connections are kept alive and reused, and http/2 is used if server supports.
+
+    Requests run in an event loop in a background thread, so this client can be used in the same way as EthRpcClient
+    from any thread, or requests can be submitted without waiting, to keep lots of requests in flight.
+
+    httpx is required, install with: pip install httpx[http2]
+    """
+
+    def __init__(
+        self,
+        endpoint: str | List[str],
+        proxy="",
+        auth="",
+        concurrency: int = 100,
+        endpoint_concurrency: int | None = None,
+        request_batch_size: int = 100,
+        weights: List[int] | None = None,
+        rate_limit: float | None = None,
+        max_retries: int = 5,
+        retry_backoff: float = 1,
+    ):
+        """
+        :param concurrency: max requests in flight
+        :param endpoint_concurrency: max requests in flight for an endpoint, default is the same as concurrency
+
+        other params are the same as EthRpcClient
+        """
+        # do not import httpx unless required
+        import httpx
+
+        self._init_endpoints(endpoint, weights, rate_limit, max_retries, retry_backoff)
+        self.request_batch_size = request_batch_size
+        self.topic_filter = True
+        self.headers = {}
+        if auth:
+            self.headers["Authorization"] = auth
+        self.concurrency = concurrency
+        self.endpoint_concurrency = endpoint_concurrency if endpoint_concurrency else concurrency
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._endpoint_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        try:
+            import h2
+
+            http2 = True
+        except ImportError:
+            http2 = False
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            proxy=proxy if proxy else None,
+            timeout=httpx.Timeout(60),
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+
+    def close(self):
+        # __init__ may fail before loop is created, e.g. httpx is not installed
+        if not hasattr(self, "_loop") or self._loop.is_closed():
+            return
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._loop.close()
+
+    def __del__(self):
+        self.close()
+
+    def _get_endpoint_semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        if endpoint not in self._endpoint_semaphores:
+            self._endpoint_semaphores[endpoint] = asyncio.Semaphore(self.endpoint_concurrency)
+        return self._endpoint_semaphores[endpoint]
+
+    async def do_post_async(self, param, endpoint: str | None = None):
+        endpoint = endpoint or self.endpoint
+        async with self._semaphore:
+            async with self._get_endpoint_semaphore(endpoint):
+                return await self.client.post(endpoint, json=param, headers=self.headers)
+
+    async def _request_async(self, payload, decode, method: str):
+        attempt = 0
+        while True:
+            endpoint = self.endpoints.next()
+            wait_time = endpoint.get_wait_time()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            try:
+                response = await self.do_post_async(payload, endpoint.url)
+                _check_response(response)
+                return decode(response)
+            except Exception as e:
+                if self._get_retry_delay(endpoint, e, method, attempt) is None:
+                    raise e
+                attempt += 1
+
+    async def send_async(self, commend: str, params: List):
+        return await self._request_async(
+            EthRpcClient._encode_json_rpc(commend, params), EthRpcClient._decode_json_rpc, commend
+        )
+
+    async def send_batch_async(self, requests_param: List[Tuple[str, List]]) -> List:
+        return await self._request_async(
+            EthRpcClient._encode_json_rpc_batch(requests_param),
+            lambda response: EthRpcClient._decode_json_rpc_batch(response, len(requests_param)),
+            requests_param[0][0],
+        )
+
+    async def get_block_timestamps_async(self, heights: List[int]) -> Dict[int, datetime | None]:
+        height_slices = _cut(heights, self.request_batch_size)
+        blocks_list = await asyncio.gather(
+            *[self.send_batch_async([("eth_getBlockByNumber", [hex(h), False]) for h in hs]) for hs in height_slices]
+        )
+        result = {}
+        for height_slice, blocks in zip(height_slices, blocks_list):
+            for height, block in zip(height_slice, blocks):
+                result[height] = EthRpcClient._block_to_timestamp(block)
+        return result
+
+    async def get_logs_async(self, param: GetLogsParam):
+        return await self.send_async("eth_getLogs", EthRpcClient._get_logs_params(param))
+
+    def submit(self, coro) -> Future:
+        """
+        Run a coroutine in the event loop of this client, and get a future to wait for it.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
 
     def send(self, commend: str, params: List):
-        response = self.do_post(EthRpcClient.__encode_json_rpc(commend, params))
-        if response.status_code != 200:
-            raise RuntimeError("Request rpc return error with code {}, info: {}".format(response.status_code, response.text))
-        return EthRpcClient.__decode_json_rpc(response)
+        return self.submit(self.send_async(commend, params)).result()
+
+    def send_batch(self, requests_param: List[Tuple[str, List]]) -> List:
+        return self.submit(self.send_batch_async(requests_param)).result()
+
+    def get_block_timestamps(self, heights: List[int]) -> Dict[int, datetime | None]:
+        return self.submit(self.get_block_timestamps_async(heights)).result()
 
 
 class CacheEngineType:
     sqlite = 1
     leveldb = 2
     dict_pickle = 3
+    mmap = 4
+
+
+def _to_timestamp(block_dt: datetime) -> int:
+    # datetimes without timezone in old caches are utc
+    if block_dt.tzinfo is None:
+        block_dt = block_dt.replace(tzinfo=timezone.utc)
+    return int(block_dt.timestamp())
+
+
+class MmapHeightCache:
+    """
+    height => block_timestamp in a memory mapped array, timestamp (in seconds) of a height is at index height - base.
+    0 means the height is not cached. Array grows when higher heights are set.
+    base and dtype (uint32 or uint64) are saved in a json file beside the array.
+    """
+
+    def __init__(self, path: str, dtype: str = "uint32"):
+        self.path = path
+        self.header_path = path + ".json"
+        self.base: int | None = None
+        self.dtype = np.dtype(dtype)
+        self._array: np.memmap | None = None
+        if os.path.exists(self.header_path):
+            with open(self.header_path, "r") as f:
+                header = json.load(f)
+            self.base, self.dtype = header["base"], np.dtype(header["dtype"])
+            if os.path.getsize(self.path) > 0:
+                self._array = np.memmap(self.path, dtype=self.dtype, mode="r+")
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._array is None else len(self._array)
+
+    def get_many(self, heights: np.ndarray) -> np.ndarray:
+        """
+        Get timestamps of heights, 0 if height is not cached.
+        """
+        heights = np.asarray(heights, dtype=np.int64)
+        result = np.zeros(len(heights), dtype=self.dtype)
+        if len(heights) > 0 and self.base is not None and heights.max() - self.base >= self.capacity:
+            # array may be extended by other process
+            self._reload()
+        if self._array is None:
+            return result
+        index = heights - self.base
+        in_range = (index >= 0) & (index < len(self._array))
+        result[in_range] = self._array[index[in_range]]
+        return result
+
+    def set_many(self, heights: np.ndarray, timestamps: np.ndarray):
+        heights = np.asarray(heights, dtype=np.int64)
+        if len(heights) < 1:
+            return
+        self._resize(int(heights.min()), int(heights.max()))
+        self._array[heights - self.base] = timestamps
+
+    def _resize(self, low: int, high: int):
+        if self.base is not None and low >= self.base and high - self.base < self.capacity:
+            return
+        new_base = low if self.base is None else min(low, self.base)
+        new_end = high + 1 if self.base is None else max(high + 1, self.base + self.capacity)
+        # grow more than required, so array will not be resized in every set
+        new_end = max(new_end, new_base + int((new_end - new_base) * 1.25))
+        if self.base is not None and new_base != self.base and self._array is not None:
+            # heights before base, shift old data to a new file
+            old = self._array
+            tmp_path = self.path + ".tmp"
+            new_array = np.memmap(tmp_path, dtype=self.dtype, mode="w+", shape=(new_end - new_base,))
+            new_array[self.base - new_base : self.base - new_base + len(old)] = old
+            new_array.flush()
+            del new_array, old
+            self._array = None
+            os.replace(tmp_path, self.path)
+        else:
+            if self._array is not None:
+                self._array.flush()
+                self._array = None
+            # extend file, new space is filled with zero
+            with open(self.path, "ab") as f:
+                # never shrink, file may be extended by other process
+                f.truncate(max((new_end - new_base) * self.dtype.itemsize, os.path.getsize(self.path)))
+        self.base = new_base
+        self._array = np.memmap(self.path, dtype=self.dtype, mode="r+")
+        self._save_header()
+
+    def _reload(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.capacity * self.dtype.itemsize:
+            self._array = np.memmap(self.path, dtype=self.dtype, mode="r+")
+
+    def _save_header(self):
+        with open(self.header_path, "w") as f:
+            json.dump({"base": self.base, "dtype": self.dtype.name}, f)
+
+    def flush(self):
+        if self._array is not None:
+            self._array.flush()
+
+    def __len__(self):
+        return 0 if self._array is None else int(np.count_nonzero(self._array))
 
 
 class HeightCacheManager:
@@ -131,17 +610,26 @@ class HeightCacheManager:
     sqlitedict: default format
 
     levelDB: fast and take less storage. But it's difficult to install in windows
+
+    mmap: timestamps in a memory mapped array indexed by height, fastest and support vectorized lookup.
+    It's used when it exists, and can be migrated from other engines with migrate_height_cache
     """
 
     sqlite_file_name = "_height_timestamp.sqlite"
     leveldb_file_name = "_height_timestamp_levelDB"
     pkl_file_name = "_height_timestamp.pkl"
+    mmap_file_name = "_height_timestamp.mmap"
 
     def __init__(self, chain: ChainType, save_path: str):
         sqlite_cache_path = os.path.join(save_path, chain.name + HeightCacheManager.sqlite_file_name)
         level_cache_path = os.path.join(save_path, chain.name + HeightCacheManager.leveldb_file_name)
         pkl_cache_path = os.path.join(save_path, chain.name + HeightCacheManager.pkl_file_name)
-        if os.path.exists(level_cache_path):
+        mmap_cache_path = os.path.join(save_path, chain.name + HeightCacheManager.mmap_file_name)
+        if os.path.exists(mmap_cache_path):
+            self.cache_engine = CacheEngineType.mmap
+            self.height_cache_path = mmap_cache_path
+            self._block_dict = MmapHeightCache(mmap_cache_path)
+        elif os.path.exists(level_cache_path):
             self.cache_engine = CacheEngineType.leveldb
             self.height_cache_path = level_cache_path
             # do not import plyvel unless required. in windows install plyvel is too complex(need visual studio c++)
@@ -166,9 +654,11 @@ class HeightCacheManager:
         if self.cache_engine == CacheEngineType.sqlite:
             return item in self._block_dict
         elif self.cache_engine == CacheEngineType.leveldb:
-            return self._block_dict.get(item.to_bytes(4)) is None
+            return self._block_dict.get(item.to_bytes(4)) is not None
         elif self.cache_engine == CacheEngineType.dict_pickle:
             return item in self.block_dict
+        elif self.cache_engine == CacheEngineType.mmap:
+            return self._block_dict.get_many(np.array([item]))[0] > 0
         else:
             return False
 
@@ -180,9 +670,70 @@ class HeightCacheManager:
             return None if cache_val is None else datetime.fromtimestamp(int.from_bytes(cache_val) / 1000, tz=timezone.utc)
         elif self.cache_engine == CacheEngineType.dict_pickle:
             return self.block_dict[height] if height in self.block_dict else None
+        elif self.cache_engine == CacheEngineType.mmap:
+            timestamp = int(self._block_dict.get_many(np.array([height]))[0])
+            return None if timestamp == 0 else datetime.fromtimestamp(timestamp, tz=timezone.utc)
         else:
             return None
 
+    def get_many(self, heights: Iterable[int]) -> Dict[int, datetime]:
+        """
+        Get timestamps of heights, heights not in cache will not be in the result.
+        For sqlite, heights are queried with a few sql instead of one query per height.
+        """
+        heights = list(heights)
+        result = {}
+        if self.cache_engine == CacheEngineType.sqlite:
+            # sqlite limits count of variables in a sql
+            for height_slice in _cut(heights, 900):
+                sql = 'SELECT key, value FROM "%s" WHERE key IN (%s)' % (
+                    self._block_dict.tablename,
+                    ",".join(["?"] * len(height_slice)),
+                )
+                for key, value in self._block_dict.conn.select(sql, tuple(height_slice)):
+                    result[int(key)] = self._block_dict.decode(value)
+        elif self.cache_engine == CacheEngineType.mmap:
+            heights = np.array(heights, dtype=np.int64)
+            timestamps = self._block_dict.get_many(heights)
+            cached = timestamps > 0
+            block_dts = pd.to_datetime(timestamps[cached].astype(np.int64), unit="s", utc=True)
+            result = dict(zip(heights[cached].tolist(), block_dts.to_pydatetime()))
+        else:
+            for height in heights:
+                block_dt = self.get(height)
+                if block_dt is not None:
+                    result[height] = block_dt
+        return result
+
+    def set_many(self, timestamps: Dict[int, datetime]):
+        if self.cache_engine == CacheEngineType.sqlite:
+            self._block_dict.update(timestamps)
+            self.in_mem_count += len(timestamps)
+            if self.in_mem_count >= 1000:
+                self._block_dict.commit()
+                self.in_mem_count = 0
+        elif self.cache_engine == CacheEngineType.mmap:
+            self._block_dict.set_many(
+                np.fromiter(timestamps.keys(), dtype=np.int64, count=len(timestamps)),
+                np.array([_to_timestamp(t) for t in timestamps.values()], dtype=np.int64),
+            )
+        else:
+            for height, timestamp in timestamps.items():
+                self.set(height, timestamp)
+
+    def resolve_timestamps(self, heights: Iterable[int], client: EthRpcClient, thread: int = 10) -> Dict[int, datetime]:
+        """
+        Get timestamps of heights. Read cache in bulk first, then query missed heights in json rpc batches.
+        """
+        heights = set(heights)
+        result = self.get_many(heights)
+        missing_heights = sorted(heights - result.keys())
+        if len(missing_heights) > 0:
+            block_times = _query_block_timestamps(client, missing_heights, thread)
+            self.set_many(block_times)
+            result.update(block_times)
+        return result
+
     def set(self, height: int, timestamp: datetime):
         if self.cache_engine == CacheEngineType.sqlite:
             self._block_dict[height] = timestamp
@@ -194,6 +745,8 @@ class HeightCacheManager:
             self._block_dict.put(height.to_bytes(4), int(timestamp.timestamp() * 1000).to_bytes(6))
         elif self.cache_engine == CacheEngineType.dict_pickle:
             self.block_dict[height] = timestamp
+        elif self.cache_engine == CacheEngineType.mmap:
+            self._block_dict.set_many(np.array([height]), np.array([_to_timestamp(timestamp)]))
 
     def save(self):
         if self.cache_engine == CacheEngineType.sqlite:
@@ -205,19 +758,235 @@ class HeightCacheManager:
             with open(self.height_cache_path, "wb") as f:
                 pickle.dump(self.block_dict, f)
             print_log(f"Save block timestamp cache to {self.height_cache_path}, length: {len(self._block_dict)}")
+        elif self.cache_engine == CacheEngineType.mmap:
+            self._block_dict.flush()
 
     def __del__(self):
         if self.cache_engine == CacheEngineType.sqlite or self.cache_engine == CacheEngineType.leveldb:
             self._block_dict.close()
+        elif self.cache_engine == CacheEngineType.mmap:
+            self._block_dict.flush()
 
     def __len__(self):
         if self.cache_engine == CacheEngineType.sqlite:
             return len(self._block_dict)
         elif self.cache_engine == CacheEngineType.dict_pickle:
             return len(self._block_dict)
+        elif self.cache_engine == CacheEngineType.mmap:
+            return len(self._block_dict)
         else:
             return -1
 
+    def iter_batches(self, batch_size: int = 1_000_000) -> Iterable[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterate all cached heights and timestamps (in seconds) in batches, used in migration.
+        """
+        if self.cache_engine == CacheEngineType.sqlite:
+            last_key = -1
+            while True:
+                sql = 'SELECT key, value FROM "%s" WHERE key > ? ORDER BY key LIMIT %d' % (
+                    self._block_dict.tablename,
+                    batch_size,
+                )
+                rows = list(self._block_dict.conn.select(sql, (last_key,)))
+                if len(rows) < 1:
+                    break
+                last_key = int(rows[-1][0])
+                heights = np.array([int(key) for key, value in rows], dtype=np.int64)
+                yield heights, np.array([_to_timestamp(self._block_dict.decode(value)) for key, value in rows], dtype=np.int64)
+        elif self.cache_engine == CacheEngineType.leveldb:
+            heights, timestamps = [], []
+            for key, value in self._block_dict.iterator():
+                heights.append(int.from_bytes(key))
+                timestamps.append(int.from_bytes(value) // 1000)
+                if len(heights) >= batch_size:
+                    yield np.array(heights, dtype=np.int64), np.array(timestamps, dtype=np.int64)
+                    heights, timestamps = [], []
+            if len(heights) > 0:
+                yield np.array(heights, dtype=np.int64), np.array(timestamps, dtype=np.int64)
+        elif self.cache_engine == CacheEngineType.dict_pickle:
+            items = list(self.block_dict.items())
+            for item_slice in _cut(items, batch_size):
+                yield (
+                    np.array([height for height, block_dt in item_slice], dtype=np.int64),
+                    np.array([_to_timestamp(block_dt) for height, block_dt in item_slice], dtype=np.int64),
+                )
+        elif self.cache_engine == CacheEngineType.mmap:
+            array = self._block_dict
+            for start in range(0, array.capacity, batch_size):
+                heights = np.arange(array.base + start, array.base + min(start + batch_size, array.capacity), dtype=np.int64)
+                timestamps = array.get_many(heights)
+                yield heights[timestamps > 0], timestamps[timestamps > 0]
+
+
+def create_height_cache(chain: ChainType, save_path: str, engine: str) -> HeightCacheManager:
+    """
+    Open height cache in save_path, if there is no cache, create one with engine.
+
+    :param engine: sqlite, levelDB or mmap
+    """
+    paths = {
+        "sqlite": os.path.join(save_path, chain.name + HeightCacheManager.sqlite_file_name),
+        "levelDB": os.path.join(save_path, chain.name + HeightCacheManager.leveldb_file_name),
+        "mmap": os.path.join(save_path, chain.name + HeightCacheManager.mmap_file_name),
+    }
+    if engine not in paths:
+        raise RuntimeError(f"Unknown engine {engine}")
+    pkl_path = os.path.join(save_path, chain.name + HeightCacheManager.pkl_file_name)
+    if not any([os.path.exists(p) for p in list(paths.values()) + [pkl_path]]):
+        if engine == "levelDB":
+            import plyvel
+
+            plyvel.DB(paths[engine], create_if_missing=True).close()
+        elif engine == "mmap":
+            open(paths[engine], "wb").close()
+            with open(paths[engine] + ".json", "w") as f:
+                json.dump({"base": None, "dtype": "uint32"}, f)
+    return HeightCacheManager(chain, save_path)
+
+
+def backfill_height_cache(
+    client: EthRpcClient, cache: HeightCacheManager, start: int, end: int, chunk_size: int = 10000, thread: int = 10
+) -> int:
+    """
+    Query timestamps of all blocks in [start, end] and save them to height cache.
+    Heights are processed in chunks, cached heights are skipped, so it can be resumed after interrupted.
+
+    :param client: rpc client, blocks are queried in json rpc batches with its request_batch_size and rate limit
+    :param cache: height cache of any engine
+    :param start: start height
+    :param end: end height, included
+    :param chunk_size: heights in a chunk, timestamps are saved after a chunk is finished
+    :param thread: count of batches in flight
+    :return: count of blocks queried
+    """
+    queried = 0
+    chunk_starts = range(start, end + 1, chunk_size)
+    with tqdm(total=len(chunk_starts), ncols=80, position=0, leave=False) as pbar:
+        for chunk_start in chunk_starts:
+            heights = range(chunk_start, min(chunk_start + chunk_size, end + 1))
+            missing_heights = sorted(set(heights) - cache.get_many(heights).keys())
+            if len(missing_heights) > 0:
+                cache.set_many(_query_block_timestamps(client, missing_heights, thread))
+                cache.save()
+                queried += len(missing_heights)
+            pbar.update()
+    print_log(f"Height cache from {start} to {end} is filled, {queried} blocks queried")
+    return queried
+
+
+def migrate_height_cache(chain: ChainType, from_path: str, to_path: str, batch_size: int = 1_000_000) -> str:
+    """
+    Copy height cache in sqlite, levelDB or pkl to a memory mapped array, which will be used instead of old cache.
+
+    :param chain: chain of cache
+    :param from_path: folder of old height cache
+    :param to_path: folder of new height cache
+    :param batch_size: heights count copied in a batch
+    :return: path of new cache
+    """
+    mmap_path = os.path.join(to_path, chain.name + HeightCacheManager.mmap_file_name)
+    if os.path.exists(mmap_path):
+        raise RuntimeError(f"Height cache {mmap_path} exists")
+    source = HeightCacheManager(chain, from_path)
+    if source.cache_engine == CacheEngineType.mmap:
+        raise RuntimeError(f"Height cache in {from_path} is memory mapped already")
+    target = MmapHeightCache(mmap_path)
+    count = 0
+    for heights, timestamps in source.iter_batches(batch_size):
+        target.set_many(heights, timestamps)
+        count += len(heights)
+        print_log(f"Migrated {count} heights")
+    target.flush()
+    print_log(f"Height cache is migrated to {mmap_path}, length: {count}")
+    return mmap_path
+
+
+class BlockFinder:
+    """
+    Find block by time with binary search, it works like query_height_api of etherscan.
+    Timestamps of blocks are read from height cache first, and queried with eth_getBlockByNumber if not cached.
+    """
+
+    def __init__(self, client: EthRpcClient, chain: ChainType, height_cache_path: str | None = None):
+        self.client = client
+        self.chain = chain
+        self.height_cache_path = height_cache_path
+        self._height_cache: HeightCacheManager | None = None
+        self._timestamps: Dict[int, int] = {}
+        self._latest_height: int | None = None
+        self.query_count = 0  # blocks queried from rpc
+
+    @property
+    def height_cache(self) -> HeightCacheManager | None:
+        # open cache when it's needed
+        if self._height_cache is None and self.height_cache_path is not None:
+            self._height_cache = HeightCacheManager(self.chain, self.height_cache_path)
+        return self._height_cache
+
+    @property
+    def latest_height(self) -> int:
+        if self._latest_height is None:
+            self._latest_height = self.client.get_block_number()
+        return self._latest_height
+
+    def _get_timestamp(self, height: int) -> int:
+        if height in self._timestamps:
+            return self._timestamps[height]
+        block_dt = self.height_cache.get(height) if self.height_cache is not None else None
+        if block_dt is None:
+            block_dt = self.client.get_block_timestamp(height)
+            self.query_count += 1
+            if self.height_cache is not None:
+                self.height_cache.set(height, block_dt)
+        self._timestamps[height] = int(block_dt.timestamp())
+        return self._timestamps[height]
+
+    def _search(self, timestamp: int, low: int) -> int | None:
+        """
+        Find first block whose timestamp >= timestamp, search starts from low.
+        """
+        high = self.latest_height
+        if self._get_timestamp(high) < timestamp:
+            return None
+        if self._get_timestamp(low) >= timestamp:
+            return low
+        # timestamp of low < timestamp <= timestamp of high
+        interpolate = True
+        while high - low > 1:
+            low_time, high_time = self._get_timestamp(low), self._get_timestamp(high)
+            if interpolate and high_time > low_time:
+                # block time is almost stable, guess by interpolation, so only a few blocks are queried
+                middle = low + (timestamp - low_time) * (high - low) // (high_time - low_time)
+                middle = min(max(middle, low + 1), high - 1)
+            else:
+                middle = (low + high) // 2
+            # use bisection every other step, so searching will not be slower than binary search
+            interpolate = not interpolate
+            if self._get_timestamp(middle) < timestamp:
+                low = middle
+            else:
+                high = middle
+        return high
+
+    def first_block_after(self, time: datetime, low: int = 0) -> int | None:
+        """
+        First block whose timestamp >= time, return None if there is no such block yet.
+        """
+        height = self._search(math.ceil(time.timestamp()), low)
+        if self.height_cache is not None:
+            self.height_cache.save()
+        return height
+
+    def last_block_before(self, time: datetime, low: int = 0) -> int:
+        """
+        Last block whose timestamp <= time.
+        """
+        height = self._search(math.floor(time.timestamp()) + 1, low)
+        if self.height_cache is not None:
+            self.height_cache.save()
+        return self.latest_height if height is None else height - 1
+
 
 def _query_tx_receipt(param):
     tx_hash, client = param
@@ -284,44 +1053,61 @@ def query_event_by_tx(client: EthRpcClient, tx_list: pd.Series, threads=10) -> p
     return df
 
 
-def get_event_slice(client, contract_config, start, end, one_by_one):
+def _get_slice_params(
+    contract_config: ContractConfig, start: int, end: int, one_by_one: bool, topic_filter: bool = True
+) -> List[GetLogsParam]:
+    """
+    If one_by_one, topics in contract_config are filtered by rpc server, topics at the same position are sent as an OR array.
+    else all logs of contract are downloaded, and filtered with _is_log_useful.
+    """
+    topics = [contract_config.topics0, contract_config.topics1, contract_config.topics2, contract_config.topics3]
     # allow download all when no topic is specified
-    if (
-        one_by_one
-        and len(contract_config.topics0) > 0
-        and len(contract_config.topics1) > 0
-        and len(contract_config.topics2) > 0
-        and len(contract_config.topics3) > 0
-    ):
-        logs = []
-        for topic_hex in contract_config.topics0:
-            if len(contract_config.topics1) > 0:
-                for topic1_hex in contract_config.topics1:
-                    if len(contract_config.topics2) > 0:
-                        for topic2_hex in contract_config.topics2:
-                            if len(contract_config.topics3) > 0:
-                                for topic3_hex in contract_config.topics3:
-                                    tmp_logs = client.get_logs(
-                                        GetLogsParam(
-                                            contract_config.address,
-                                            start,
-                                            end,
-                                            [topic_hex, topic1_hex, topic2_hex, topic3_hex],
-                                        )
-                                    )
-                                    logs.extend(tmp_logs)
-                            else:
-                                tmp_logs = client.get_logs(GetLogsParam(contract_config.address, start, end, [topic_hex, topic1_hex, topic2_hex]))
-                                logs.extend(tmp_logs)
-                    else:
-                        tmp_logs = client.get_logs(GetLogsParam(contract_config.address, start, end, [topic_hex, topic1_hex]))
-                        logs.extend(tmp_logs)
-            else:
-                tmp_logs = client.get_logs(GetLogsParam(contract_config.address, start, end, [topic_hex]))
-                logs.extend(tmp_logs)
+    if not one_by_one or not topic_filter or all([len(t) < 1 for t in topics]):
+        return [GetLogsParam(contract_config.address, start, end, None)]
+    topics = [list(t) if len(t) > 0 else None for t in topics]
+    while topics[-1] is None:
+        topics.pop()
+    return [GetLogsParam(contract_config.address, start, end, topics)]
 
-    else:
-        logs = client.get_logs(GetLogsParam(contract_config.address, start, end, None))
+
+def is_topic_filter_rejected(e: Exception) -> bool:
+    """
+    Whether provider can not handle topic filter with OR arrays.
+    """
+    if is_range_limit_error(e) or not isinstance(e, EthError):
+        return False
+    return e.code == -32602 or "topic" in str(e.message).lower()
+
+
+def get_event_slice(client: EthRpcClient, contract_config, start, end, one_by_one):
+    logs = []
+    topic_filter = client.topic_filter
+    try:
+        for param in _get_slice_params(contract_config, start, end, one_by_one, topic_filter):
+            logs.extend(client.get_logs(param))
+    except Exception as e:
+        if not topic_filter or not is_topic_filter_rejected(e):
+            raise e
+        print_log(f"Topic filter is rejected by rpc, will filter logs locally: {e.message}")
+        client.topic_filter = False
+        return get_event_slice(client, contract_config, start, end, one_by_one)
+    return logs
+
+
+async def get_event_slice_async(client: AsyncEthRpcClient, contract_config, start, end, one_by_one):
+    topic_filter = client.topic_filter
+    params = _get_slice_params(contract_config, start, end, one_by_one, topic_filter)
+    try:
+        results = await asyncio.gather(*[client.get_logs_async(param) for param in params])
+    except Exception as e:
+        if not topic_filter or not is_topic_filter_rejected(e):
+            raise e
+        print_log(f"Topic filter is rejected by rpc, will filter logs locally: {e.message}")
+        client.topic_filter = False
+        return await get_event_slice_async(client, contract_config, start, end, one_by_one)
+    logs = []
+    for tmp_logs in results:
+        logs.extend(tmp_logs)
     return logs
 
 
@@ -342,6 +1128,366 @@ def _is_log_useful(log: Dict, contract_config: ContractConfig) -> bool:
     return True
 
 
+# messages of providers when an eth_getLogs query has too many logs or too large block range
+RANGE_LIMIT_PATTERNS = [
+    re.compile(p)
+    for p in [
+        r"query returned more than \d+ results",  # geth, erigon, infura
+        r"log response size exceeded",  # alchemy
+        r"response size should not greater than",  # bsc
+        r"limited to (a )?[\d,]+ (blocks? )?range",  # quicknode
+        r"block range (is )?too (large|wide)",  # ankr, base
+        r"block range limit exceeded",  # chainstack, blast
+        r"exceeds? (the )?max(imum)? block range",  # nodes with max block range of eth_getLogs
+        r"too many (logs|results)",
+    ]
+]
+# "limit exceeded" in EIP-1474, infura also returns it when rate limited
+RANGE_LIMIT_ERROR_CODE = -32005
+# some providers reject large responses with http status
+RANGE_LIMIT_STATUS_CODE = 413
+
+
+def is_range_limit_error(e: Exception) -> bool:
+    """
+    Whether error is caused by too many logs or too large block range in an eth_getLogs query.
+    e.g. "query returned more than 10000 results", "Log response size exceeded", "block range is too large"
+    Timeouts and network errors are not taken as range limit, they are retried by client.
+    """
+    if isinstance(e, RpcHttpError):
+        return e.status_code == RANGE_LIMIT_STATUS_CODE
+    if not isinstance(e, EthError):
+        return False
+    message = str(e.message).lower()
+    if any([pattern.search(message) for pattern in RANGE_LIMIT_PATTERNS]):
+        return True
+    return e.code == RANGE_LIMIT_ERROR_CODE and not any([keyword in message for keyword in RATE_LIMIT_KEYWORDS])
+
+
+class AdaptiveWindow:
+    """
+    Block count of an eth_getLogs query.
+    Window is halved when it hits the limit of provider, and is doubled when there are few logs in it.
+    """
+
+    max_size = 100000
+    # if there are fewer logs in a window, window will grow
+    sparse_log_count = 2000
+
+    def __init__(self, size: int):
+        self.size = size
+        # windows larger than this will hit limit
+        self.ceiling = AdaptiveWindow.max_size
+
+    def on_success(self, block_count: int, log_count: int):
+        if block_count >= self.size and log_count < AdaptiveWindow.sparse_log_count:
+            self.size = min(self.size * 2, self.ceiling)
+
+    def on_limit(self, block_count: int):
+        self.ceiling = max(1, min(self.ceiling, block_count - 1))
+        self.size = max(1, min(self.size, block_count // 2))
+
+
+class LogWindowStore:
+    """
+    Keep learned window size of every query, so next query can start with it.
+    Sizes are keyed by tmp key of query (see get_tmp_key), as queries of a contract filtered by different topics
+    may have very different log density.
+    """
+
+    file_name = "_log_window_size.json"
+
+    def __init__(self, path: str):
+        self.file_path = os.path.join(path, LogWindowStore.file_name)
+
+    def _load(self) -> Dict[str, int]:
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            # file is broken, e.g. written by another process at the same time
+            return {}
+
+    def get(self, chain: ChainType, key: str) -> int | None:
+        return self._load().get(f"{chain.name}:{key.lower()}")
+
+    def set(self, chain: ChainType, key: str, size: int):
+        sizes = self._load()
+        sizes[f"{chain.name}:{key.lower()}"] = size
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(sizes, f, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+
+class LogStore:
+    """
+    Raw logs saved by block range, can be shared by jobs which query the same contract.
+
+    Logs are saved in {path}/{chain}/{address}/{filter}/{start}-{end}.arrow, covered block ranges are recorded by file names.
+    filter is "all" when all logs of the contract are queried, or digest of topics in eth_getLogs params.
+    So a query can be served by logs in its own filter folder and "all" folder.
+    """
+
+    all_logs = "all"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def get_filter_key(params: List[GetLogsParam]) -> str:
+        if all([p.topics is None for p in params]):
+            return LogStore.all_logs
+        topics = sorted([json.dumps(p.topics) for p in params])
+        return hashlib.sha1(",".join(topics).encode()).hexdigest()[:16]
+
+    def _get_folder(self, chain: ChainType, address: str, filter_key: str) -> str:
+        return os.path.join(self.path, chain.name, address.lower(), filter_key)
+
+    def _get_chunks(self, chain: ChainType, address: str, filter_key: str) -> List[Tuple[int, int, str]]:
+        """
+        Get (start, end, path) of chunks which can be used by the filter, sorted by start
+        """
+        chunks = []
+        for key in {LogStore.all_logs, filter_key}:
+            folder = self._get_folder(chain, address, key)
+            if not os.path.exists(folder):
+                continue
+            for file_name in os.listdir(folder):
+                if not file_name.endswith(".arrow"):
+                    continue
+                start, end = file_name[: -len(".arrow")].split("-")
+                chunks.append((int(start), int(end), os.path.join(folder, file_name)))
+        return sorted(chunks)
+
+    def get_gaps(self, chain: ChainType, address: str, filter_key: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Get block ranges between start and end which are not covered by the store
+        """
+        gaps = []
+        cursor = start
+        for chunk_start, chunk_end, _ in self._get_chunks(chain, address, filter_key):
+            if chunk_start > end:
+                break
+            if chunk_end < cursor:
+                continue
+            if chunk_start > cursor:
+                gaps.append((cursor, chunk_start - 1))
+            cursor = chunk_end + 1
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def put(self, chain: ChainType, address: str, filter_key: str, start: int, end: int, logs: pd.DataFrame):
+        folder = self._get_folder(chain, address, filter_key)
+        os.makedirs(folder, exist_ok=True)
+        _write_table(os.path.join(folder, f"{start}-{end}.arrow"), _logs_to_table(logs))
+
+    def load(self, chain: ChainType, address: str, filter_key: str, start: int, end: int) -> pd.DataFrame:
+        """
+        Load logs between start and end, logs are sorted and deduplicated.
+        """
+        tables = []
+        for chunk_start, chunk_end, path in self._get_chunks(chain, address, filter_key):
+            if chunk_end < start or chunk_start > end:
+                continue
+            table = _read_tmp_table(path)
+            if chunk_start < start or chunk_end > end:
+                table = table.filter((pc.field("block_number") >= start) & (pc.field("block_number") <= end))
+            tables.append(table)
+        if len(tables) < 1:
+            return pd.DataFrame(
+                columns=["block_number", "transaction_hash", "transaction_index", "log_index", "data", "topics"]
+            )
+        df = _table_to_logs(pa.concat_tables(tables, promote_options="default"))
+        # chunks in different folders may overlap
+        df = df.drop_duplicates(subset=["block_number", "log_index"])
+        return df.sort_values(["block_number", "log_index"]).reset_index(drop=True)
+
+
+class WindowParts:
+    """
+    Logs of finished windows in a query, so an interrupted query can resume from the missing windows.
+
+    Logs of a window are saved in {path}/{start}-{end}.arrow, then the range is added to {path}/manifest.json,
+    so a window is taken as finished only if its file is complete.
+    """
+
+    manifest_file_name = "manifest.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest_path = os.path.join(path, WindowParts.manifest_file_name)
+        self.ranges: List[Tuple[int, int]] = []
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.ranges = [tuple(r) for r in json.load(f)["ranges"]]
+
+    def _get_part_path(self, start: int, end: int) -> str:
+        return os.path.join(self.path, f"{start}-{end}.arrow")
+
+    def get_gaps(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Get block ranges between start and end which are not finished
+        """
+        gaps = []
+        cursor = start
+        for range_start, range_end in sorted(self.ranges):
+            if range_start > cursor:
+                gaps.append((cursor, range_start - 1))
+            cursor = max(cursor, range_end + 1)
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def put(self, start: int, end: int, logs: pd.DataFrame):
+        os.makedirs(self.path, exist_ok=True)
+        _write_table(self._get_part_path(start, end), _logs_to_table(logs))
+        self.ranges.append((start, end))
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"ranges": self.ranges}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def load(self) -> pd.DataFrame | None:
+        """
+        Load logs of all finished windows, None if no window is finished.
+        """
+        if len(self.ranges) < 1:
+            return None
+        tables = [_read_tmp_table(self._get_part_path(start, end)) for start, end in sorted(self.ranges)]
+        return _table_to_logs(pa.concat_tables(tables, promote_options="default"))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+
+def _query_logs_df(
+    client: EthRpcClient,
+    contract_config: ContractConfig,
+    start_height: int,
+    end_height: int,
+    window: AdaptiveWindow,
+    one_by_one: bool,
+    thread: int,
+    log_filter: ContractConfig | None,
+    with_address: bool = False,
+    parts: WindowParts | None = None,
+) -> pd.DataFrame:
+    """
+    Query logs from start_height to end_height, block range of every query is decided by window.
+    Logs of a window are converted to columns as soon as it's finished, so decoded json is released early.
+
+    :param log_filter: same as contract_config in _raw_logs_to_df
+    :param with_address: same as with_address in _raw_logs_to_df
+    :param parts: if set, logs of finished windows are saved to it instead of memory, and an empty DataFrame is returned
+    """
+
+    max_in_flight = client.concurrency if isinstance(client, AsyncEthRpcClient) else thread
+    log_dfs = []
+    retry_ranges = deque()  # ranges split from failed queries
+    cursor = start_height
+
+    def next_range() -> Tuple[int, int] | None:
+        nonlocal cursor
+        if len(retry_ranges) > 0:
+            return retry_ranges.popleft()
+        if cursor > end_height:
+            return None
+        range_end = min(cursor + window.size - 1, end_height)
+        current_range = cursor, range_end
+        cursor = range_end + 1
+        return current_range
+
+    with ThreadPoolExecutor(max_workers=thread) as t, tqdm(
+        total=end_height - start_height + 1, position=1, leave=False, desc="Loading logs"
+    ) as pbar:
+        running: Dict[Future, Tuple[int, int]] = {}
+        while True:
+            while len(running) < max_in_flight and (query_range := next_range()) is not None:
+                start, end = query_range
+                if isinstance(client, AsyncEthRpcClient):
+                    # requests will be kept in flight in event loop, instead of occupying threads
+                    obj = client.submit(get_event_slice_async(client, contract_config, start, end, one_by_one))
+                else:
+                    obj = t.submit(get_event_slice, client, contract_config, start, end, one_by_one)
+                running[obj] = query_range
+            if len(running) < 1:
+                break
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                start, end = running.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    if not is_range_limit_error(e) or start == end:
+                        raise e
+                    # split the range and query again
+                    window.on_limit(end - start + 1)
+                    middle = (start + end) // 2
+                    retry_ranges.extend([(start, middle), (middle + 1, end)])
+                    continue
+                window.on_success(end - start + 1, len(data))
+                log_df = _raw_logs_to_df(data, log_filter, with_address)
+                if parts is not None:
+                    parts.put(start, end, log_df)
+                else:
+                    log_dfs.append(log_df)
+                pbar.update(end - start + 1)
+    if len(log_dfs) < 1:
+        return _raw_logs_to_df([], log_filter, with_address)
+    return pd.concat(log_dfs, ignore_index=True)
+
+
+def _raw_logs_to_df(
+    raw_log_list: List[Dict], contract_config: ContractConfig | None, with_address: bool = False
+) -> pd.DataFrame:
+    """
+    Convert logs returned by rpc to DataFrame, if contract_config is None, only removed logs are filtered.
+    if with_address, address of log is kept, so logs of an address array can be told apart.
+    Columns are built directly instead of a dict per log.
+    """
+    if contract_config is None:
+        logs = [log for log in raw_log_list if not log["removed"]]
+    else:
+        logs = [log for log in raw_log_list if _is_log_useful(log, contract_config)]
+    data = {
+        "block_number": _hex_to_int([log["blockNumber"] for log in logs]),
+        "transaction_hash": [log["transactionHash"] for log in logs],
+        "transaction_index": _hex_to_int([log["transactionIndex"] for log in logs]),
+        "log_index": _hex_to_int([log["logIndex"] for log in logs]),
+        "data": [log["data"] for log in logs],
+        "topics": [log["topics"] for log in logs],
+    }
+    if with_address:
+        data["address"] = [log["address"].lower() for log in logs]
+    return pd.DataFrame(data)
+
+
+def _hex_to_int(values: List[str]) -> np.ndarray:
+    """
+    Convert hex quantities like block number and log index to int64 in bulk, with the decoder of 64 bits abi words
+    """
+    return decode_words(values, AbiType.int64)
+
+
+def _filter_logs_df(df: pd.DataFrame, contract_config: ContractConfig) -> pd.DataFrame:
+    """
+    Same as _is_log_useful, but works on DataFrame
+    """
+    mask = np.full(len(df.index), True)
+    for i, topics in enumerate(
+        [contract_config.topics0, contract_config.topics1, contract_config.topics2, contract_config.topics3]
+    ):
+        if len(topics) > 0:
+            topic_set = set(topics)
+            mask &= np.array([len(t) > i and t[i] in topic_set for t in df["topics"]], dtype=bool)
+    return df[mask].reset_index(drop=True)
+
+
 def query_event_by_height_concurrent(
     chain: ChainType,
     client: EthRpcClient,
@@ -355,79 +1501,74 @@ def query_event_by_height_concurrent(
     one_by_one: bool = False,
     skip_timestamp: bool = False,
     thread: int = 10,
+    log_store: LogStore | None = None,
+    anchor_stride: int = 0,
 ) -> List[str]:
     """
 
 
 
     :param chain:
-    :param client:
-    :param contract_config:
+    :param client: rpc client, if it's an AsyncEthRpcClient, logs are queried in its event loop instead of threads
+    :param contract_config: if address is a list, logs of all addresses are queried together, and address column is kept
     :param start_height:
     :param end_height:
     :param height_cache:
     :param height_cache_path:
     :param save_path:
-    :param batch_size:
+    :param batch_size: block count in a query at the beginning. it will be adjusted by count of logs and provider limits
     :param one_by_one: query every log in contract_config one by one, or download all logs then filter with contract_config
     :param skip_timestamp:
-    :param thread:
+    :param thread: count of threads (or requests in flight for sync client), default is 20 if it's not set
+    :param log_store: if set, logs are loaded from log store, and only blocks not in store are queried. not used for address list
+    :param anchor_stride: if > 0, block timestamps are inferred from anchor blocks at this stride, see _infer_block_timestamps
     :return:
     """
-    tmp_file_path = get_tmp_file_path(save_path, start_height, end_height, chain, contract_config.address)
+    # thread in [from.rpc] is optional, use the same default as client
+    thread = thread or 20
+    address_key = get_address_key(contract_config.address)
+    multi_address = isinstance(contract_config.address, list)
+    tmp_key = get_tmp_key(contract_config, one_by_one)
+    tmp_file_path = get_tmp_file_path(save_path, start_height, end_height, chain, tmp_key)
     if os.path.exists(tmp_file_path):
         return [tmp_file_path]
     if not height_cache:
         height_cache = HeightCacheManager(chain, save_path if height_cache_path is None else height_cache_path)
-    print_log(f"Querying {contract_config.address} from {start_height} to {end_height}")
-    task_list = [start_height + i * batch_size for i in range((end_height - start_height) // batch_size + 1)]
-    raw_log_list = []
-    with ThreadPoolExecutor(max_workers=thread) as t:
-        async_list = []
-        for start in task_list:
-            end = start + batch_size - 1
-            if end > end_height:
-                end = end_height
-            obj = t.submit(get_event_slice, client, contract_config, start, end, one_by_one)
-            async_list.append(obj)
-        for future in tqdm(as_completed(async_list), total=len(async_list), position=1, leave=False, desc="Loading logs"):
-            try:
-                data = future.result()
-                raw_log_list.extend(data)
-            except Exception as e:
-                print(e)
-                sys.exit(1)
-    log_list = []
-    for log in raw_log_list:
-        if not _is_log_useful(log, contract_config):
-            continue
-        log["blockNumber"] = int(log["blockNumber"], 16)
-
-        # block_number, block_timestamp, transaction_hash, transaction_index, log_index, topics, data
-        log_list.append(
-            {
-                "block_number": log["blockNumber"],
-                "transaction_hash": log["transactionHash"],
-                "transaction_index": log["transactionIndex"],
-                "log_index": log["logIndex"],
-                "data": log["data"],
-                "topics": log["topics"],
-            }
-        )
-    for log in log_list:
-        log["log_index"] = int(log["log_index"], 16)
-        log["transaction_index"] = int(log["transaction_index"], 16)
-
+    print_log(f"Querying {address_key} from {start_height} to {end_height}")
+    window_store = LogWindowStore(save_path if height_cache_path is None else height_cache_path)
+    window = AdaptiveWindow(window_store.get(chain, tmp_key) or batch_size)
+    # finished windows are saved beside tmp file, so the query can be resumed if it's interrupted
+    parts = WindowParts(tmp_file_path + ".parts")
+    if log_store is None or multi_address:
+        for gap_start, gap_end in parts.get_gaps(start_height, end_height):
+            _query_logs_df(
+                client, contract_config, gap_start, gap_end, window, one_by_one, thread, contract_config, multi_address, parts
+            )
+        log_df = parts.load()
+        if log_df is None:
+            log_df = _raw_logs_to_df([], contract_config, multi_address)
+    else:
+        params = _get_slice_params(contract_config, start_height, end_height, one_by_one, client.topic_filter)
+        filter_key = LogStore.get_filter_key(params)
+        for gap_start, gap_end in log_store.get_gaps(chain, contract_config.address, filter_key, start_height, end_height):
+            gap_parts = WindowParts(os.path.join(parts.path, f"{gap_start}-{gap_end}"))
+            for window_start, window_end in gap_parts.get_gaps(gap_start, gap_end):
+                _query_logs_df(client, contract_config, window_start, window_end, window, one_by_one, thread, None, parts=gap_parts)
+            # save all logs returned, so they can be used by queries with other topics
+            gap_df = gap_parts.load()
+            if gap_df is None:
+                gap_df = _raw_logs_to_df([], None)
+            log_store.put(chain, contract_config.address, filter_key, gap_start, gap_end, gap_df)
+            gap_parts.remove()
+        log_df = log_store.load(chain, contract_config.address, filter_key, start_height, end_height)
+        log_df = _filter_logs_df(log_df, contract_config)
+    window_store.set(chain, tmp_key, window.size)
     if not skip_timestamp:
-        with ThreadPoolExecutor(max_workers=thread) as t:
-            async_list = []
-            for data in log_list:
-                obj = t.submit(_fill_block_info, data, client, height_cache)
-                async_list.append(obj)
-            for future in tqdm(as_completed(async_list), total=len(async_list), position=1, leave=False, desc="Appending timestamp"):
-                future.result()
+        _fill_block_timestamps(log_df, client, height_cache, thread, anchor_stride)
     height_cache.save()
-    return [save_tmp_file(save_path, log_list, start_height, end_height, chain, contract_config.address)]
+    tmp_file_path = save_tmp_file(save_path, log_df, start_height, end_height, chain, tmp_key)
+    parts.remove()
+    return [tmp_file_path]
 
 
 def query_event_by_height(
@@ -550,23 +1691,147 @@ def query_event_by_height(
     return tmp_file_full_path_list
 
 
-def load_tmp_file(full_path) -> List:
-    with open(full_path, "rb") as f:
-        data = pickle.load(f)
-    return data
+# column types of tmp file, hashes are saved as fixed width binary
+TMP_FILE_SCHEMA = {
+    "block_number": pa.uint64(),
+    "block_timestamp": pa.timestamp("s", tz="UTC"),
+    "transaction_hash": pa.binary(32),
+    "transaction_index": pa.uint32(),
+    "log_index": pa.uint32(),
+    "data": pa.string(),
+    "topics": pa.list_(pa.string()),
+    "address": pa.string(),
+}
+_HEX_TABLE = np.array([f"{i:02x}" for i in range(256)])
+
+
+def _logs_to_table(logs: pd.DataFrame) -> pa.Table:
+    """
+    Convert logs to arrow table with typed columns, columns not in TMP_FILE_SCHEMA(such as block_dt) are dropped.
+    """
+    arrays = {}
+    for name, data_type in TMP_FILE_SCHEMA.items():
+        if name not in logs.columns:
+            continue
+        column = logs[name]
+        match name:
+            case "transaction_hash":
+                arrays[name] = pa.array([bytes.fromhex(h[2:]) for h in column], type=data_type)
+            case "block_timestamp":
+                arrays[name] = pa.Array.from_pandas(pd.to_datetime(column, utc=True)).cast(data_type)
+            case "topics":
+                arrays[name] = pa.array(list(column), type=data_type)
+            case _:
+                arrays[name] = pa.array(column, type=data_type)
+    if len(arrays) < 1:  # empty list of old version
+        return pa.table({k: pa.array([], type=v) for k, v in TMP_FILE_SCHEMA.items() if k != "block_timestamp"})
+    return pa.table(arrays)
+
+
+def _binary_to_hex(column: pa.ChunkedArray) -> np.ndarray:
+    array = column.combine_chunks()
+    width = array.type.byte_width
+    if len(array) < 1:
+        return np.array([], dtype=object)
+    buffer = np.frombuffer(array.buffers()[1], dtype=np.uint8)
+    buffer = buffer[array.offset * width : (array.offset + len(array)) * width].reshape(-1, width)
+    # look up hex of every byte, then join them by viewing as a long string
+    hex_str = np.ascontiguousarray(_HEX_TABLE[buffer]).view(f"<U{width * 2}").ravel()
+    return np.char.add("0x", hex_str).astype(object)
+
+
+def _table_to_logs(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert arrow table to DataFrame, the values are the same with those before saving.
+    """
+    df = pd.DataFrame(index=pd.RangeIndex(table.num_rows))
+    for name in table.column_names:
+        column = table.column(name)
+        match name:
+            case "transaction_hash":
+                df[name] = _binary_to_hex(column)
+            case "block_timestamp":
+                df[name] = column.to_pandas().dt.strftime("%Y-%m-%d %H:%M:%S")
+            case "topics":
+                df[name] = column.to_pylist()
+            case "block_number" | "transaction_index" | "log_index":
+                df[name] = column.to_pandas().astype(np.int64)
+            case _:
+                df[name] = column.to_pandas()
+    return df
+
+
+def _read_tmp_table(full_path) -> pa.Table:
+    if full_path.endswith(".pkl"):
+        # tmp files of old version are pickled DataFrame or list of logs
+        with open(full_path, "rb") as f:
+            data = pickle.load(f)
+        return _logs_to_table(pd.DataFrame(data) if isinstance(data, list) else data)
+    # memory map file, so data is not copied until converting to DataFrame
+    return pa.ipc.open_file(pa.memory_map(full_path)).read_all()
+
+
+def load_tmp_file(full_path) -> pd.DataFrame:
+    return _table_to_logs(_read_tmp_table(full_path))
+
+
+def load_tmp_files(full_paths: List[str]) -> pd.DataFrame:
+    """
+    Load and concat tmp files, tables are concatenated without copy, and converted to DataFrame once.
+    """
+    tables = [_read_tmp_table(p) for p in full_paths]
+    if len(tables) < 1:
+        return pd.DataFrame()
+    return _table_to_logs(pa.concat_tables(tables, promote_options="default"))
+
+
+def get_address_key(address: str | List[str]) -> str:
+    """
+    Name of an address or address list, used in names of tmp files
+    """
+    if isinstance(address, list):
+        return "_".join(sorted([a.lower() for a in address]))
+    return address
+
+
+def get_tmp_key(contract_config: ContractConfig, one_by_one: bool) -> str:
+    """
+    Name of tmp files of a query. Queries filtered by rpc server have a topic hash in name,
+    so they will not share tmp files with other queries of the same contract, e.g. proxy lp and proxy transfer.
+    """
+    address_key = get_address_key(contract_config.address)
+    topics = [contract_config.topics0, contract_config.topics1, contract_config.topics2, contract_config.topics3]
+    if not one_by_one or all([len(t) < 1 for t in topics]):
+        return address_key
+    return address_key + "-" + hashlib.sha1(json.dumps(topics).encode()).hexdigest()[:8]
 
 
 def get_tmp_file_path(save_path, start, end, chain, address):
-    return os.path.join(save_path, f"{chain.name}-{address}-{start}-{end}.tmp.pkl")
+    return os.path.join(save_path, f"{chain.name}-{address}-{start}-{end}.tmp.arrow")
 
 
-def save_tmp_file(save_path, logs, start, end, chain, address):
+def save_tmp_file(save_path, logs: pd.DataFrame | List, start, end, chain, address):
+    """
+    Save logs as arrow ipc file, logs are sorted by block_number and log_index.
+    """
     file_path = get_tmp_file_path(save_path, start, end, chain, address)
-    with open(file_path, "wb") as f:
-        pickle.dump(logs, f)
+    if isinstance(logs, list):
+        logs = pd.DataFrame(logs)
+    if len(logs.index) > 0:
+        logs = logs.sort_values(["block_number", "log_index"])
+    _write_table(file_path, _logs_to_table(logs))
     return file_path
 
 
+def _write_table(file_path: str, table: pa.Table):
+    # write to another file first, so a broken file will not be taken as downloaded
+    writing_path = f"{file_path}.{os.getpid()}.writing"
+    with pa.OSFile(writing_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(writing_path, file_path)
+
+
 def _cut(obj, sec):
     return [obj[i : i + sec] for i in range(0, len(obj), sec)]
 
@@ -580,6 +1845,65 @@ def _fill_block_info(log, client: EthRpcClient, cache_manager: HeightCacheManage
     log["block_dt"] = cache_manager.get(height)
 
 
+def _query_block_timestamps(client: EthRpcClient, heights: List[int], thread: int) -> Dict[int, datetime]:
+    if isinstance(client, AsyncEthRpcClient):
+        block_times = client.get_block_timestamps(heights)
+    else:
+        block_times = {}
+        with ThreadPoolExecutor(max_workers=thread) as t:
+            async_list = [t.submit(client.get_block_timestamps, hs) for hs in _cut(heights, client.request_batch_size)]
+            for future in tqdm(as_completed(async_list), total=len(async_list), position=1, leave=False, desc="Appending timestamp"):
+                block_times.update(future.result())
+    for height, block_dt in block_times.items():
+        if block_dt is None:
+            raise RuntimeError(f"Block {height} not found")
+    return block_times
+
+
+def _infer_block_timestamps(
+    heights: np.ndarray, client: EthRpcClient, cache_manager: HeightCacheManager, thread: int, stride: int
+) -> Dict[int, datetime]:
+    """
+    Get timestamps of heights from anchor blocks at multiples of stride, as block timestamps are monotonic.
+    If the anchors before and after a block are in the same second, or one second apart, timestamp of the earlier anchor is used,
+    so error is less than 1 second. Otherwise, the exact block is queried.
+    Only anchors and exact blocks are queried and saved to cache, inferred timestamps are not cached.
+    If anchors are not fewer than heights (logs are sparse), all heights are queried directly.
+    """
+    heights = np.unique(heights)
+    # anchors after the last height may not exist yet
+    lower = heights // stride * stride
+    upper = np.minimum(lower + stride, heights[-1])
+    anchors = np.unique(np.concatenate([lower, upper]))
+    if len(anchors) >= len(heights):
+        return cache_manager.resolve_timestamps(heights.tolist(), client, thread)
+    anchor_times = cache_manager.resolve_timestamps(anchors.tolist(), client, thread)
+    anchor_ts = np.array([anchor_times[a].timestamp() for a in anchors.tolist()], dtype=np.int64)
+    lower_ts = anchor_ts[np.searchsorted(anchors, lower)]
+    upper_ts = anchor_ts[np.searchsorted(anchors, upper)]
+    need_query = upper_ts - lower_ts > 1
+    block_dts = pd.to_datetime(lower_ts[~need_query], unit="s", utc=True).to_pydatetime()
+    result = dict(zip(heights[~need_query].tolist(), block_dts))
+    result.update(cache_manager.resolve_timestamps(heights[need_query].tolist(), client, thread))
+    return result
+
+
+def _fill_block_timestamps(
+    df: pd.DataFrame, client: EthRpcClient, cache_manager: HeightCacheManager, thread: int = 10, anchor_stride: int = 0
+):
+    """
+    Fill block timestamp of logs. Heights are deduplicated, and timestamps are resolved in bulk.
+    If anchor_stride > 0, timestamps are inferred from anchor blocks.
+    """
+    if anchor_stride > 0 and len(df.index) > 0:
+        block_times = _infer_block_timestamps(df["block_number"].to_numpy(), client, cache_manager, thread, anchor_stride)
+    else:
+        block_times = cache_manager.resolve_timestamps(df["block_number"].unique().tolist(), client, thread)
+    block_dt = pd.to_datetime(df["block_number"].map(block_times), utc=True)
+    df["block_timestamp"] = block_dt.dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["block_dt"] = block_dt
+
+
 def set_position_id(row: pd.Series) -> str:
     if (row["position_id"] is not None) and (not np.isnan(row["position_id"])):
         return str(int(row["position_id"]))
@@ -5,7 +5,7 @@
 # @Description:
 from dataclasses import dataclass
 from datetime import date
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import pandas as pd
 
@@ -28,9 +28,17 @@ from .rpc import (
     rpc_squeeth,
     rpc_uni_v4_pool,
     rpc_gmx_v2,
+    rpc_scan_days,
+    pool_query,
+    uni_v4_pool_query,
+    proxy_lp_query,
+    proxy_transfer_query,
+    aave_query,
+    squeeth_query,
+    gmx_v2_query,
 )
 from .. import ToFileType
-from ..common import DataSource, NodeNames, DailyNode, DailyParam, AaveDailyNode, utils, get_depend_name
+from ..common import DataSource, NodeNames, DailyNode, DailyParam, AaveDailyNode, Node, utils, get_depend_name
 from ..common.nodes import AaveDailyParam
 
 
@@ -47,6 +55,10 @@ class EventLog:
 
 class UniSourcePool(DailyNode):
     name = NodeNames.uni_pool
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date):
         df: pd.DataFrame | None = None
@@ -72,6 +84,10 @@ class UniSourcePool(DailyNode):
 
 class UniV4SourcePool(DailyNode):
     name = NodeNames.uni4_pool
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date):
         df: pd.DataFrame | None = None
@@ -95,6 +111,10 @@ class UniV4SourcePool(DailyNode):
 
 class UniSourceProxyLp(DailyNode):
     name = NodeNames.uni_proxy_lp
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date):
         df: pd.DataFrame | None = None
@@ -116,6 +136,10 @@ class UniSourceProxyLp(DailyNode):
 
 class UniSourceProxyTransfer(DailyNode):
     name = NodeNames.uni_proxy_transfer
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date):
         df: pd.DataFrame | None = None
@@ -166,6 +190,10 @@ class UniTransaction(DailyNode):
 
 class AaveSource(AaveDailyNode):
     name = NodeNames.aave_raw
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date, tokens: List[str]) -> Dict[str, pd.DataFrame]:
         df: pd.DataFrame | None = None
@@ -196,6 +224,10 @@ class AaveSource(AaveDailyNode):
 
 class SqueethSource(DailyNode):
     name = NodeNames.osqth_raw
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date):
         df: pd.DataFrame | None = None
@@ -220,6 +252,10 @@ class SqueethSource(DailyNode):
 
 class GmxV2Source(DailyNode):
     name = NodeNames.gmx2_raw
+    use_height_cache = True
+
+    def _prepare_days(self, days: List[date]):
+        prepare_source_days([(self, days)])
 
     def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date):
         if self.config.to_config.to_file_type == ToFileType.csv:
@@ -239,3 +275,33 @@ class GmxV2Source(DailyNode):
 
     def _get_file_name(self, param: DailyParam) -> str:
         return f"{self.from_config.chain.name}-GmxV2-{param.day.strftime('%Y-%m-%d')}.raw" + self._get_file_ext()
+
+
+_RPC_QUERIES = {
+    UniSourcePool: pool_query,
+    UniV4SourcePool: uni_v4_pool_query,
+    UniSourceProxyLp: proxy_lp_query,
+    UniSourceProxyTransfer: proxy_transfer_query,
+    AaveSource: aave_query,
+    SqueethSource: squeeth_query,
+    GmxV2Source: gmx_v2_query,
+}
+
+
+def prepare_source_days(step_days: List[Tuple[Node, List[date]]]):
+    """
+    Download logs of source steps before they work, so logs of all steps and days can be queried in one scan.
+    Only works for rpc source, steps are grouped by chain and save path.
+    Steps whose logs are scanned are marked as prepared, others will download by day when they work.
+    """
+    groups: Dict[tuple, List[Tuple[Node, List[date]]]] = {}
+    for step, days in step_days:
+        if type(step) not in _RPC_QUERIES or step.from_config.data_source != DataSource.rpc or len(days) < 1:
+            continue
+        groups.setdefault((step.from_config.chain, step.to_path), []).append((step, days))
+    for (chain, to_path), items in groups.items():
+        pending = [(_RPC_QUERIES[type(step)](step.from_config), days) for step, days in items]
+        scanned = rpc_scan_days(items[0][0].from_config, to_path, pending)
+        for (step, days), (query, _) in zip(items, pending):
+            if any([query is q for q in scanned]):
+                step.days_prepared = True
@@ -1,39 +1,172 @@
-import time
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Tuple, Dict
 
 from ..common import utils as utils
-from .. import ChainType
+from .. import ChainType, DataSource
+from ..common import FromConfig
 
 
 @dataclass
 class ContractConfig:
-    address: str
+    address: str | List[str]  # a list of addresses can be queried in one eth_getLogs
     topics0: List[str]
     topics1: List[str]=field(default_factory=list)
     topics2: List[str]=field(default_factory=list)
     topics3: List[str]=field(default_factory=list)
 
 
-height_cache: Dict[date, Tuple[int, int]] = {}
+# height range of days, key is (chain, day)
+height_cache: Dict[Tuple[ChainType, date], Tuple[int, int]] = {}
+
+
+class DayHeightIndex:
+    """
+    First block of every day(UTC) of a chain, persisted in _day_height_{chain}.json.
+    Last block of a day is the first block of next day - 1, so N days can be resolved with N+1 queries.
+    """
+
+    def __init__(self, chain: ChainType, path: str):
+        self.file_path = os.path.join(path, f"_day_height_{chain.name}.json")
+
+    def load(self) -> Dict[date, int]:
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, "r") as f:
+                return {date.fromisoformat(k): v for k, v in json.load(f).items()}
+        except ValueError:
+            # file is broken, e.g. written by another process at the same time
+            return {}
+
+    def update(self, first_blocks: Dict[date, int]):
+        if len(first_blocks) < 1:
+            return
+        heights = self.load()
+        heights.update(first_blocks)
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({k.isoformat(): v for k, v in sorted(heights.items())}, f, indent=0)
+        os.replace(tmp_path, self.file_path)
+
+
+def resolve_heights(
+    days: List[date],
+    chain: ChainType,
+    http_proxy,
+    etherscan_api_key,
+    index_path: str | None = None,
+    sleep_seconds=0.5,
+    sleep_seconds_without_key=8,
+    block_finder=None,
+) -> Dict[date, Tuple[int, int]]:
+    """
+    Resolve height range of days, first blocks of days are queried from etherscan concurrently under rate limit,
+    and are kept in DayHeightIndex if index_path is set.
+    If block_finder(rpc_utils.BlockFinder) is set, blocks will be searched in height cache and rpc instead of etherscan.
+    """
+    if etherscan_api_key is None:
+        sleep_seconds = sleep_seconds_without_key
+    index = DayHeightIndex(chain, index_path) if index_path is not None else None
+    first_blocks = index.load() if index is not None else {}
+    now = datetime.now(timezone.utc)
+    # first block of tomorrow does not exist, end height of today should be queried with end time.
+    midnights = sorted(set(days) | {d + timedelta(days=1) for d in days})
+    to_query = [d for d in midnights if d not in first_blocks and _midnight(d) <= now]
+    if len(to_query) > 0 and block_finder is not None:
+        utils.print_log(f"Search first block of {len(to_query)} days")
+        queried = {}
+        low = 0
+        for day in to_query:
+            # days are sorted, so searching can start from the previous day
+            height = block_finder.first_block_after(_midnight(day), low)
+            if height is None:
+                # no block after this midnight yet, so there isn't a block after later midnights either
+                break
+            queried[day] = low = height
+    elif len(to_query) > 0:
+        utils.print_log(f"Query first block of {len(to_query)} days")
+        limiter = utils.RateLimiter(1 / sleep_seconds, 1)
+
+        def query_first_block(day: date) -> Tuple[date, int]:
+            limiter.acquire()  # to prevent request limit
+            return day, utils.ApiUtil.query_blockno_from_time(chain, _midnight(day), False, http_proxy, etherscan_api_key)
+
+        with ThreadPoolExecutor(max_workers=4) as t:
+            queried = dict(t.map(query_first_block, to_query))
+    if len(to_query) > 0:
+        first_blocks.update(queried)
+        if index is not None:
+            # blocks near now may be reorganized
+            index.update({k: v for k, v in queried.items() if _midnight(k) < now - timedelta(hours=1)})
+
+    result = {}
+    for day in days:
+        if day not in first_blocks:
+            raise RuntimeError(f"Can not find first block of {day} in {chain.name}, there may be no block in this day yet")
+        if day + timedelta(days=1) in first_blocks:
+            end_height = first_blocks[day + timedelta(days=1)] - 1
+        elif block_finder is not None:
+            end_height = block_finder.last_block_before(datetime.combine(day, datetime.max.time(), tzinfo=timezone.utc))
+        else:
+            end_height = utils.ApiUtil.query_blockno_from_time(
+                chain, datetime.combine(day, datetime.max.time()), True, http_proxy, etherscan_api_key
+            )
+        result[day] = (first_blocks[day], end_height)
+        height_cache[(chain, day)] = result[day]
+    return result
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
 
 
 def get_height_from_date(
-    day: date, chain: ChainType, http_proxy, etherscan_api_key, sleep_seconds=0.5, sleep_seconds_without_key=8
+    day: date,
+    chain: ChainType,
+    http_proxy,
+    etherscan_api_key,
+    sleep_seconds=0.5,
+    sleep_seconds_without_key=8,
+    index_path: str | None = None,
+    block_finder=None,
 ) -> (int, int):
-    if day in height_cache.keys():
-        return height_cache[day]
+    if (chain, day) in height_cache.keys():
+        return height_cache[(chain, day)]
     utils.print_log(f"Query height range in {day}")
-    if etherscan_api_key is None:
-        sleep_seconds = sleep_seconds_without_key
-    start_height = utils.ApiUtil.query_blockno_from_time(
-        chain, datetime.combine(day, datetime.min.time()), False, http_proxy, etherscan_api_key
-    )
-    utils.print_log(f"Querying end timestamp, wait for {sleep_seconds} seconds to prevent max rate limit")
-    time.sleep(sleep_seconds)  # to prevent request limit
-    end_height = utils.ApiUtil.query_blockno_from_time(
-        chain, datetime.combine(day, datetime.max.time()), True, http_proxy, etherscan_api_key
-    )
-    height_cache[day] = (start_height, end_height)
-    return start_height, end_height
+    return resolve_heights(
+        [day], chain, http_proxy, etherscan_api_key, index_path, sleep_seconds, sleep_seconds_without_key, block_finder
+    )[day]
+
+
+def prepare_heights(config: FromConfig, save_path: str, days: List[date]):
+    """
+    Resolve height range of days before download, so etherscan is not queried day by day.
+    """
+    block_finder = None
+    match config.data_source:
+        case DataSource.rpc:
+            from .rpc import get_block_finder
+
+            etherscan_api_key = config.rpc.etherscan_api_key
+            index_path = get_height_index_path(config, save_path)
+            block_finder = get_block_finder(config, save_path)
+        case DataSource.chifra:
+            etherscan_api_key = config.chifra_config.etherscan_api_key
+            index_path = save_path
+        case _:
+            return
+    try:
+        if len(days) < 1:
+            return
+        resolve_heights(days, config.chain, config.http_proxy, etherscan_api_key, index_path, block_finder=block_finder)
+    finally:
+        if block_finder is not None:
+            block_finder.client.close()
+
+
+def get_height_index_path(config: FromConfig, save_path: str) -> str:
+    return config.rpc.height_cache_path if config.rpc.height_cache_path is not None else save_path
@@ -1,2 +1,2 @@
-from .time_tools import date_to_height, block_timestamp_cache
+from .time_tools import date_to_height, block_timestamp_cache, height_cache_migrate, height_cache_backfill
 from .aave import aave_risk_param
\ No newline at end of file
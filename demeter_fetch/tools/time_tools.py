@@ -1,8 +1,10 @@
+import os
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 
 from ..common.utils import ApiUtil, print_log
 from .. import ChainType
+from ..sources.rpc_utils import BlockFinder, EthRpcClient, migrate_height_cache, create_height_cache, backfill_height_cache
 from ..tools import bigquery_tools
 
 
@@ -10,6 +12,13 @@ def date_to_height(args):
     chain = ChainType[args.chain]
     start = datetime.strptime(args.start, "%Y-%m-%d").date()
     end = datetime.strptime(args.end, "%Y-%m-%d").date()
+    if args.rpc:
+        finder = BlockFinder(EthRpcClient(args.rpc, args.http_proxy), chain, args.height_cache_path)
+        start_height = finder.first_block_after(datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc))
+        end_height = finder.last_block_before(datetime.combine(end, datetime.max.time(), tzinfo=timezone.utc))
+        print_log(f"Searched with {finder.query_count} blocks queried from rpc")
+        print(f"Height range, start: {start_height}, end: {end_height}")
+        return
     start_height = ApiUtil.query_blockno_from_time(
         chain,
         datetime.combine(start, datetime.min.time()),
@@ -41,3 +50,26 @@ def block_timestamp_cache(args):
     auth_path = args.key
     engine = args.engine
     bigquery_tools.get_block_and_timestamp_cache(auth_path, chain, to_path, start_date, end_date, proxy, engine)
+
+
+def height_cache_migrate(args):
+    chain = ChainType[args.chain]
+    to_path = args.to if args.to else args.from_path
+    migrate_height_cache(chain, args.from_path, to_path)
+
+
+def height_cache_backfill(args):
+    chain = ChainType[args.chain]
+    thread = int(args.thread)
+    client = EthRpcClient(
+        args.rpc,
+        args.http_proxy,
+        pool_size=thread,
+        request_batch_size=int(args.batch_size),
+        rate_limit=float(args.rate_limit) if args.rate_limit else None,
+    )
+    end = client.get_block_number() if args.end == "latest" else int(args.end)
+    if not os.path.exists(args.to):
+        os.makedirs(args.to)
+    cache = create_height_cache(chain, args.to, args.engine)
+    backfill_height_cache(client, cache, int(args.start), end, thread=thread)
@@ -21,8 +21,13 @@ setup(
         "db-dtypes>=1.2.0",
         "argparse>=1.4.0",
         "sqlitedict>=2.1.0",
+        "pyarrow>=14.0.0",
         "eth_abi>=5.2.0",
     ],
+    extras_require={
+        "async": ["httpx[http2]>=0.26.0"],
+        "fast": ["orjson>=3.8.0"],
+    },
     entry_points={
         'console_scripts': [
             'demeter-fetch = demeter_fetch.main:main',
@@ -0,0 +1,173 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict
+
+
+def make_log(block_number: int, transaction_index: int, log_index: int, address: str, topics: List[str], data="0x"):
+    return {
+        "address": address,
+        "blockNumber": hex(block_number),
+        "transactionHash": "0x" + f"{block_number:032x}{transaction_index:032x}",
+        "transactionIndex": hex(transaction_index),
+        "logIndex": hex(log_index),
+        "topics": topics,
+        "data": data,
+        "removed": False,
+    }
+
+
+class MockRpcServer:
+    """
+    A local json rpc server for test, support eth_getLogs, eth_getBlockByNumber, eth_getTransactionByHash, eth_blockNumber.
+    timestamp of block is genesis_timestamp + height * block_time.
+    max_results and max_block_range simulate limits of eth_getLogs in providers.
+    if reject_topic_array, eth_getLogs with OR topics will be rejected like some providers.
+    """
+
+    def __init__(
+        self,
+        logs: List[Dict] | None = None,
+        delay: float = 0,
+        genesis_timestamp=1700000000,
+        block_time=12,
+        max_results: int | None = None,
+        max_block_range: int | None = None,
+        reject_topic_array: bool = False,
+    ):
+        self.logs = logs if logs is not None else []
+        self.max_results = max_results
+        self.max_block_range = max_block_range
+        self.reject_topic_array = reject_topic_array
+        self.get_logs_params: List[Dict] = []
+        # the next fail_count requests will fail with fail_status
+        self.fail_count = 0
+        self.fail_status = 429
+        self.retry_after: str | None = None
+        self.delay = delay
+        self.genesis_timestamp = genesis_timestamp
+        self.block_time = block_time
+        self.methods = Counter()
+        self.post_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._get_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_block_timestamp(self, height: int) -> int:
+        return int(self.genesis_timestamp + height * self.block_time)
+
+    def _get_logs(self, param: Dict) -> List[Dict]:
+        start, end = int(param["fromBlock"], 16), int(param["toBlock"], 16)
+        topics = param.get("topics") or []
+        result = []
+        for log in self.logs:
+            if not start <= int(log["blockNumber"], 16) <= end:
+                continue
+            addresses = param.get("address") or []
+            addresses = [a.lower() for a in (addresses if isinstance(addresses, list) else [addresses])]
+            if len(addresses) > 0 and log["address"].lower() not in addresses:
+                continue
+            matched = True
+            for i, topic in enumerate(topics):
+                if topic is None:
+                    continue
+                expected = topic if isinstance(topic, list) else [topic]
+                if len(log["topics"]) <= i or log["topics"][i] not in expected:
+                    matched = False
+            if matched:
+                result.append(log)
+        return result
+
+    def handle(self, request: Dict) -> Dict:
+        method, params = request["method"], request["params"]
+        self.methods[method] += 1
+        match method:
+            case "eth_getLogs":
+                self.get_logs_params.append(params[0])
+                if self.reject_topic_array and any([isinstance(t, list) for t in params[0].get("topics") or []]):
+                    return self._error(request, -32602, "invalid topics")
+                start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+                if self.max_block_range is not None and end - start + 1 > self.max_block_range:
+                    return self._error(request, -32602, f"block range is too large, max is {self.max_block_range}")
+                result = self._get_logs(params[0])
+                if self.max_results is not None and len(result) > self.max_results:
+                    return self._error(request, -32005, f"query returned more than {self.max_results} results")
+            case "eth_getBlockByNumber":
+                height = int(params[0], 16)
+                result = {"number": params[0], "timestamp": hex(self.get_block_timestamp(height))}
+            case "eth_getTransactionByHash":
+                result = None
+            case "eth_blockNumber":
+                result = hex(max([int(log["blockNumber"], 16) for log in self.logs], default=0))
+            case _:
+                return self._error(request, -32601, "method not found")
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    @staticmethod
+    def _error(request: Dict, code: int, message: str) -> Dict:
+        return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": code, "message": message}}
+
+    def _get_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # send headers and body together
+            wbufsize = 64 * 1024
+
+            def do_POST(self):
+                with server._lock:
+                    server.in_flight += 1
+                    server.post_count += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    should_fail = server.fail_count > 0
+                    server.fail_count -= 1 if should_fail else 0
+                if should_fail:
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                    with server._lock:
+                        server.in_flight -= 1
+                    self.send_response(server.fail_status)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", server.retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                    if server.delay > 0:
+                        time.sleep(server.delay)
+                    if isinstance(body, list):
+                        response = [server.handle(r) for r in body]
+                    else:
+                        response = server.handle(body)
+                    content = json.dumps(response).encode()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -61,11 +61,16 @@ class TreeTest(unittest.TestCase):
         self.assertEqual(result, squence)
 
     def test_uni_tick(self):
-        self.check_sequence(DappType.uniswap, ToType.tick, UniTick, ["uni_pool", "uni_proxy_LP", "uni_tick"])
+        self.check_sequence(
+            DappType.uniswap, ToType.tick, UniTick, ["uni_pool", "uni_pool_events", "uni_proxy_LP", "uni_tick"]
+        )
 
     def test_price(self):
         self.check_sequence(
-            DappType.uniswap, ToType.price, UniRelativePrice, ["uni_pool", "uni_tick_without_pos", "uni_rel_price"]
+            DappType.uniswap,
+            ToType.price,
+            UniRelativePrice,
+            ["uni_pool", "uni_pool_events", "uni_tick_without_pos", "uni_rel_price"],
         )
 
     def test_user_lp(self):
@@ -73,7 +78,7 @@ class TreeTest(unittest.TestCase):
             DappType.uniswap,
             ToType.user_lp,
             UniUserLP,
-            ["uni_pool", "uni_proxy_LP", "uni_tick", "uni_tx", "uni_positions", "uni_user_lp"],
+            ["uni_pool", "uni_pool_events", "uni_proxy_LP", "uni_tick", "uni_tx", "uni_positions", "uni_user_lp"],
         )
     def test_gmx2_minute(self):
         self.check_sequence(
@@ -91,9 +96,11 @@ class TreeTest(unittest.TestCase):
             [
                 "osqth_raw",
                 "uni_pool",
+                "uni_pool_events",
                 "uni_tick_without_pos",
                 "uni_rel_price",
                 "uni_pool",
+                "uni_pool_events",
                 "uni_tick_without_pos",
                 "uni_rel_price",
                 "osqth_minute",
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date
+from typing import Dict
+from unittest import mock
+
+import pandas as pd
+
+from demeter_fetch import Config, FromConfig, ToConfig, ChainType, DataSource, DappType, ToType, ToFileType
+from demeter_fetch.common import DailyNode, DailyParam, Node, frame_store
+from demeter_fetch.core import downloader
+from demeter_fetch.core.downloader import run_pipeline, split_pipeline_steps, set_in_memory_steps
+
+
+class DayNumberNode(DailyNode):
+    name = "day_number"
+
+    def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
+        if day.day == 3:
+            raise ValueError("broken day")
+        return pd.DataFrame({"day": [day.day], "pid": [os.getpid()]})
+
+
+class DayDoubleNode(DailyNode):
+    name = "day_double"
+
+    def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
+        df = data["day_number"]
+        df["double"] = df["day"] * 2
+        return df
+
+
+class DayTimeNode(DailyNode):
+    name = "day_time"
+    use_height_cache = True
+
+    def _process_one_day(self, data: Dict[str, pd.DataFrame], day: date) -> pd.DataFrame:
+        start = time.time()
+        time.sleep(0.2)
+        return pd.DataFrame({"start": [start], "end": [time.time()]})
+
+
+class DailyNodeTest(unittest.TestCase):
+    def setUp(self):
+        self.to_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.to_path)
+
+    def get_node(self, multi_process: bool, skip_existed: bool = False) -> DayNumberNode:
+        node = DayNumberNode()
+        node.set_config(
+            Config(
+                FromConfig(ChainType.ethereum, DataSource.rpc, DappType.uniswap, date(2024, 1, 1), date(2024, 1, 6)),
+                ToConfig(ToType.raw, self.to_path, multi_process, skip_existed, False, ToFileType.csv, 3),
+            )
+        )
+        return node
+
+    def check_result(self, node: DayNumberNode):
+        for param, path in node.get_file_paths.items():
+            if param.day.day == 3:
+                self.assertFalse(os.path.exists(path))
+            else:
+                self.assertEqual(node.read_file(path)["day"][0], param.day.day)
+
+    def test_failed_day_not_abort(self):
+        node = self.get_node(False)
+        with self.assertRaises(RuntimeError) as ctx:
+            node.work()
+        self.assertIn("2024-01-03", str(ctx.exception))
+        self.check_result(node)
+
+    def test_process_pool(self):
+        node = self.get_node(True)
+        with self.assertRaises(RuntimeError):
+            node.work()
+        self.check_result(node)
+        pids = {node.read_file(p)["pid"][0] for k, p in node.get_file_paths.items() if k.day.day != 3}
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_skip_existed(self):
+        node = self.get_node(True, True)
+        node.save_file(pd.DataFrame({"day": [3], "pid": [0]}), node.get_file_path(DailyParam(date(2024, 1, 3))))
+        node.work()
+        for param, path in node.get_file_paths.items():
+            self.assertEqual(node.read_file(path)["day"][0], param.day.day)
+
+    def test_prepare_days_once(self):
+        node = self.get_node(False)
+        prepared = []
+        node._prepare_days = lambda days: prepared.append(days)
+        node.prepare_days([date(2024, 1, 1)])
+        with self.assertRaises(RuntimeError):
+            node.work()
+        # days are prepared before work, so they are not prepared again
+        self.assertEqual(prepared, [[date(2024, 1, 1)]])
+
+    def test_day_exclusive(self):
+        node = DayTimeNode()
+        node.set_config(self.get_node(True).config)
+        self.assertTrue(node.is_day_exclusive)
+        self.assertEqual(node.get_worker_count(), 1)
+        # in pipeline, days of rpc source wait for each other
+        run_pipeline([node], 3)
+        spans = sorted([tuple(node.read_file(p).iloc[0]) for p in node.get_file_paths.values()])
+        for (start, end), (next_start, next_end) in zip(spans[:-1], spans[1:]):
+            self.assertLessEqual(end, next_start)
+
+    def test_pipeline(self):
+        source = self.get_node(False)
+        double = DayDoubleNode()
+        double.set_config(source.config)
+        double.set_depend_instance([source])
+        total = Node()
+        total.set_depend_instance([double])
+        daily_steps, other_steps = split_pipeline_steps([source, double, total])
+        self.assertEqual(daily_steps, [source, double])
+        self.assertEqual(other_steps, [total])
+
+        with self.assertRaises(RuntimeError) as ctx:
+            run_pipeline(daily_steps, 3)
+        self.assertIn("2024-01-03", str(ctx.exception))
+        for param, path in double.get_file_paths.items():
+            if param.day.day == 3:
+                self.assertFalse(os.path.exists(path))
+            else:
+                self.assertEqual(double.read_file(path)["double"][0], param.day.day * 2)
+
+    def test_pipeline_in_main_process(self):
+        source = self.get_node(False)
+        other = DayTimeNode()
+        other.set_config(source.config)
+        calls = []
+        with mock.patch.object(downloader, "prepare_source_days", lambda step_days: calls.append(step_days)):
+            with self.assertRaises(RuntimeError):
+                run_pipeline([source, other], 1)
+        # multi_process is disabled, so days run in main process
+        pids = {source.read_file(p)["pid"][0] for k, p in source.get_file_paths.items() if k.day.day != 3}
+        self.assertEqual(pids, {os.getpid()})
+        # logs of source steps are downloaded together in chain of every day
+        days = [param.day for param in source.get_file_paths.keys()]
+        self.assertEqual(calls, [[(source, [day]), (other, [day])] for day in days])
+
+    def test_in_memory(self):
+        source = self.get_node(False)
+        source.config.to_config.in_memory = True
+        double = DayDoubleNode()
+        double.set_config(source.config)
+        double.set_depend_instance([source])
+        set_in_memory_steps([source, double], double, [])
+        self.assertTrue(source.keep_in_memory)
+        self.assertFalse(double.keep_in_memory)
+
+        with self.assertRaises(RuntimeError):
+            source.work()
+        with self.assertRaises(RuntimeError):
+            double.work()
+        for param, path in double.get_file_paths.items():
+            self.assertFalse(os.path.exists(source.get_file_path(param)))
+            if param.day.day != 3:
+                self.assertEqual(double.read_file(path)["double"][0], param.day.day * 2)
+        # all frames have been consumed
+        self.assertEqual(len(frame_store.frames), 0)
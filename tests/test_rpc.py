@@ -34,7 +34,7 @@ class UniLpDataTest(unittest.TestCase):
             [
                 os.path.join(
                     self.config["to_path"],
-                    "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447801-42448800.tmp.pkl",
+                    "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447801-42448800.tmp.arrow",
                 )
             ]
         )
@@ -66,7 +66,7 @@ class UniLpDataTest(unittest.TestCase):
             [
                 os.path.join(
                     self.config["to_path"],
-                    "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447801-42448800.tmp.pkl",
+                    "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447801-42448800.tmp.arrow",
                 )
             ]
         )
@@ -98,8 +98,8 @@ class UniLpDataTest(unittest.TestCase):
     def test_query_event_by_height_save_rest(self):
         self.remove_tmp_file(
             [
-                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447301-42448300.tmp.pkl",
-                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42448301-42448799.tmp.pkl",
+                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447301-42448300.tmp.arrow",
+                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42448301-42448799.tmp.arrow",
             ]
         )
 
@@ -111,8 +111,8 @@ class UniLpDataTest(unittest.TestCase):
     def test_query_event_by_height_save_rest_again(self):
         self.remove_tmp_file(
             [
-                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447301-42448300.tmp.pkl",
-                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42448301-42448799.tmp.pkl",
+                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447301-42448300.tmp.arrow",
+                "polygon-0x45dda9cb7c25131df268515131f647d726f50608-42448301-42448799.tmp.arrow",
             ]
         )
 
@@ -150,7 +150,7 @@ class UniLpDataTest(unittest.TestCase):
         client = rpc.EthRpcClient(self.config["end_point"], "127.0.0.1:7890")
         files = self.query_3_save_2(client)
         # just remove the last file.
-        self.remove_tmp_file(["polygon-0x45dda9cb7c25131df268515131f647d726f50608-42448301-42448799.tmp.pkl"])
+        self.remove_tmp_file(["polygon-0x45dda9cb7c25131df268515131f647d726f50608-42448301-42448799.tmp.arrow"])
         files = self.query_3_save_2(client)
         print(files)
         self.assertTrue(len(files) == 2)
@@ -159,7 +159,7 @@ class UniLpDataTest(unittest.TestCase):
         client = rpc.EthRpcClient(self.config["end_point"], "127.0.0.1:7890")
         files = self.query_3_save_2(client)
         # just remove the first file.
-        self.remove_tmp_file(["polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447301-42448300.tmp.pkl"])
+        self.remove_tmp_file(["polygon-0x45dda9cb7c25131df268515131f647d726f50608-42447301-42448300.tmp.arrow"])
         files = self.query_3_save_2(client)
         print(files)
         self.assertTrue(len(files) == 2)
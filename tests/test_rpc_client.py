@@ -0,0 +1,607 @@
+import math
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC, date, timedelta
+from unittest import mock
+
+import numpy as np
+import pyarrow as pa
+import requests
+
+import demeter_fetch.common._typing as typing
+import demeter_fetch.sources.rpc_utils as rpc
+import demeter_fetch.sources.source_utils as source_utils
+import demeter_fetch.sources.rpc as rpc_source
+import demeter_fetch.sources.source_core as source_core
+from demeter_fetch.common import RateLimiter, utils
+from demeter_fetch.sources.source_utils import ContractConfig
+from tests.mock_rpc_server import MockRpcServer, make_log
+
+POOL = "0x45dda9cb7c25131df268515131f647d726f50608"
+
+
+def get_mock_logs():
+    logs = []
+    for height in range(100, 1100, 7):
+        logs.append(make_log(height, 1, 2, POOL, [typing.KECCAK.SWAP.value], "0x01"))
+        logs.append(make_log(height, 3, 5, POOL, [typing.KECCAK.MINT.value, "0x" + "0" * 64], "0x02"))
+        logs.append(make_log(height, 4, 6, POOL, [typing.KECCAK.TRANSFER.value], "0x03"))
+    return logs
+
+
+class RpcClientTest(unittest.TestCase):
+    def setUp(self):
+        self.save_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.save_path)
+
+    def query(self, client, server: MockRpcServer, batch_size=20, thread=10):
+        files = rpc.query_event_by_height_concurrent(
+            chain=typing.ChainType.ethereum,
+            client=client,
+            contract_config=ContractConfig(POOL, [typing.KECCAK.SWAP.value, typing.KECCAK.MINT.value]),
+            start_height=100,
+            end_height=1099,
+            save_path=self.save_path,
+            batch_size=batch_size,
+            thread=thread,
+        )
+        logs = rpc.load_tmp_file(files[0])
+        os.remove(files[0])
+        return logs.sort_values(["block_number", "log_index"]).to_dict("records")
+
+    def test_async_client(self):
+        with MockRpcServer(get_mock_logs()) as server:
+            client = rpc.AsyncEthRpcClient(server.url, concurrency=10)
+            self.assertEqual(client.get_block_timestamp(100).timestamp(), server.get_block_timestamp(100))
+            async_logs = self.query(client, server)
+            client.close()
+            sync_logs = self.query(rpc.EthRpcClient(server.url), server)
+        self.assertEqual(len(async_logs), 143 * 2)
+        self.assertEqual(async_logs, sync_logs)
+        for log in async_logs:
+            block_dt = datetime.strptime(log["block_timestamp"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=UTC)
+            self.assertEqual(block_dt.timestamp(), server.get_block_timestamp(log["block_number"]))
+
+    def test_default_thread(self):
+        with MockRpcServer(get_mock_logs()) as server:
+            # thread is None if it's not set in [from.rpc]
+            logs = self.query(rpc.EthRpcClient(server.url), server, thread=None)
+        self.assertEqual(len(logs), 143 * 2)
+
+    def test_batch(self):
+        with MockRpcServer() as server:
+            clients = [
+                rpc.EthRpcClient(server.url, request_batch_size=30),
+                rpc.AsyncEthRpcClient(server.url, request_batch_size=30),
+            ]
+            for client in clients:
+                server.post_count = 0
+                results = client.send_batch([("eth_getBlockByNumber", [hex(h), False]) for h in [5, 3, 9]])
+                self.assertEqual([int(r["number"], 16) for r in results], [5, 3, 9])
+                timestamps = client.get_block_timestamps(list(range(100)))
+                self.assertEqual(len(timestamps), 100)
+                self.assertEqual(timestamps[42], datetime.fromtimestamp(server.get_block_timestamp(42), UTC))
+                self.assertEqual(server.post_count, 1 + 4)
+                with self.assertRaises(typing.EthError):
+                    client.send_batch([("eth_blockNumber", []), ("eth_unknown", [])])
+
+    def test_fill_timestamp(self):
+        with MockRpcServer(get_mock_logs()) as server:
+            client = rpc.EthRpcClient(server.url, request_batch_size=50)
+            self.query(client, server)
+            # 143 distinct heights
+            self.assertEqual(server.methods["eth_getBlockByNumber"], 143)
+            self.assertLessEqual(server.post_count - server.methods["eth_getLogs"], 3)
+            # all heights are cached
+            server.methods.clear()
+            self.query(client, server)
+            self.assertEqual(server.methods["eth_getBlockByNumber"], 0)
+
+    def test_infer_timestamp(self):
+        # 4 blocks a second
+        def get_logs():
+            return [make_log(h, 1, 2, POOL, [typing.KECCAK.SWAP.value], "0x01") for h in range(100, 1100)]
+
+        with MockRpcServer(get_logs(), block_time=0.25) as server:
+            client = rpc.EthRpcClient(server.url)
+            cache = rpc.HeightCacheManager(typing.ChainType.arbitrum, self.save_path)
+            df = rpc._raw_logs_to_df(get_logs(), None)
+            rpc._fill_block_timestamps(df, client, cache, anchor_stride=8)
+            # anchors are 2 seconds apart, nearly all blocks are queried
+            self.assertGreater(server.methods["eth_getBlockByNumber"], 990)
+            shutil.rmtree(self.save_path)
+            os.mkdir(self.save_path)
+            server.methods.clear()
+
+            cache = rpc.HeightCacheManager(typing.ChainType.arbitrum, self.save_path)
+            df = rpc._raw_logs_to_df(get_logs(), None)
+            rpc._fill_block_timestamps(df, client, cache, anchor_stride=4)
+            self.assertEqual(server.methods["eth_getBlockByNumber"], 251)
+            # only anchors are cached
+            self.assertEqual(len(cache), 251)
+            expected = np.array([server.get_block_timestamp(h) for h in df["block_number"]])
+            inferred = df["block_dt"].astype("int64").to_numpy() // 10**9
+            self.assertTrue(np.all((expected - inferred >= 0) & (expected - inferred <= 1)))
+
+    def test_concurrency(self):
+        with MockRpcServer(delay=0.05) as server:
+            client = rpc.AsyncEthRpcClient(server.url, concurrency=8)
+            futures = [client.submit(client.send_async("eth_blockNumber", [])) for i in range(40)]
+            [f.result() for f in futures]
+            self.assertGreater(server.max_in_flight, 1)
+            self.assertLessEqual(server.max_in_flight, 8)
+            client.close()
+
+            server.max_in_flight = 0
+            client = rpc.AsyncEthRpcClient(server.url, concurrency=8, endpoint_concurrency=3)
+            # sync interface can be shared by threads
+            with ThreadPoolExecutor(max_workers=10) as t:
+                list(t.map(lambda x: client.send("eth_blockNumber", []), range(20)))
+            self.assertLessEqual(server.max_in_flight, 3)
+            client.close()
+
+    def test_error(self):
+        with MockRpcServer() as server:
+            client = rpc.AsyncEthRpcClient(server.url)
+            with self.assertRaises(typing.EthError):
+                client.send("eth_unknown", [])
+            client.close()
+
+    def test_height_cache(self):
+        cache = rpc.HeightCacheManager(typing.ChainType.ethereum, self.save_path)
+        with MockRpcServer() as server:
+            client = rpc.EthRpcClient(server.url)
+            cache.set_many({h: datetime.fromtimestamp(server.get_block_timestamp(h), UTC) for h in range(0, 1000, 2)})
+            self.assertEqual(len(cache.get_many(range(1000))), 500)
+            timestamps = cache.resolve_timestamps({1, 2, 3, 4, 1001}, client)
+            self.assertEqual(server.methods["eth_getBlockByNumber"], 3)
+            for height, block_dt in timestamps.items():
+                self.assertEqual(block_dt.timestamp(), server.get_block_timestamp(height))
+            self.assertIn(1001, cache)
+
+    def test_mmap_height_cache(self):
+        sqlite_cache = rpc.HeightCacheManager(typing.ChainType.ethereum, self.save_path)
+        sqlite_cache.set_many({h: datetime.fromtimestamp(1700000000 + h * 12, UTC) for h in range(1000, 5000, 3)})
+        # naive datetime is utc
+        sqlite_cache.set(5000, datetime(2024, 1, 1))
+        sqlite_cache.save()
+        del sqlite_cache
+        rpc.migrate_height_cache(typing.ChainType.ethereum, self.save_path, self.save_path, batch_size=100)
+
+        cache = rpc.HeightCacheManager(typing.ChainType.ethereum, self.save_path)
+        self.assertEqual(cache.cache_engine, rpc.CacheEngineType.mmap)
+        self.assertEqual(len(cache), 1335)
+        self.assertEqual(cache.get(5000), datetime(2024, 1, 1, tzinfo=UTC))
+        self.assertIsNone(cache.get(1001))
+        self.assertNotIn(999, cache)
+        heights = np.arange(900, 5100)
+        timestamps = cache._block_dict.get_many(heights)
+        expected = np.where((heights >= 1000) & (heights < 5000) & ((heights - 1000) % 3 == 0), 1700000000 + heights * 12, 0)
+        expected[heights == 5000] = datetime(2024, 1, 1, tzinfo=UTC).timestamp()
+        self.assertTrue(np.array_equal(timestamps, expected))
+        # heights before base and after end
+        cache.set_many({10: datetime.fromtimestamp(1700000120, UTC), 100000: datetime.fromtimestamp(1701200000, UTC)})
+        cache.save()
+        del cache
+        cache = rpc.HeightCacheManager(typing.ChainType.ethereum, self.save_path)
+        self.assertEqual(len(cache), 1337)
+        self.assertEqual(cache.get_many([10, 1000, 100000, 100001]), {
+            10: datetime.fromtimestamp(1700000120, UTC),
+            1000: datetime.fromtimestamp(1700012000, UTC),
+            100000: datetime.fromtimestamp(1701200000, UTC),
+        })
+
+    def test_backfill_height_cache(self):
+        with MockRpcServer() as server:
+            client = rpc.EthRpcClient(server.url, request_batch_size=50)
+            for engine in ["sqlite", "mmap"]:
+                path = os.path.join(self.save_path, engine)
+                os.mkdir(path)
+                cache = rpc.create_height_cache(typing.ChainType.base, path, engine)
+                cache.set_many({h: datetime.fromtimestamp(server.get_block_timestamp(h), UTC) for h in range(500, 600)})
+                self.assertEqual(rpc.backfill_height_cache(client, cache, 100, 1099, chunk_size=300), 900)
+                del cache
+                # resume from existing coverage
+                cache = rpc.create_height_cache(typing.ChainType.base, path, engine)
+                self.assertEqual(rpc.backfill_height_cache(client, cache, 100, 1199, chunk_size=300), 100)
+                timestamps = cache.get_many(range(100, 1200))
+                self.assertEqual(len(timestamps), 1100)
+                for height, block_dt in timestamps.items():
+                    self.assertEqual(block_dt.timestamp(), server.get_block_timestamp(height))
+                del cache
+            self.assertEqual(server.methods["eth_getBlockByNumber"], 2000)
+
+    def test_raw_logs_to_df(self):
+        logs = get_mock_logs()[:30]
+        logs[0]["removed"] = True
+        df = rpc._raw_logs_to_df(logs, ContractConfig(POOL, [typing.KECCAK.SWAP.value, typing.KECCAK.MINT.value]), True)
+        self.assertEqual(len(df.index), 19)
+        self.assertEqual(df["block_number"].dtype, np.int64)
+        self.assertEqual(df["block_number"].tolist()[:3], [100, 107, 107])
+        self.assertEqual(df["log_index"].tolist()[:3], [5, 2, 5])
+        self.assertEqual(df["address"].unique().tolist(), [POOL])
+        self.assertEqual(len(rpc._raw_logs_to_df(logs, None).index), 29)
+        self.assertEqual(rpc._raw_logs_to_df([], None)["block_number"].dtype, np.int64)
+        self.assertEqual(rpc._hex_to_int(["0x0", "0xA", "0x12a05f200"]).tolist(), [0, 10, 5000000000])
+
+    def test_resume(self):
+        with MockRpcServer(get_mock_logs()) as server:
+            expected = self.query(rpc.EthRpcClient(server.url), server)
+            full_count = server.methods["eth_getLogs"]
+        put = rpc.WindowParts.put
+
+        def interrupted_put(parts, start, end, logs):
+            if len(parts.ranges) >= 10:
+                raise KeyboardInterrupt()
+            put(parts, start, end, logs)
+
+        for path in os.listdir(self.save_path):
+            os.remove(os.path.join(self.save_path, path))
+        with MockRpcServer(get_mock_logs()) as server:
+            with mock.patch.object(rpc.WindowParts, "put", interrupted_put):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.query(rpc.EthRpcClient(server.url), server)
+            parts = [p for p in os.listdir(self.save_path) if p.endswith(".parts")]
+            saved = rpc.WindowParts(os.path.join(self.save_path, parts[0]))
+            self.assertEqual(len(saved.ranges), 10)
+            gaps = saved.get_gaps(100, 1099)
+            # windows may grow while running concurrently, so finished blocks are counted by saved ranges
+            finished = sum([end - start + 1 for start, end in saved.ranges])
+            server.methods.clear()
+            self.assertEqual(self.query(rpc.EthRpcClient(server.url), server), expected)
+            # finished windows are not queried again
+            self.assertEqual(sum([end - start + 1 for start, end in gaps]), 1000 - finished)
+            self.assertLess(server.methods["eth_getLogs"], full_count)
+            self.assertFalse(os.path.exists(os.path.join(self.save_path, parts[0])))
+
+    def test_split_on_limit(self):
+        expected = None
+        with MockRpcServer(get_mock_logs()) as server:
+            expected = self.query(rpc.EthRpcClient(server.url), server)
+        for limits in [dict(max_results=40), dict(max_block_range=30)]:
+            with MockRpcServer(get_mock_logs(), **limits) as server:
+                logs = self.query(rpc.EthRpcClient(server.url), server, batch_size=1000)
+                self.assertEqual(logs, expected)
+            os.remove(os.path.join(self.save_path, rpc.LogWindowStore.file_name))
+
+    def test_grow_window(self):
+        with MockRpcServer(get_mock_logs()) as server:
+            self.query(rpc.EthRpcClient(server.url, request_batch_size=500), server, batch_size=10)
+            first_count = server.methods["eth_getLogs"]
+            learned = rpc.LogWindowStore(self.save_path).get(typing.ChainType.ethereum, POOL)
+            self.assertGreater(learned, 10)
+            # start with learned size
+            server.methods.clear()
+            self.query(rpc.EthRpcClient(server.url), server, batch_size=10)
+            self.assertLess(server.methods["eth_getLogs"], first_count)
+
+    def test_window_by_topics(self):
+        store = rpc.LogWindowStore(self.save_path)
+        transfer = ContractConfig(POOL, [typing.KECCAK.TRANSFER.value])
+        with MockRpcServer(get_mock_logs()) as server:
+            self.query(rpc.EthRpcClient(server.url), server, batch_size=10)
+            learned = store.get(typing.ChainType.ethereum, POOL)
+            self.assertGreater(learned, 10)
+            server.get_logs_params.clear()
+            files = rpc.query_event_by_height_concurrent(
+                chain=typing.ChainType.ethereum,
+                client=rpc.EthRpcClient(server.url),
+                contract_config=transfer,
+                start_height=100,
+                end_height=1099,
+                save_path=self.save_path,
+                batch_size=10,
+                one_by_one=True,
+            )
+            os.remove(files[0])
+        # query filtered by other topics doesn't start with window learned by all logs of the contract
+        first = min(server.get_logs_params, key=lambda p: int(p["fromBlock"], 16))
+        self.assertEqual(int(first["toBlock"], 16) - int(first["fromBlock"], 16) + 1, 10)
+        self.assertIsNotNone(store.get(typing.ChainType.ethereum, rpc.get_tmp_key(transfer, True)))
+        self.assertEqual(store.get(typing.ChainType.ethereum, POOL), learned)
+
+    def test_tmp_file(self):
+        with MockRpcServer(get_mock_logs()) as server:
+            files = rpc.query_event_by_height_concurrent(
+                chain=typing.ChainType.ethereum,
+                client=rpc.EthRpcClient(server.url),
+                contract_config=ContractConfig(POOL, [typing.KECCAK.SWAP.value, typing.KECCAK.MINT.value]),
+                start_height=100,
+                end_height=1099,
+                save_path=self.save_path,
+                batch_size=100,
+            )
+        table = rpc._read_tmp_table(files[0])
+        self.assertEqual(table.schema.field("block_number").type, pa.uint64())
+        self.assertEqual(table.schema.field("transaction_hash").type, pa.binary(32))
+        self.assertNotIn("block_dt", table.column_names)
+        logs = rpc.load_tmp_files(files + files)
+        self.assertEqual(len(logs.index), 143 * 2 * 2)
+        self.assertTrue(logs["block_number"].iloc[: 143 * 2].is_monotonic_increasing)
+        self.assertEqual(logs["block_number"].dtype, np.int64)
+        log = logs.iloc[1]
+        self.assertEqual(log["transaction_hash"], "0x" + f"{100:032x}{3:032x}")
+        self.assertEqual(log["topics"], [typing.KECCAK.MINT.value, "0x" + "0" * 64])
+        self.assertEqual(log["block_timestamp"], "2023-11-14 22:33:20")
+        # tmp files of old version can still be loaded
+        old_path = os.path.join(self.save_path, "old.tmp.pkl")
+        with open(old_path, "wb") as f:
+            pickle.dump(logs.to_dict("records"), f)
+        self.assertTrue(rpc.load_tmp_file(old_path).equals(logs))
+
+    def test_log_store(self):
+        store = rpc.LogStore(os.path.join(self.save_path, "store"))
+
+        def query(topics, start, end, log_store):
+            files = rpc.query_event_by_height_concurrent(
+                chain=typing.ChainType.ethereum,
+                client=rpc.EthRpcClient(server.url),
+                contract_config=ContractConfig(POOL, topics),
+                start_height=start,
+                end_height=end,
+                save_path=self.save_path,
+                log_store=log_store,
+            )
+            logs = rpc.load_tmp_file(files[0])
+            os.remove(files[0])
+            return logs
+
+        with MockRpcServer(get_mock_logs()) as server:
+            swap_logs = query([typing.KECCAK.SWAP.value], 100, 599, store)
+            self.assertEqual(store.get_gaps(typing.ChainType.ethereum, POOL, "all", 100, 1099), [(600, 1099)])
+            self.assertEqual(store.get_gaps(typing.ChainType.ethereum, POOL, "all", 50, 99), [(50, 99)])
+            self.assertTrue(swap_logs.equals(query([typing.KECCAK.SWAP.value], 100, 599, None)))
+            # only blocks after 600 are queried, and logs with other topics are loaded from store
+            server.methods.clear()
+            transfer_logs = query([typing.KECCAK.TRANSFER.value], 300, 1099, store)
+            self.assertEqual(server.methods["eth_getLogs"], 1)
+            self.assertTrue(transfer_logs.equals(query([typing.KECCAK.TRANSFER.value], 300, 1099, None)))
+            self.assertEqual(store.get_gaps(typing.ChainType.ethereum, POOL, "all", 100, 1099), [])
+
+    def test_block_finder(self):
+        with MockRpcServer([make_log(500000, 0, 0, POOL, [])]) as server:
+            finder = rpc.BlockFinder(rpc.EthRpcClient(server.url), typing.ChainType.ethereum, self.save_path)
+            block_time = datetime.fromtimestamp(server.get_block_timestamp(1000) + 5, UTC)
+            self.assertEqual(finder.first_block_after(block_time), 1001)
+            self.assertEqual(finder.last_block_before(block_time), 1000)
+            self.assertEqual(finder.first_block_after(datetime.fromtimestamp(server.get_block_timestamp(1000), UTC)), 1000)
+            self.assertIsNone(finder.first_block_after(datetime.fromtimestamp(server.get_block_timestamp(500001), UTC)))
+            # block time is stable, interpolation will find it quickly
+            self.assertLess(finder.query_count, 10)
+
+            # timestamps are read from height cache
+            server.methods.clear()
+            finder = rpc.BlockFinder(rpc.EthRpcClient(server.url), typing.ChainType.ethereum, self.save_path)
+            self.assertEqual(finder.first_block_after(block_time), 1001)
+            self.assertEqual(server.methods["eth_getBlockByNumber"], 0)
+
+            day = datetime.fromtimestamp(server.get_block_timestamp(100000), UTC).date()
+            heights = source_utils.resolve_heights([day], typing.ChainType.ethereum, None, None, block_finder=finder)
+            start = source_utils._midnight(day).timestamp()
+            self.assertEqual(heights[day][0], math.ceil((start - server.genesis_timestamp) / server.block_time))
+            self.assertEqual(heights[day][1], math.ceil((start + 86400 - server.genesis_timestamp) / server.block_time) - 1)
+
+            # midnight has passed, but there is no block after it yet
+            day = datetime.fromtimestamp(server.get_block_timestamp(500000), UTC).date() + timedelta(days=2)
+            with self.assertRaisesRegex(RuntimeError, str(day)):
+                source_utils.resolve_heights([day], typing.ChainType.ethereum, None, None, block_finder=finder)
+        source_utils.height_cache.clear()
+
+    def test_scan_days(self):
+        days = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+        for day, heights in zip(days, [(100, 399), (400, 699), (700, 1099)]):
+            source_utils.height_cache[(typing.ChainType.ethereum, day)] = heights
+        pool_config = typing.UniswapConfig(POOL, False, typing.TokenConfig("usdc", 6), typing.TokenConfig("eth", 18), True)
+        with MockRpcServer(get_mock_logs()) as server:
+            config = typing.FromConfig(
+                typing.ChainType.ethereum,
+                typing.DataSource.rpc,
+                typing.DappType.uniswap,
+                days[0],
+                days[-1],
+                uniswap_config=pool_config,
+                rpc=typing.RpcConfig(server.url, scan_all_days=True),
+            )
+            query = rpc_source.pool_query(config)
+            self.assertEqual(rpc_source.rpc_scan_days(config, self.save_path, [(query, days)]), [query])
+            self.assertEqual(server.methods["eth_getLogs"], 2)
+            scanned = [rpc_source.rpc_pool(config, self.save_path, day) for day in days]
+            self.assertEqual(server.methods["eth_getLogs"], 2)
+
+            config.rpc.scan_all_days = False
+            other_path = os.path.join(self.save_path, "day_by_day")
+            os.mkdir(other_path)
+            for day, df in zip(days, scanned):
+                self.assertGreater(len(df.index), 0)
+                self.assertTrue(df.reset_index(drop=True).equals(rpc_source.rpc_pool(config, other_path, day).reset_index(drop=True)))
+
+            # a single query is not scanned without scan_all_days, so the step will download by day
+            step = source_core.UniSourcePool()
+            step.set_config(typing.Config(config, typing.ToConfig(typing.ToType.raw, other_path)))
+            source_core.prepare_source_days([(step, days)])
+            self.assertFalse(step.days_prepared)
+            config.rpc.scan_all_days = True
+            source_core.prepare_source_days([(step, days)])
+            self.assertTrue(step.days_prepared)
+        source_utils.height_cache.clear()
+
+    def test_scan_multi_address(self):
+        days = [date(2024, 1, 1), date(2024, 1, 2)]
+        for day, heights in zip(days, [(100, 599), (600, 1099)]):
+            source_utils.height_cache[(typing.ChainType.ethereum, day)] = heights
+        proxy = typing.ChainTypeConfig[typing.ChainType.ethereum]["uniswap_proxy_addr"]
+        logs = get_mock_logs()
+        for height in range(101, 1100, 11):
+            logs.append(make_log(height, 2, 3, proxy, [typing.KECCAK.UNI_PROXY_INCREASE.value, "0x" + "0" * 64], "0x04"))
+            logs.append(make_log(height, 2, 4, proxy, [typing.KECCAK.TRANSFER.value, "0x" + "0" * 64], "0x05"))
+        pool_config = typing.UniswapConfig(POOL, False, typing.TokenConfig("usdc", 6), typing.TokenConfig("eth", 18), True)
+        with MockRpcServer(logs) as server:
+            config = typing.FromConfig(
+                typing.ChainType.ethereum,
+                typing.DataSource.rpc,
+                typing.DappType.uniswap,
+                days[0],
+                days[-1],
+                uniswap_config=pool_config,
+                rpc=typing.RpcConfig(server.url),
+            )
+            queries = [rpc_source.pool_query(config), rpc_source.proxy_lp_query(config), rpc_source.proxy_transfer_query(config)]
+            rpc_source.rpc_scan_days(config, self.save_path, [(q, days) for q in queries])
+            # one query with address array for every day
+            self.assertEqual(server.methods["eth_getLogs"], 2)
+            self.assertEqual(sorted(server.get_logs_params[0]["address"]), sorted([POOL, proxy.lower()]))
+            functions = [rpc_source.rpc_pool, rpc_source.rpc_proxy_lp, rpc_source.rpc_proxy_transfer]
+            scanned = [[f(config, self.save_path, day) for day in days] for f in functions]
+            self.assertEqual(server.methods["eth_getLogs"], 2)
+
+            other_path = os.path.join(self.save_path, "one_by_one")
+            os.mkdir(other_path)
+            for f, dfs in zip(functions, scanned):
+                for day, df in zip(days, dfs):
+                    self.assertGreater(len(df.index), 0)
+                    expected = f(config, other_path, day)
+                    self.assertTrue(df.reset_index(drop=True).equals(expected.reset_index(drop=True)))
+        source_utils.height_cache.clear()
+
+    def test_topic_filter(self):
+        expected = None
+        with MockRpcServer(get_mock_logs()) as server:
+            expected = self.query(rpc.EthRpcClient(server.url), server)
+        for reject in [False, True]:
+            with MockRpcServer(get_mock_logs(), reject_topic_array=reject) as server:
+                client = rpc.EthRpcClient(server.url)
+                files = rpc.query_event_by_height_concurrent(
+                    chain=typing.ChainType.ethereum,
+                    client=client,
+                    contract_config=ContractConfig(POOL, [typing.KECCAK.SWAP.value, typing.KECCAK.MINT.value]),
+                    start_height=100,
+                    end_height=1099,
+                    save_path=self.save_path,
+                    one_by_one=True,
+                )
+                logs = rpc.load_tmp_file(files[0])
+                os.remove(files[0])
+                self.assertEqual(logs.sort_values(["block_number", "log_index"]).to_dict("records"), expected)
+                self.assertEqual(client.topic_filter, not reject)
+                # one query for all topics
+                self.assertEqual(server.get_logs_params[0]["topics"], [[typing.KECCAK.SWAP.value, typing.KECCAK.MINT.value]])
+                if reject:
+                    self.assertIsNone(server.get_logs_params[-1]["topics"])
+
+    def test_range_limit_error(self):
+        self.assertFalse(rpc.is_range_limit_error(typing.EthError(-32005, "rate limit exceeded")))
+        self.assertTrue(rpc.is_range_limit_error(typing.EthError(-32005, "query returned more than 10000 results")))
+        self.assertTrue(rpc.is_range_limit_error(typing.EthError(-32602, "Log response size exceeded.")))
+        self.assertTrue(rpc.is_range_limit_error(typing.EthError(-32000, "exceed maximum block range: 5000")))
+        self.assertTrue(rpc.is_range_limit_error(rpc.RpcHttpError(413, "")))
+        # unrelated errors are not taken as range limit
+        gas_error = typing.EthError(-32000, "gas required exceeds allowance, more than 100")
+        self.assertFalse(rpc.is_range_limit_error(gas_error))
+        self.assertFalse(rpc.is_range_limit_error(rpc.RpcHttpError(503, "query returned more than 10000 results")))
+        self.assertFalse(rpc.is_range_limit_error(requests.exceptions.ReadTimeout()))
+        # timeouts are retried instead
+        self.assertTrue(rpc.is_retryable_error(requests.exceptions.ReadTimeout(), "eth_getLogs"))
+
+
+class RpcRetryTest(unittest.TestCase):
+    def test_retry_after(self):
+        with MockRpcServer() as server:
+            server.fail_count, server.retry_after = 2, "0.2"
+            for client in [rpc.EthRpcClient(server.url), rpc.AsyncEthRpcClient(server.url)]:
+                server.post_count = 0
+                server.fail_count = 2
+                start = time.time()
+                client.send("eth_blockNumber", [])
+                self.assertGreaterEqual(time.time() - start, 0.4)
+                self.assertEqual(server.post_count, 3)
+
+    def test_max_retries(self):
+        with MockRpcServer() as server:
+            server.fail_count, server.fail_status = 10, 503
+            client = rpc.EthRpcClient(server.url, max_retries=2, retry_backoff=0.01)
+            with self.assertRaises(rpc.RpcHttpError) as ctx:
+                client.send("eth_blockNumber", [])
+            self.assertEqual(ctx.exception.status_code, 503)
+            self.assertEqual(server.post_count, 3)
+
+    def test_failover(self):
+        with MockRpcServer() as bad_server, MockRpcServer() as good_server:
+            bad_server.fail_count, bad_server.fail_status, bad_server.retry_after = 1000, 429, "30"
+            for client in [
+                rpc.EthRpcClient([bad_server.url, good_server.url]),
+                rpc.AsyncEthRpcClient([bad_server.url, good_server.url]),
+            ]:
+                bad_server.post_count = good_server.post_count = 0
+                start = time.time()
+                for i in range(10):
+                    client.send("eth_blockNumber", [])
+                # bad server is used only once, then it cools down
+                self.assertLess(time.time() - start, 5)
+                self.assertEqual(bad_server.post_count, 1)
+                self.assertEqual(good_server.post_count, 10)
+
+    def test_weighted_round_robin(self):
+        with MockRpcServer() as server1, MockRpcServer() as server2:
+            client = rpc.EthRpcClient([server1.url, server2.url], weights=[3, 1])
+            for i in range(40):
+                client.send("eth_blockNumber", [])
+            self.assertEqual(server1.post_count, 30)
+            self.assertEqual(server2.post_count, 10)
+
+    def test_rate_limit(self):
+        limiter = RateLimiter(20, 1)
+        start = time.time()
+        for i in range(11):
+            limiter.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.45)
+
+        with MockRpcServer() as server:
+            client = rpc.AsyncEthRpcClient(server.url, rate_limit=50)
+            start = time.time()
+            futures = [client.submit(client.send_async("eth_blockNumber", [])) for i in range(75)]
+            [f.result() for f in futures]
+            self.assertGreaterEqual(time.time() - start, 0.45)
+            client.close()
+
+
+class DayHeightTest(unittest.TestCase):
+    def setUp(self):
+        self.save_path = tempfile.mkdtemp()
+        source_utils.height_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.save_path)
+        source_utils.height_cache.clear()
+
+    @staticmethod
+    def query_blockno_from_time(chain, blk_time: datetime, is_before, proxy, key):
+        # a block every 10 seconds
+        timestamp = int(blk_time.replace(tzinfo=UTC).timestamp())
+        return timestamp // 10 if is_before else -(-timestamp // 10)
+
+    def test_resolve_heights(self):
+        days = [date(2024, 1, 1) + timedelta(days=i) for i in range(10)]
+        with mock.patch.object(utils.ApiUtil, "query_blockno_from_time", side_effect=self.query_blockno_from_time) as api:
+            heights = source_utils.resolve_heights(days, typing.ChainType.ethereum, None, "key", self.save_path, 0.01)
+            # N+1 queries for N days
+            self.assertEqual(api.call_count, 11)
+            for day in days:
+                start = self.query_blockno_from_time(None, datetime.combine(day, datetime.min.time()), False, None, None)
+                end = self.query_blockno_from_time(None, datetime.combine(day, datetime.max.time()), True, None, None)
+                self.assertEqual(heights[day], (start, end))
+            self.assertEqual(source_utils.get_height_from_date(days[3], typing.ChainType.ethereum, None, "key"), heights[days[3]])
+            self.assertEqual(api.call_count, 11)
+
+            # loaded from index file in another process
+            source_utils.height_cache.clear()
+            more_days = [days[-1] + timedelta(days=1)]
+            source_utils.resolve_heights(days + more_days, typing.ChainType.ethereum, None, "key", self.save_path, 0.01)
+            self.assertEqual(api.call_count, 12)
+            self.assertEqual(len(source_utils.DayHeightIndex(typing.ChainType.ethereum, self.save_path).load()), 12)
@@ -1,6 +1,35 @@
+import shutil
+import tempfile
 import unittest
+from datetime import date
+from decimal import Decimal
 
-from demeter_fetch.processor_uniswap.uniswap_utils import x96_sqrt_to_decimal
+import numpy as np
+import pandas as pd
+
+from demeter_fetch import Config, FromConfig, ToConfig, ChainType, DataSource, DappType, ToType, ToFileType
+from demeter_fetch.common import (
+    get_tx_type,
+    decode_words,
+    AbiType,
+    KECCAK,
+    EXACT_INT_DTYPE,
+    to_exact_int,
+    add_exact_int,
+    exact_int_to_decimal,
+)
+from demeter_fetch.processor_uniswap import UniPoolEvents
+from demeter_fetch.processor_uniswap.tick import (
+    get_active_liquidity_column,
+    convert_pool_tick_df,
+    convert_pool_events_to_tick,
+)
+from demeter_fetch.processor_uniswap.uniswap_utils import (
+    x96_sqrt_to_decimal,
+    handle_event,
+    decode_pool_events,
+    match_proxy_log,
+)
 
 
 # x96_sqrt_to_decimal
@@ -11,3 +40,126 @@ class UniUtilTest(unittest.TestCase):
         # token0->usdc, token1->weth
         val = x96_sqrt_to_decimal(1438663542842353560857615249833810, 6, 18, False)
         self.assertEqual(val // 1, 3032.0)
+
+    def test_decode_words(self):
+        words = ["f" * 64, "0" * 63 + "1", None]
+        self.assertEqual(decode_words(words, AbiType.int).tolist(), [-1, 1, None])
+        self.assertEqual(decode_words(words, AbiType.uint).tolist(), [2**256 - 1, 1, None])
+        self.assertEqual(decode_words(words[1:2], AbiType.address).tolist(), ["0x" + "0" * 39 + "1"])
+
+    def test_decode_small_words(self):
+        words = ["0x" + "f" * 58 + "fcf2c0", "0xb", "0" * 48 + "FFFFFFFFFFFFFFFF"]
+        self.assertEqual(decode_words(words, AbiType.int64).tolist(), [-200000, 11, -1])
+        self.assertEqual(decode_words(words[1:], AbiType.uint64).tolist(), [11, 2**64 - 1])
+        ticks = decode_words(words[:2] + [None], AbiType.int64)
+        self.assertEqual(ticks.dtype, np.float64)
+        self.assertEqual(ticks[:2].tolist(), [-200000.0, 11.0])
+        self.assertTrue(np.isnan(ticks[2]))
+
+    def test_exact_int(self):
+        values = to_exact_int([2**192 - 1, None, -(2**200)])
+        self.assertEqual(values.dtype, EXACT_INT_DTYPE)
+        self.assertEqual(values.tolist()[0], 2**192 - 1)
+        text = to_exact_int(pd.Series(["12", np.nan, "-5"]))
+        self.assertEqual(text.tolist(), [12, pd.NA, -5])
+        self.assertEqual(add_exact_int(values, text).tolist()[1:], [pd.NA, -(2**200) - 5])
+        decimals = exact_int_to_decimal(values)
+        self.assertEqual(decimals[0], Decimal(2**192 - 1))
+        self.assertTrue(decimals[1].is_nan())
+
+    def test_decode_pool_events(self):
+        df = pd.read_csv("samples/ethereum-0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8-2024-01-05.raw.csv")
+        df["tx_type"] = df["topics"].apply(get_tx_type)
+        expected = df.apply(lambda r: handle_event(r.tx_type, r.topics, r.data), axis=1, result_type="expand")
+        decoded = decode_pool_events(df)
+        for column in ["amount0", "amount1", "sqrtPriceX96", "current_liquidity", "liquidity", "delta_liquidity"]:
+            self.assertEqual(decoded[column].dtype, EXACT_INT_DTYPE)
+            decoded[column] = exact_int_to_decimal(decoded[column])
+        self.assertEqual(decoded.dtypes.tolist(), expected.dtypes.tolist())
+        self.assertEqual(decoded.astype(str).values.tolist(), expected.astype(str).values.tolist())
+
+    def test_match_proxy_log(self):
+        def word(value):
+            return f"{value:064x}"
+
+        pool = pd.DataFrame(
+            {
+                "transaction_hash": ["0x1", "0x1", "0x2", "0x3"],
+                "topics": [
+                    [KECCAK.MINT.value, "0xa", "0xb", "0xc"],
+                    [KECCAK.BURN.value, "0xa", "0xb", "0xc"],
+                    [KECCAK.SWAP.value, "0xa", "0xb"],
+                    [KECCAK.BURN.value, "0xa", "0xb", "0xc"],
+                ],
+                "data": [
+                    "0x" + word(9) + word(100) + word(2000) + word(3000),
+                    "0x" + word(100) + word(2000) + word(3000),
+                    "0x" + word(1) * 5,
+                    "0x" + word(100) + word(2000) + word(3000),
+                ],
+            }
+        )
+        proxy = pd.DataFrame(
+            {
+                "transaction_hash": ["0x1", "0x1", "0x1", "0x3"],
+                "topics": [
+                    [KECCAK.UNI_PROXY_INCREASE.value, "0x5"],
+                    [KECCAK.UNI_PROXY_DECREASE.value, "0x6"],
+                    [KECCAK.UNI_PROXY_DECREASE.value, "0x7"],
+                    [KECCAK.UNI_PROXY_DECREASE.value, "0x8"],
+                ],
+                "data": [
+                    "0x" + word(100) + word(2000) + word(3000),
+                    "0x" + word(100) + word(2002) + word(3000),
+                    "0x" + word(100) + word(2001) + word(3000),
+                    "0x" + word(100) + word(2500) + word(3000),
+                ],
+                "log_index": [1, 2, 3, 4],
+            }
+        )
+        match_proxy_log(pool, proxy)
+        # amount of burn is compared with error, and the first candidate is taken
+        self.assertEqual(pool["proxy_log_index"].tolist()[0:2], [1, 2])
+        self.assertEqual(pool["proxy_topics"][1], [KECCAK.UNI_PROXY_DECREASE.value, "0x6"])
+        self.assertTrue(pd.isna(pool["proxy_log_index"][2]))
+        self.assertTrue(pd.isna(pool["proxy_log_index"][3]))
+        self.assertEqual(pool["proxy_topics"][3], [])
+
+    def test_get_active_liquidity_column(self):
+        df = pd.DataFrame(
+            {
+                "tick_lower": [10, 10, None, 10, 10],
+                "tick_upper": [20, 20, 20, 20, 15],
+                "current_tick": [15, np.nan, 15, 20, 15],
+                "delta": [Decimal(1), Decimal(2), Decimal(3), Decimal(4), Decimal(5)],
+            }
+        )
+        active = get_active_liquidity_column(df, "delta")
+        self.assertEqual(active.dtype, EXACT_INT_DTYPE)
+        self.assertEqual(active.tolist(), [1, 0, 0, 0, 0])
+
+    def test_pool_events_file(self):
+        raw = pd.read_csv(
+            "samples/ethereum-0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8-2024-01-05.raw.csv",
+            parse_dates=["block_timestamp"],
+        )
+        expected = convert_pool_tick_df(raw).to_csv(index=False)
+        day = date(2024, 1, 5)
+        to_path = tempfile.mkdtemp()
+        try:
+            for file_type in [ToFileType.csv, ToFileType.feather]:
+                node = UniPoolEvents()
+                node.set_config(
+                    Config(
+                        FromConfig(ChainType.ethereum, DataSource.rpc, DappType.uniswap, day, day),
+                        ToConfig(ToType.tick, to_path, False, False, False, file_type),
+                    )
+                )
+                path = f"{to_path}/events{node._get_file_ext()}"
+                node.save_file(node._process_one_day({"uni_pool": raw.copy()}, day), path)
+                events = node.read_file(path)
+                self.assertNotIn("data", events.columns)
+                self.assertEqual(events["sqrtPriceX96"].dtype, EXACT_INT_DTYPE)
+                self.assertEqual(convert_pool_events_to_tick(events).to_csv(index=False), expected)
+        finally:
+            shutil.rmtree(to_path)